@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Índice persistente de actividad para capturas PCAP/PCAPNG.
+# Guarda junto a la captura un archivo ".actidx" con:
+# - nivel 0: timestamps por paquete y sumas acumuladas de bytes
+# - nivel 1: un timestamp cada COARSE_STEP paquetes (búsqueda en dos niveles)
+# El archivo se abre con mmap, así que calcular la actividad por compás con
+# cualquier número de compases o ventana de tiempo cuesta O(compases), no
+# O(paquetes). El índice se invalida si cambia el tamaño, la fecha de
+# modificación y el hash de la captura.
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+import pcapreader
+
+INDEX_SUFFIX = ".actidx"
+INDEX_MAGIC = b"ACTIDX\x00\x01"
+INDEX_VERSION = 1
+
+# Un timestamp del nivel grueso por cada COARSE_STEP paquetes
+COARSE_STEP = 1024
+
+# Paquetes que se acumulan en memoria antes de volcarlos al disco
+FLUSH_PACKETS = 1 << 20
+
+# Bandera: el índice incluye una copia ordenada por tiempo (captura desordenada)
+FLAG_TIME_SORTED_COPY = 0x1
+
+# magic, versión, banderas, paso grueso, tamaño, mtime_ns, paquetes, hash
+HEADER = struct.Struct("<8sHHIqqq16s8x")
+
+
+# Límites (índices de paquete) de cada compás al repartir por conteo.
+# Reparte todos los paquetes, incluida la cola que no divide exacto: el
+# paquete i cae en el compás i * n_bars // n_packets.
+def count_bar_edges(n_packets, n_bars):
+    return [-(-i * n_packets // n_bars) for i in range(n_bars + 1)]
+
+
+# Instantes que separan los compases al repartir por ventanas de tiempo.
+# Regresa None si la captura no abarca tiempo (todo en el mismo instante).
+def time_bar_edges(t_start, t_end, n_bars):
+    window = (t_end - t_start) / n_bars
+    if window <= 0:
+        return None
+    return [t_start + i * window for i in range(1, n_bars)]
+
+
+# Posición del primer timestamp >= t usando primero el nivel grueso
+def _bisect_two_level(timestamps, coarse, step, t):
+    j = bisect_left(coarse, t)
+    lo = max(0, (j - 1) * step)
+    hi = min(len(timestamps), j * step)
+    return bisect_left(timestamps, t, lo, hi)
+
+
+# Suma de bytes por compás a partir de sumas acumuladas.
+# Si se dan timestamps (ordenados) reparte por ventanas de tiempo; si no, o si
+# la captura no abarca tiempo, reparte por conteo de paquetes.
+def bar_sums_from_prefix(prefix, n_bars, timestamps=None, coarse=None,
+                         step=COARSE_STEP):
+    n_packets = len(prefix) - 1
+    if n_packets <= 0:
+        return [0] * n_bars
+
+    edges = None
+    if timestamps is not None:
+        time_edges = time_bar_edges(timestamps[0], timestamps[-1], n_bars)
+        if time_edges is not None:
+            edges = [0]
+            if coarse is not None:
+                edges.extend(_bisect_two_level(timestamps, coarse, step, t)
+                             for t in time_edges)
+            else:
+                edges.extend(bisect_left(timestamps, t) for t in time_edges)
+            edges.append(n_packets)
+
+    if edges is None:
+        edges = count_bar_edges(n_packets, n_bars)
+
+    return [prefix[edges[i + 1]] - prefix[edges[i]] for i in range(n_bars)]
+
+
+# Índice de actividad abierto con mmap
+class ActivityIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Cabecera y tamaño se revisan antes de crear vistas: un índice
+        # truncado o de otro formato se cierra y se reporta como ValueError
+        # (load_or_build_index lo reconstruye)
+        try:
+            (magic, version, flags, self.step, self.capture_size,
+             self.capture_mtime_ns, self.n_packets, self.digest) = HEADER.unpack_from(self._map, 0)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION or self.step <= 0:
+                raise ValueError
+            n = self.n_packets
+            n_coarse = _coarse_len(n, self.step)
+            copies = 2 if flags & FLAG_TIME_SORTED_COPY else 1
+            if n < 0 or len(self._map) != HEADER.size + copies * 8 * (2 * n + 1 + n_coarse):
+                raise ValueError
+        except (struct.error, ValueError):
+            self._map.close()
+            raise ValueError(f"Índice de actividad no válido: {path}") from None
+
+        view = self._view = memoryview(self._map)
+        off = HEADER.size
+
+        self.timestamps, off = _section(view, off, "d", n)
+        self.prefix, off = _section(view, off, "q", n + 1)
+        self.coarse, off = _section(view, off, "d", n_coarse)
+
+        if flags & FLAG_TIME_SORTED_COPY:
+            self.sorted_timestamps, off = _section(view, off, "d", n)
+            self.sorted_prefix, off = _section(view, off, "q", n + 1)
+            self.sorted_coarse, off = _section(view, off, "d", n_coarse)
+        else:
+            self.sorted_timestamps = self.timestamps
+            self.sorted_prefix = self.prefix
+            self.sorted_coarse = self.coarse
+
+    # Suma de bytes por compás, por conteo ("count") o por tiempo ("time")
+    def bar_sums(self, n_bars, mode="count"):
+        if mode == "time":
+            return bar_sums_from_prefix(self.sorted_prefix, n_bars,
+                                        timestamps=self.sorted_timestamps,
+                                        coarse=self.sorted_coarse, step=self.step)
+        return bar_sums_from_prefix(self.prefix, n_bars)
+
+    # Bytes entre dos instantes de la captura [t_start, t_end)
+    def bytes_between(self, t_start, t_end):
+        lo = _bisect_two_level(self.sorted_timestamps, self.sorted_coarse,
+                               self.step, t_start)
+        hi = _bisect_two_level(self.sorted_timestamps, self.sorted_coarse,
+                               self.step, t_end)
+        return self.sorted_prefix[hi] - self.sorted_prefix[lo]
+
+    def close(self):
+        for name in ("timestamps", "prefix", "coarse", "sorted_timestamps",
+                     "sorted_prefix", "sorted_coarse"):
+            getattr(self, name).release()
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Número de entradas del nivel grueso
+def _coarse_len(n_packets, step):
+    return (n_packets + step - 1) // step
+
+
+# Vista sin copia de una sección del índice
+def _section(view, off, typecode, count):
+    size = count * struct.calcsize(typecode)
+    return view[off:off + size].cast(typecode), off + size
+
+
+# Ruta del índice que acompaña a una captura
+def index_path_for(capture_path):
+    return capture_path + INDEX_SUFFIX
+
+
+# Hash del contenido de la captura
+def capture_digest(capture_path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(capture_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+# Vuelca un arreglo al archivo y lo vacía
+def _flush(array_values, f):
+    array_values.tofile(f)
+    del array_values[:]
+
+
+# Copia ordenada por tiempo de los timestamps y sus sumas acumuladas.
+# Solo se usa con capturas desordenadas y se hace en memoria.
+def _time_sorted_copy(tmp_path, n_packets):
+    timestamps = array("d")
+    prefix = array("q")
+    with open(tmp_path, "rb") as f:
+        f.seek(HEADER.size)
+        timestamps.fromfile(f, n_packets)
+        prefix.fromfile(f, n_packets + 1)
+
+    order = sorted(range(n_packets), key=timestamps.__getitem__)
+    sorted_ts = array("d", (timestamps[i] for i in order))
+    sizes = (prefix[i + 1] - prefix[i] for i in order)
+    sorted_prefix = array("q", accumulate(sizes, initial=0))
+    return sorted_ts, sorted_prefix
+
+
+# Construye el índice recorriendo la captura una sola vez.
+# Los arreglos se vuelcan al disco por bloques, así la memoria no crece con
+# el tamaño de la captura (salvo si hay que ordenar una captura desordenada).
+def build_index(capture_path, index_path=None, step=COARSE_STEP):
+    index_path = index_path or index_path_for(capture_path)
+    stat = os.stat(capture_path)
+    digest = capture_digest(capture_path)
+
+    tmp_path = index_path + ".tmp"
+    prefix_path = index_path + ".prefix.tmp"
+
+    n_packets = 0
+    total = 0
+    last_ts = float("-inf")
+    is_sorted = True
+    timestamps = array("d")
+    prefix = array("q", [0])
+    coarse = array("d")
+
+    try:
+        with open(tmp_path, "wb") as out, open(prefix_path, "wb") as prefix_out:
+            out.write(bytes(HEADER.size))
+
+            for ts, caplen, _origlen in pcapreader.iter_records(capture_path):
+                if n_packets % step == 0:
+                    coarse.append(ts)
+                if ts < last_ts:
+                    is_sorted = False
+                last_ts = ts
+                total += caplen
+                timestamps.append(ts)
+                prefix.append(total)
+                n_packets += 1
+
+                if len(timestamps) >= FLUSH_PACKETS:
+                    _flush(timestamps, out)
+                    _flush(prefix, prefix_out)
+
+            _flush(timestamps, out)
+            _flush(prefix, prefix_out)
+
+        with open(tmp_path, "ab") as out:
+            with open(prefix_path, "rb") as prefix_in:
+                for block in iter(lambda: prefix_in.read(1 << 20), b""):
+                    out.write(block)
+            coarse.tofile(out)
+
+        flags = 0
+        if not is_sorted:
+            # Copia ordenada por tiempo para poder buscar con bisect
+            flags |= FLAG_TIME_SORTED_COPY
+            sorted_ts, sorted_prefix = _time_sorted_copy(tmp_path, n_packets)
+            with open(tmp_path, "ab") as out:
+                sorted_ts.tofile(out)
+                sorted_prefix.tofile(out)
+                sorted_ts[::step].tofile(out)
+
+        with open(tmp_path, "r+b") as out:
+            out.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, flags, step,
+                                  stat.st_size, stat.st_mtime_ns, n_packets, digest))
+        os.replace(tmp_path, index_path)
+    finally:
+        # No deja temporales junto a la captura, tampoco si la lectura falló
+        # (captura vacía o que no es PCAP/PCAPNG)
+        for path in (tmp_path, prefix_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return ActivityIndex(index_path)
+
+
+# Abre el índice de una captura si sigue siendo válido; si no, lo reconstruye.
+# Si solo cambió la fecha de modificación pero el contenido es el mismo
+# (mismo hash), actualiza la cabecera y reutiliza el índice.
+def load_or_build_index(capture_path):
+    index_path = index_path_for(capture_path)
+    stat = os.stat(capture_path)
+
+    if os.path.exists(index_path):
+        try:
+            index = ActivityIndex(index_path)
+        except (ValueError, struct.error):
+            index = None
+
+        if index is not None and index.capture_size == stat.st_size:
+            if index.capture_mtime_ns == stat.st_mtime_ns:
+                return index
+            if index.digest == capture_digest(capture_path):
+                index.close()
+                _touch_header(index_path, stat.st_mtime_ns)
+                return ActivityIndex(index_path)
+        if index is not None:
+            index.close()
+
+    return build_index(capture_path, index_path)
+
+
+# Actualiza la fecha de modificación registrada en la cabecera del índice
+def _touch_header(index_path, mtime_ns):
+    with open(index_path, "r+b") as f:
+        fields = list(HEADER.unpack(f.read(HEADER.size)))
+        fields[5] = mtime_ns
+        f.seek(0)
+        f.write(HEADER.pack(*fields))
@@ -3,12 +3,16 @@
 
 # Genera una línea de bajo en Do mayor a partir de dígitos de un archivo CSV.
 # Usa cada dígito para decidir el grado de la escala, la duración y la intensidad de la nota.
-# Produce hasta 45 compases en 4/4 en un solo track MIDI.
+# Produce hasta 45 compases en 4/4 en un solo track MIDI (o los que se pidan,
+# incluso una nota por dígito de todo el archivo; el MIDI se escribe por bloques).
 
-import csv
 import os
 import sys
-from midiutil import MIDIFile
+from itertools import chain
+
+import digitstore
+import instrument
+from smfwriter import SMFStreamWriter
 
 # Configuración de rutas
 CSV_INPUT_PATH = "entrada_digitos_e.csv"
@@ -20,6 +24,9 @@ BEATS_PER_BAR = 4
 TARGET_BARS = 45
 MAX_BEATS = BEATS_PER_BAR * TARGET_BARS
 
+# Notas que se juntan antes de mandarlas al archivo MIDI
+NOTAS_POR_BLOQUE = 4096
+
 # Escala de Do en registro grave
 ESCALA_DO = [36, 38, 40, 41, 43, 45, 47]
 
@@ -46,34 +53,41 @@ def siguiente_grado(last_degree, d):
     return degree
 
 
-# Lee dígitos desde un archivo CSV
+# Lee dígitos desde un archivo CSV (o un texto con los dígitos en una sola línea)
 def leer_digitos_desde_csv(csv_path):
-    secuencia_digitos = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        lector = csv.reader(f)
-        for fila in lector:
-            for celda in fila:
-                for ch in str(celda).strip():
-                    if ch.isdigit():
-                        secuencia_digitos.append(ch)
-    return secuencia_digitos
-
-
-# Crea el archivo MIDI con la línea de bajo
-def crear_midi_desde_digitos(digitos, midi_path, nombre_pista):
-    midi = MIDIFile(numTracks=1)
-    track = 0
-    canal = 0
+    bloques = digitstore.iterar_bloques_texto(csv_path, ascii=True)
+    return list(b"".join(bloques).decode("ascii"))
+
+
+# Recorre los dígitos de un CSV o de un archivo binario .dig (digitstore.py)
+# empezando en la posición desde. En .dig el salto es inmediato (mmap).
+def iterar_digitos(ruta, desde=0):
+    return digitstore.iterar_digitos(ruta, desde)
+
+
+# Escribe la línea de bajo en un track de midi (SMFWriter, SMFStreamWriter o el
+# EventRecorder de smfwriter.py) con el canal dado.
+# Los dígitos pueden ser un iterador: se consumen solo hasta llenar los
+# max_beats tiempos (con max_beats=None, hasta que se acaben). Las notas
+# salen por bloques (con flush), así la memoria no crece con la duración.
+# Regresa (dígitos usados, notas emitidas).
+def escribir_bajo(midi, track, canal, digitos, nombre_pista, max_beats=MAX_BEATS):
     tiempo_actual = 0.0
 
     midi.addTrackName(track, tiempo_actual, nombre_pista)
     midi.addTempo(track, tiempo_actual, BASE_TEMPO)
 
     last_degree = 0
-
-    for ch in digitos:
-        if tiempo_actual >= MAX_BEATS:
+    digitos = iter(digitos)
+    usados = 0
+    notas = 0
+    notas_midi = []
+
+    while max_beats is None or tiempo_actual < max_beats:
+        ch = next(digitos, None)
+        if ch is None:
             break
+        usados += 1
 
         d = int(ch)
         degree = siguiente_grado(last_degree, d)
@@ -81,49 +95,66 @@ def crear_midi_desde_digitos(digitos, midi_path, nombre_pista):
         dur = duracion_para_digito(d)
         vel = velocidad_para_digito(d)
 
-        # Ajuste si la nota alcanza el final de los 45 compases
-        if tiempo_actual + dur >= MAX_BEATS:
-            dur = MAX_BEATS - tiempo_actual
+        # Ajuste si la nota alcanza el final de la pieza
+        if max_beats is not None and tiempo_actual + dur >= max_beats:
+            dur = max_beats - tiempo_actual
             pitch = ESCALA_DO[0]  # cierra en la tónica
             if dur <= 0:
                 break
 
-        midi.addNote(
-            track,
-            canal,
-            pitch,
-            tiempo_actual,
-            dur,
-            vel
-        )
+        notas_midi.append((pitch, tiempo_actual, dur, vel))
 
         tiempo_actual += dur
         last_degree = degree
 
+        # Las notas ya decididas salen al disco por bloques
+        if len(notas_midi) >= NOTAS_POR_BLOQUE:
+            notas += midi.add_notes(track, canal, notas_midi)
+            notas_midi = []
+            midi.flush(tiempo_actual)
+
+    notas += midi.add_notes(track, canal, notas_midi)
+
+    return usados, notas
+
+
+# Crea el archivo MIDI con la línea de bajo en un solo track
+def crear_midi_desde_digitos(digitos, midi_path, nombre_pista, max_beats=MAX_BEATS):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(midi_path, "wb") as salida:
-        midi.writeFile(salida)
+    with instrument.stage("bajo") as etapa, SMFStreamWriter(midi_path, numTracks=1) as midi:
+        usados, notas = escribir_bajo(midi, 0, 0, digitos, nombre_pista, max_beats)
+        etapa.count(digits=usados, notes=notas)
+        return usados, notas
 
 
+# Uso: python bajocsv.py [archivo.csv|archivo.dig] [dígito_inicial] [compases|todo]
+# Con "todo" se toca una nota por dígito hasta el final del archivo.
 def main():
     global CSV_INPUT_PATH
 
     if len(sys.argv) > 1:
         CSV_INPUT_PATH = sys.argv[1]
+    desde = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    max_beats = MAX_BEATS
+    if len(sys.argv) > 3:
+        max_beats = None if sys.argv[3] == "todo" else int(sys.argv[3]) * BEATS_PER_BAR
 
     name = os.path.splitext(os.path.basename(CSV_INPUT_PATH))[0]
     midi_output_path = os.path.join(OUTPUT_DIR, f"{name}_bajo.mid")
 
-    print("Leyendo dígitos desde:", CSV_INPUT_PATH)
-    digitos = leer_digitos_desde_csv(CSV_INPUT_PATH)
-    print(f"Se leyeron {len(digitos)} dígitos.")
+    print("Leyendo dígitos desde:", CSV_INPUT_PATH, f"(a partir del dígito {desde})")
+    digitos = iterar_digitos(CSV_INPUT_PATH, desde)
+    primero = next(digitos, None)
 
-    if not digitos:
-        print("No se encontraron dígitos en el CSV. No se generará el MIDI.")
+    if primero is None:
+        print("No se encontraron dígitos en el archivo. No se generará el MIDI.")
         return
 
     print("Creando archivo MIDI en:", midi_output_path)
-    crear_midi_desde_digitos(digitos, midi_output_path, name)
+    usados, notas = crear_midi_desde_digitos(chain([primero], digitos),
+                                             midi_output_path, name, max_beats)
+    digitos.close()
+    print(f"Se usaron {usados} dígitos ({notas} notas).")
     print("Listo. Archivo MIDI generado.")
 
 
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Mide el rendimiento de las partes principales con entradas de varios
+# tamaños y guarda los resultados en JSON, para comparar corridas y detectar
+# regresiones.
+# Las entradas se generan de forma determinista y se guardan en una carpeta
+# de datos para reusarlas en la siguiente corrida: los dígitos con el mismo
+# generador de digitCSV.py (digitgen.py) y las capturas con pcapsynth.py.
+# Solo se mide la función de cada prueba; preparar su entrada no cuenta.
+#
+#   python benchmarks.py --preset quick --out resultados.json
+#   python benchmarks.py --compare resultados.json
+
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import bajocsv
+import digitgen
+import drums
+import melodycsv
+import pcapsynth
+import sonify
+import traffic2midi
+
+DATA_DIR = "bench_data"
+OUTPUT_PATH = "benchmarks.json"
+
+# Versión del formato del JSON de resultados
+RESULTS_VERSION = 1
+
+# Tamaños de cada preset: dígitos y megabytes de captura
+PRESETS = {
+    "quick": {"digits": [1_000, 100_000], "pcap_mb": [1, 10]},
+    "standard": {"digits": [1_000, 100_000, 1_000_000], "pcap_mb": [1, 10, 100]},
+    "full": {"digits": [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000],
+             "pcap_mb": [1, 10, 100, 1_000, 5_000]},
+}
+DEFAULT_PRESET = "quick"
+DEFAULT_REPEATS = 3
+DEFAULT_SEED = 0
+
+# Si una corrida tarda más que esto no se repite (entradas enormes)
+REPEAT_LIMIT_SECONDS = 10.0
+
+# Compases por paquetes de la captura (al menos los de la pieza)
+PACKETS_PER_BAR = 100
+
+# Una prueba está más lenta (o más rápida) si su mínimo cambia más que esto
+COMPARE_THRESHOLD = 0.10
+
+CONSTANT = "pi"
+
+
+# Ruta de los dígitos de prueba (se generan si no existen)
+def digits_fixture(data_dir, n_digits):
+    path = os.path.join(data_dir, f"{CONSTANT}_{n_digits}.csv")
+    if not os.path.exists(path):
+        digitgen.generar_digitos(CONSTANT, n_digits - 1, path, reanudar=False)
+    return path
+
+
+# Ruta de la captura de prueba (se genera si no existe)
+def pcap_fixture(data_dir, megabytes, seed):
+    path = os.path.join(data_dir, f"synthetic_{megabytes}MB_seed{seed}.pcapng")
+    if not os.path.exists(path):
+        temporary = path + ".tmp"
+        pcapsynth.write_synthetic_pcapng(temporary, target_bytes=int(megabytes * 1e6),
+                                         seed=seed)
+        os.replace(temporary, path)
+    return path
+
+
+# Cada prueba prepara su entrada con ctx (ya fuera del tiempo medido) y
+# regresa la función a medir, que regresa cuántos elementos procesó.
+# ctx guarda lo ya leído para que las pruebas siguientes lo reusen.
+
+def _digits_list(ctx):
+    if "digits" not in ctx:
+        ctx["digits"] = melodycsv.leer_digitos_desde_csv(ctx["digits_path"])
+    return ctx["digits"]
+
+
+def bench_digit_generation(ctx):
+    path = os.path.join(ctx["data_dir"], "generated.csv")
+
+    def run():
+        digitgen.generar_digitos(CONSTANT, ctx["size"] - 1, path, reanudar=False)
+        return ctx["size"]
+    return run
+
+
+def bench_read_digits(ctx):
+    return lambda: len(melodycsv.leer_digitos_desde_csv(ctx["digits_path"]))
+
+
+def bench_degree_sequence(ctx):
+    digits = _digits_list(ctx)
+    return lambda: len(melodycsv.generar_secuencia_grados(digits,
+                                                          random.Random(ctx["seed"])))
+
+
+# Melodía con todos los dígitos: desde la lista en memoria o leyendo el
+# archivo conforme se necesita
+def bench_melody_midi(ctx):
+    digits = _digits_list(ctx)
+    path = os.path.join(ctx["data_dir"], "melody.mid")
+
+    def run():
+        melodycsv.crear_midi_desde_digitos(digits, path, "bench", None,
+                                           random.Random(ctx["seed"]))
+        return len(digits)
+    return run
+
+
+def bench_melody_midi_stream(ctx):
+    path = os.path.join(ctx["data_dir"], "melody_stream.mid")
+
+    def run():
+        digits = melodycsv.iterar_digitos(ctx["digits_path"])
+        used, _notes = melodycsv.crear_midi_desde_digitos(digits, path, "bench", None,
+                                                          random.Random(ctx["seed"]))
+        digits.close()
+        return used
+    return run
+
+
+def bench_bass_midi(ctx):
+    digits = _digits_list(ctx)
+    path = os.path.join(ctx["data_dir"], "bass.mid")
+
+    def run():
+        bajocsv.crear_midi_desde_digitos(digits, path, "bench", None)
+        return len(digits)
+    return run
+
+
+def _lengths(ctx):
+    if "lengths" not in ctx:
+        ctx["lengths"] = traffic2midi.read_packet_lengths(ctx["pcap_path"])
+        ctx["n_bars"] = max(traffic2midi.TARGET_BARS, len(ctx["lengths"]) // PACKETS_PER_BAR)
+    return ctx["lengths"]
+
+
+def _activities(ctx):
+    if "activities" not in ctx:
+        ctx["activities"] = traffic2midi.compute_bar_activities(_lengths(ctx), ctx["n_bars"])
+    return ctx["activities"]
+
+
+def bench_read_packet_lengths(ctx):
+    return lambda: len(traffic2midi.read_packet_lengths(ctx["pcap_path"]))
+
+
+def bench_bar_activities(ctx):
+    lengths = _lengths(ctx)
+
+    def run():
+        traffic2midi.compute_bar_activities(lengths, ctx["n_bars"])
+        return len(lengths)
+    return run
+
+
+def bench_chord_sequence(ctx):
+    activities = _activities(ctx)
+    return lambda: len(traffic2midi.choose_chord_sequence(activities,
+                                                          random.Random(ctx["seed"])))
+
+
+def bench_drum_midi(ctx):
+    activities = _activities(ctx)
+    path = os.path.join(ctx["data_dir"], "drums.mid")
+
+    def run():
+        drums.create_drum_midi(path, len(activities), activities=activities)
+        return len(activities)
+    return run
+
+
+# Pruebas por eje de tamaño: (nombre, preparación, unidad de los elementos).
+# En cada tamaño corren en este orden.
+DIGIT_BENCHMARKS = [
+    ("generar_digitos", bench_digit_generation, "dígitos"),
+    ("leer_digitos_desde_csv", bench_read_digits, "dígitos"),
+    ("generar_secuencia_grados", bench_degree_sequence, "dígitos"),
+    ("crear_midi_desde_digitos[melodía]", bench_melody_midi, "dígitos"),
+    ("crear_midi_desde_digitos[melodía, streaming]", bench_melody_midi_stream, "dígitos"),
+    ("crear_midi_desde_digitos[bajo]", bench_bass_midi, "dígitos"),
+]
+PCAP_BENCHMARKS = [
+    ("read_packet_lengths", bench_read_packet_lengths, "paquetes"),
+    ("compute_bar_activities", bench_bar_activities, "paquetes"),
+    ("choose_chord_sequence", bench_chord_sequence, "compases"),
+    ("create_drum_midi", bench_drum_midi, "compases"),
+]
+
+
+# Arranque de cada subcomando de sonify.py (intérprete nuevo incluido)
+def bench_startup(name):
+    def run():
+        sonify.measure_startup(name, 1)
+        return 1
+    return run
+
+
+# Corre una prueba `repeats` veces (una sola si es muy lenta) y resume
+# los tiempos
+def measure(run, repeats):
+    seconds = []
+    items = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        items = run()
+        seconds.append(time.perf_counter() - start)
+        if seconds[-1] > REPEAT_LIMIT_SECONDS:
+            break
+    best = min(seconds)
+    return {
+        "items": items,
+        "runs": seconds,
+        "min": best,
+        "median": statistics.median(seconds),
+        "mean": statistics.fmean(seconds),
+        "items_per_second": items / best if best else None,
+    }
+
+
+# Commit actual del repositorio (None si no hay git)
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "commit": _git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+# Corre las pruebas en todos los tamaños. only: nombres de las pruebas a
+# correr (None para todas). Regresa el diccionario que se guarda en JSON.
+def run_benchmarks(digit_sizes, pcap_sizes, repeats=DEFAULT_REPEATS, only=None,
+                   data_dir=DATA_DIR, seed=DEFAULT_SEED, report=print):
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+
+    def run_axis(benchmarks, axis, sizes, fixture):
+        selected = [b for b in benchmarks if only is None or b[0] in only]
+        if not selected:
+            return
+        for size in sizes:
+            ctx = {"data_dir": data_dir, "size": size, "seed": seed}
+            ctx.update(fixture(size))
+            for name, setup, unit in selected:
+                entry = {"benchmark": name, "axis": axis, "size": size, "unit": unit}
+                entry.update(measure(setup(ctx), repeats))
+                results.append(entry)
+                report(format_entry(entry))
+
+    run_axis(DIGIT_BENCHMARKS, "digits", digit_sizes,
+             lambda n: {"digits_path": digits_fixture(data_dir, n)})
+    run_axis(PCAP_BENCHMARKS, "pcap_mb", pcap_sizes,
+             lambda mb: {"pcap_path": pcap_fixture(data_dir, mb, seed)})
+
+    if only is None or "arranque" in only:
+        for command in sonify.COMMANDS:
+            entry = {"benchmark": "arranque", "axis": "startup", "size": command,
+                     "unit": "arranques"}
+            entry.update(measure(bench_startup(command), repeats))
+            if command in sonify.BUDGETED_COMMANDS:
+                entry["budget_s"] = sonify.STARTUP_BUDGET_SECONDS
+                entry["within_budget"] = entry["min"] < sonify.STARTUP_BUDGET_SECONDS
+            results.append(entry)
+            report(format_entry(entry))
+    return {"version": RESULTS_VERSION, "environment": environment(),
+            "repeats": repeats, "seed": seed, "results": results}
+
+
+def _size_label(entry):
+    if entry["axis"] == "startup":
+        return entry["size"]
+    if entry["axis"] == "pcap_mb":
+        return f"{entry['size']:,} MB"
+    return f"{entry['size']:,} díg."
+
+
+def format_entry(entry):
+    rate = entry["items_per_second"]
+    rate = f"{rate:,.0f} {entry['unit']}/s" if rate else "-"
+    return (f"{entry['benchmark']:<46}{_size_label(entry):>16}"
+            f"{entry['min'] * 1000:>12.1f} ms{rate:>26}")
+
+
+# Compara dos corridas prueba por prueba (por el tiempo mínimo). Regresa
+# [(prueba, eje, tamaño, proporción nueva/anterior)].
+def compare_results(old, new):
+    previous = {(e["benchmark"], e["axis"], e["size"]): e["min"] for e in old["results"]}
+    changes = []
+    for e in new["results"]:
+        key = (e["benchmark"], e["axis"], e["size"])
+        if previous.get(key):
+            changes.append(key + (e["min"] / previous[key],))
+    return changes
+
+
+def print_comparison(changes):
+    for name, axis, size, ratio in changes:
+        label = _size_label({"axis": axis, "size": size})
+        if ratio > 1 + COMPARE_THRESHOLD:
+            verdict = "más lento"
+        elif ratio < 1 - COMPARE_THRESHOLD:
+            verdict = "más rápido"
+        else:
+            verdict = "igual"
+        print(f"{name:<46}{label:>16}{ratio:>10.2f}x  {verdict}")
+
+
+# Lista de tamaños separados por comas ("1000,1e6")
+def _sizes(text):
+    return [int(float(s)) for s in text.split(",") if s]
+
+
+# Uso: python benchmarks.py [--preset quick|standard|full] [--digits 1000,1e6]
+#                           [--pcap-mb 1,100] [--only prueba,prueba] [--repeats N]
+#                           [--seed N] [--data carpeta] [--out resultados.json]
+#                           [--compare anterior.json]
+def main():
+    options = {"preset": DEFAULT_PRESET, "digits": None, "pcap-mb": None, "only": None,
+               "repeats": DEFAULT_REPEATS, "seed": DEFAULT_SEED, "data": DATA_DIR,
+               "out": OUTPUT_PATH, "compare": None}
+    args = sys.argv[1:]
+    for i in range(0, len(args), 2):
+        name = args[i][2:]
+        if not args[i].startswith("--") or name not in options or i + 1 >= len(args):
+            print(f"Opción no válida: '{args[i]}'")
+            sys.exit(1)
+        options[name] = args[i + 1]
+    if options["preset"] not in PRESETS:
+        print(f"Preset desconocido: {options['preset']} (opciones: {', '.join(PRESETS)})")
+        sys.exit(1)
+
+    preset = PRESETS[options["preset"]]
+    digit_sizes = _sizes(options["digits"]) if options["digits"] else preset["digits"]
+    pcap_sizes = _sizes(options["pcap-mb"]) if options["pcap-mb"] else preset["pcap_mb"]
+    only = set(options["only"].split(",")) if options["only"] else None
+
+    results = run_benchmarks(digit_sizes, pcap_sizes, int(options["repeats"]), only,
+                             options["data"], int(options["seed"]))
+    results["preset"] = options["preset"]
+    with open(options["out"], "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados guardados en: {options['out']}")
+
+    if options["compare"]:
+        with open(options["compare"], encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"\nComparación con {options['compare']} (nuevo / anterior):")
+        print_comparison(compare_results(previous, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,31 +3,42 @@
 
 # Genera un archivo CSV con dígitos de un número irracional (pi, e, phi, etc.).
 # Permite elegir la constante, el número de decimales y el nombre del archivo de salida.
+# Si el nombre termina en ".dig" guarda el formato binario compacto (digitstore.py).
+# Modo por lotes (sin preguntas), con las constantes en paralelo:
+#   python digitCSV.py pi:1000000 e:500000 sqrt2:200000 [--dig] [--procesos N] [--carpeta DIR]
 
-import csv
 import os
-from mpmath import mp
+import sys
+import time
+
+import digitgen
+import digitstore
+import instrument
 
 # Carpeta donde se guardarán los CSV
 OUTPUT_DIR = "CSV"
 
+# Constante correspondiente a cada opción del menú
+OPCIONES = {"1": "pi", "2": "e", "3": "phi", "4": "sqrt2", "5": "sqrt3", "6": "ln2"}
+
 
-# Regresa el número irracional correspondiente a la opción elegida
+# Regresa el nombre de la constante correspondiente a la opción elegida
 def elegir_irracional(opcion: str):
-    if opcion == "1":
-        return mp.pi, "pi"
-    elif opcion == "2":
-        return mp.e, "e"
-    elif opcion == "3":
-        return (1 + mp.sqrt(5)) / 2, "phi"
-    elif opcion == "4":
-        return mp.sqrt(2), "sqrt2"
-    elif opcion == "5":
-        return mp.sqrt(3), "sqrt3"
-    elif opcion == "6":
-        return mp.log(2), "ln2"
-    else:
-        return None, None
+    return OPCIONES.get(opcion)
+
+
+# Nombre de la constante a partir de su nombre o de su número en el menú
+def nombre_constante(texto):
+    texto = texto.strip().lower()
+    if texto in OPCIONES.values():
+        return texto
+    return elegir_irracional(texto)
+
+
+# Muestra el avance de la generación en una sola línea
+def mostrar_progreso(escritos, total, digitos_por_segundo):
+    print(f"\r  {escritos}/{total} dígitos ({digitos_por_segundo:,.0f} dígitos/s)",
+          end="", flush=True)
 
 
 # Pide datos al usuario y genera el CSV con los dígitos
@@ -42,9 +53,9 @@ def irracional_a_csv():
     print("  6) ln(2)")
     
     opcion = input("\nOpción (1-6): ").strip()
-    valor, nombre_constante = elegir_irracional(opcion)
+    nombre_constante = elegir_irracional(opcion)
 
-    if valor is None:
+    if nombre_constante is None:
         print("Opción no válida")
         return
 
@@ -57,43 +68,136 @@ def irracional_a_csv():
         print("No entendí el número de dígitos")
         return
 
-    mp.dps = n_decimales + 5
-    valor = +valor
-
-    s = str(valor)
-
-    if "." in s:
-        parte_entera, parte_decimal = s.split(".")
-    else:
-        parte_entera, parte_decimal = s, ""
-
-    parte_decimal = parte_decimal[:n_decimales]
-    todos_los_digitos = parte_entera + parte_decimal
-
-    print(f"\nValor aproximado: {s}")
-    print(f"Parte entera: {parte_entera}")
-    print(f"Primeros {n_decimales} decimales: {parte_decimal}")
-    print(f"Total de dígitos que se guardarán en CSV: {len(todos_los_digitos)}")
-
     nombre_archivo = input(
-        f"Nombre del archivo CSV de salida (por defecto: digitos_{nombre_constante}.csv): "
+        f"Nombre del archivo CSV de salida (por defecto: digitos_{nombre_constante}.csv; "
+        f"usa .dig para binario): "
     ).strip()
     if not nombre_archivo:
         nombre_archivo = f"digitos_{nombre_constante}.csv"
-    if not nombre_archivo.endswith(".csv"):
+    if not nombre_archivo.endswith((".csv", digitstore.EXTENSION)):
         nombre_archivo += ".csv"
 
     # Asegurar carpeta y construir ruta completa
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     ruta_salida = os.path.join(OUTPUT_DIR, nombre_archivo)
 
-    with open(ruta_salida, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        for d in todos_los_digitos:
-            writer.writerow([d])
-
-    print(f"\nListo. Se guardaron {len(todos_los_digitos)} dígitos en '{ruta_salida}'.")
+    # Si hay una ejecución interrumpida con los mismos datos, se puede reanudar
+    reanudar = False
+    parcial = digitgen.leer_parcial(ruta_salida, nombre_constante, n_decimales)
+    if parcial:
+        respuesta = input(
+            f"Hay una ejecución interrumpida con {parcial['escritos']} dígitos "
+            f"escritos. ¿Reanudar? (s/n): "
+        ).strip().lower()
+        reanudar = respuesta.startswith("s")
+
+    print("\nCalculando...")
+    resumen = digitgen.generar_digitos(nombre_constante, n_decimales, ruta_salida,
+                                       reanudar=reanudar, progreso=mostrar_progreso)
+
+    print(f"\nListo. Se guardaron {resumen['digitos']} dígitos en '{ruta_salida}'.")
+    print(f"Cálculo del valor: {resumen['segundos_calculo']:.2f} s; "
+          f"total: {resumen['segundos_total']:.2f} s "
+          f"({resumen['digitos_por_segundo']:,.0f} dígitos/s).")
+
+
+# Trabajo de un proceso: genera una constante completa
+def _trabajo_constante(constante, n_decimales, ruta):
+    resumen = digitgen.generar_digitos(constante, n_decimales, ruta)
+    resumen["ruta"] = ruta
+    resumen["pid"] = os.getpid()
+    resumen["etapas"] = instrument.take_records()
+    return resumen
+
+
+# Genera varias constantes a la vez en un pool de procesos (cada una es
+# trabajo de CPU de mpmath). trabajos es una lista de (constante, decimales);
+# los archivos quedan en carpeta como digitos_<constante>.csv (o .dig).
+# Regresa (resúmenes en el orden de trabajos, segundos de pared del lote).
+def generar_lote(trabajos, carpeta=OUTPUT_DIR, binario=False, procesos=None):
+    nombres = [constante for constante, _n in trabajos]
+    for constante in nombres:
+        if constante not in OPCIONES.values():
+            raise ValueError(f"Constante desconocida: {constante}")
+    if len(set(nombres)) != len(nombres):
+        raise ValueError("Cada constante puede aparecer una sola vez en el lote")
+
+    os.makedirs(carpeta, exist_ok=True)
+    extension = digitstore.EXTENSION if binario else ".csv"
+    procesos = procesos or min(len(trabajos), os.cpu_count() or 1)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        # Los trabajos más grandes se mandan primero para repartir mejor la carga
+        orden = sorted(range(len(trabajos)), key=lambda i: -trabajos[i][1])
+        futuros = {}
+        for i in orden:
+            constante, n_decimales = trabajos[i]
+            ruta = os.path.join(carpeta, f"digitos_{constante}{extension}")
+            futuros[i] = pool.submit(_trabajo_constante, constante, n_decimales, ruta)
+        resumenes = [futuros[i].result() for i in range(len(trabajos))]
+    for resumen in resumenes:
+        instrument.add_records(resumen.pop("etapas"))
+    return resumenes, time.perf_counter() - inicio
+
+
+# Tabla con el tiempo de cada trabajo y del lote completo
+def imprimir_resumen(resumenes, segundos_lote):
+    print(f"{'constante':<10}{'dígitos':>12}{'cálculo (s)':>13}{'total (s)':>11}"
+          f"{'dígitos/s':>13}  archivo")
+    for r in resumenes:
+        print(f"{r['constante']:<10}{r['digitos']:>12}{r['segundos_calculo']:>13.2f}"
+              f"{r['segundos_total']:>11.2f}{r['digitos_por_segundo']:>13,.0f}  {r['ruta']}")
+    suma = sum(r["segundos_total"] for r in resumenes)
+    print(f"Lote: {segundos_lote:.2f} s de pared para {suma:.2f} s de trabajo "
+          f"({suma / segundos_lote if segundos_lote else 0:.1f}x).")
+
+
+# Lee los argumentos del modo por lotes: (trabajos, carpeta, binario, procesos)
+def leer_argumentos(args):
+    trabajos = []
+    carpeta = OUTPUT_DIR
+    binario = False
+    procesos = None
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--procesos", "--carpeta") and i + 1 >= len(args):
+            raise ValueError(f"Falta el valor de {arg}")
+        if arg == "--dig":
+            binario = True
+        elif arg == "--procesos":
+            i += 1
+            procesos = int(args[i])
+        elif arg == "--carpeta":
+            i += 1
+            carpeta = args[i]
+        else:
+            texto, _sep, n_texto = arg.partition(":")
+            constante = nombre_constante(texto)
+            if constante is None or not n_texto.isdigit() or int(n_texto) <= 0:
+                raise ValueError(f"Trabajo no válido: '{arg}' (usa constante:decimales)")
+            trabajos.append((constante, int(n_texto)))
+        i += 1
+    return trabajos, carpeta, binario, procesos
+
+
+def main():
+    if len(sys.argv) > 1:
+        try:
+            trabajos, carpeta, binario, procesos = leer_argumentos(sys.argv[1:])
+            if not trabajos:
+                raise ValueError("Uso: python digitCSV.py pi:1000000 e:500000 [--dig] "
+                                 "[--procesos N] [--carpeta DIR]")
+            imprimir_resumen(*generar_lote(trabajos, carpeta, binario, procesos))
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+    else:
+        irracional_a_csv()
 
 
 if __name__ == "__main__":
-    irracional_a_csv()
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Motor de generación de dígitos de constantes irracionales por bloques.
+# El valor se calcula una sola vez como entero escalado floor(x * 10**n):
+# pi, e y ln(2) con mpmath (binary splitting; usa gmpy2 si está instalado)
+# y las raíces (phi, √2, √3) exactas con isqrt. Después se pasa a decimal
+# con divisiones recursivas (divide y vencerás) y los dígitos salen en
+# bloques de izquierda a derecha: nunca se arma el texto completo y cada
+# bloque se escribe al disco en cuanto sale.
+# Tras cada bloque se guarda un archivo ".parcial" con lo ya escrito, para
+# reanudar una ejecución interrumpida desde el último bloque.
+
+import json
+import math
+import os
+import time
+
+import digitstore
+import instrument
+
+CONSTANTES = ("pi", "e", "phi", "sqrt2", "sqrt3", "ln2")
+
+# Dígitos por hoja de la conversión a decimal (por debajo del límite de
+# str(int) de Python, 4300 dígitos)
+DIGITOS_HOJA = 4000
+
+# Dígitos por bloque escrito al disco
+DIGITOS_BLOQUE = 1 << 20
+
+# Bits extra de precisión para las constantes de mpmath
+BITS_GUARDA = 64
+
+EXTENSION_PARCIAL = ".parcial"
+
+# Fin de fila de csv.writer: el CSV sale igual que escribiendo fila por fila
+FIN_FILA_CSV = "\r\n"
+
+_FUNCIONES_MPF = {"pi": "mpf_pi", "e": "mpf_e", "ln2": "mpf_ln2"}
+_RADICANDOS = {"sqrt2": 2, "sqrt3": 3}
+
+
+# mpmath.libmp (se importa al calcular y no al cargar el módulo, porque
+# tarda en cargar)
+def _libmp():
+    from mpmath import libmp
+    return libmp
+
+
+# floor(x * 10**n) como entero, para la constante x
+def valor_escalado(constante, n):
+    libmp = _libmp()
+    escala = libmp.MPZ(10) ** n
+    if constante in _RADICANDOS:
+        return libmp.isqrt(_RADICANDOS[constante] * escala * escala)
+    if constante == "phi":
+        return (escala + libmp.isqrt(5 * escala * escala)) // 2
+    if constante not in _FUNCIONES_MPF:
+        raise ValueError(f"Constante desconocida: {constante}")
+
+    precision = int(n * math.log2(10)) + BITS_GUARDA
+    funcion = getattr(libmp, _FUNCIONES_MPF[constante])
+    _signo, mantisa, exponente, _bits = funcion(precision)
+    x = libmp.MPZ(mantisa) * escala
+    return x >> -exponente if exponente < 0 else x << exponente
+
+
+# Recorre los dígitos decimales de x (exactamente n_digitos, con ceros a la
+# izquierda) en trozos de texto, de izquierda a derecha
+def iterar_trozos_decimales(x, n_digitos, hoja=DIGITOS_HOJA):
+    niveles = 0
+    while hoja << niveles < n_digitos:
+        niveles += 1
+    potencias = [_libmp().MPZ(10) ** hoja]
+    for _ in range(niveles - 1):
+        potencias.append(potencias[-1] * potencias[-1])
+
+    # El árbol cubre hoja * 2**niveles dígitos; los de más son ceros a la izquierda
+    sobrante = (hoja << niveles) - n_digitos
+    for trozo in _trozos(x, niveles, potencias, hoja):
+        if sobrante:
+            quitar = min(sobrante, len(trozo))
+            trozo = trozo[quitar:]
+            sobrante -= quitar
+            if not trozo:
+                continue
+        yield trozo
+
+
+# Divide x en mitad alta y baja hasta llegar a hojas de `hoja` dígitos
+def _trozos(x, nivel, potencias, hoja):
+    if nivel == 0:
+        yield str(x).zfill(hoja)
+        return
+    alto, bajo = divmod(x, potencias[nivel - 1])
+    yield from _trozos(alto, nivel - 1, potencias, hoja)
+    yield from _trozos(bajo, nivel - 1, potencias, hoja)
+
+
+# Ruta del archivo de avance de una salida
+def ruta_parcial(ruta):
+    return ruta + EXTENSION_PARCIAL
+
+
+# Avance guardado de una ejecución interrumpida de la misma constante y
+# número de decimales, o None
+def leer_parcial(ruta, constante, n_decimales):
+    try:
+        with open(ruta_parcial(ruta), encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (estado.get("constante") != constante
+            or estado.get("n_decimales") != n_decimales
+            or not os.path.exists(ruta)):
+        return None
+    return estado
+
+
+# Guarda el avance (primero en un temporal para no dejarlo a medias)
+def _guardar_parcial(ruta, estado):
+    temporal = ruta_parcial(ruta) + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta_parcial(ruta))
+
+
+# Bytes que ocupan los primeros n dígitos en el archivo de salida
+def _desplazamiento(binario, n):
+    if binario:
+        return digitstore.CABECERA.size + n
+    return n * (1 + len(FIN_FILA_CSV))
+
+
+# Texto de dígitos a bytes del formato de salida
+def _codificar(binario, texto):
+    if binario:
+        return digitstore.valores_de_texto(texto)
+    return (FIN_FILA_CSV.join(texto) + FIN_FILA_CSV).encode("ascii")
+
+
+# Genera los dígitos (parte entera + n_decimales) de la constante y los
+# escribe por bloques en ruta: un dígito por fila en CSV, o formato .dig (u8)
+# si la ruta termina en ".dig". Con reanudar=True continúa una ejecución
+# interrumpida. progreso(escritos, total, digitos_por_segundo) se llama tras
+# cada bloque. Regresa un resumen con tiempos y velocidad.
+def generar_digitos(constante, n_decimales, ruta, reanudar=True,
+                    bloque=DIGITOS_BLOQUE, progreso=None):
+    inicio = time.perf_counter()
+    etapa = instrument.begin("dígitos")
+    binario = ruta.endswith(digitstore.EXTENSION)
+    n_enteros = len(str(valor_escalado(constante, 0)))
+    total = n_enteros + n_decimales
+
+    estado = leer_parcial(ruta, constante, n_decimales) if reanudar else None
+    ya_escritos = estado["escritos"] if estado else 0
+
+    with instrument.stage("cálculo de la constante", digits=total):
+        x = valor_escalado(constante, n_decimales)
+    t_calculo = time.perf_counter() - inicio
+
+    restantes = total - ya_escritos
+    if ya_escritos:
+        x %= _libmp().MPZ(10) ** restantes
+
+    if estado:
+        f = open(ruta, "r+b")
+        f.truncate(_desplazamiento(binario, ya_escritos))
+        f.seek(0, os.SEEK_END)
+    else:
+        f = open(ruta, "wb")
+        if binario:
+            f.write(digitstore.cabecera_bin(constante, n_enteros, total))
+
+    escritos = ya_escritos
+    inicio_escritura = time.perf_counter()
+    with f:
+        pendientes = []
+        n_pendientes = 0
+        for trozo in iterar_trozos_decimales(x, restantes):
+            pendientes.append(trozo)
+            n_pendientes += len(trozo)
+            if n_pendientes < bloque:
+                continue
+            f.write(_codificar(binario, "".join(pendientes)))
+            f.flush()
+            escritos += n_pendientes
+            pendientes = []
+            n_pendientes = 0
+            _guardar_parcial(ruta, {"constante": constante,
+                                    "n_decimales": n_decimales,
+                                    "escritos": escritos})
+            if progreso:
+                transcurrido = time.perf_counter() - inicio_escritura
+                progreso(escritos, total,
+                         (escritos - ya_escritos) / transcurrido if transcurrido else 0.0)
+        if pendientes:
+            f.write(_codificar(binario, "".join(pendientes)))
+            escritos += n_pendientes
+
+    if os.path.exists(ruta_parcial(ruta)):
+        os.remove(ruta_parcial(ruta))
+
+    t_total = time.perf_counter() - inicio
+    nuevos = escritos - ya_escritos
+    etapa.end(digits=nuevos)
+    return {
+        "constante": constante,
+        "digitos": escritos,
+        "n_enteros": n_enteros,
+        "reanudado_desde": ya_escritos,
+        "segundos_calculo": t_calculo,
+        "segundos_total": t_total,
+        "digitos_por_segundo": nuevos / t_total if t_total else 0.0,
+    }
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Almacén binario compacto de dígitos (archivos ".dig").
+# Cabecera de 48 bytes (constante, número de dígitos, dígitos enteros y
+# formato) seguida de los dígitos:
+# - "u8": un byte por dígito (valores 0-9); se lee con mmap y las rebanadas
+#   son vistas sin copia, así se puede empezar en cualquier posición al instante
+# - "bcd": dos dígitos por byte (4 bits cada uno); ocupa la mitad
+# También tiene el lector rápido de dígitos en texto (CSV de un dígito por
+# fila o volcados en una sola línea) que comparten melodycsv.py y bajocsv.py.
+# Uso: python digitstore.py CSV/pi.csv [bcd]  ->  CSV/pi.dig
+#      python digitstore.py --bench CSV/pi.csv  (compara con el lector csv.reader)
+
+import csv
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import instrument
+
+EXTENSION = ".dig"
+MAGIC = b"DIGITS\x00\x01"
+
+FORMATO_U8 = 0
+FORMATO_BCD = 1
+FORMATOS = {"u8": FORMATO_U8, "bcd": FORMATO_BCD}
+
+# magic, formato, dígitos enteros, número de dígitos, nombre de la constante
+CABECERA = struct.Struct("<8sBxH4xQ16s8x")
+
+# Tablas para pasar de ASCII a valores 0-9 y para separar nibbles BCD
+_ASCII_A_VALOR = bytes.maketrans(b"0123456789", bytes(range(10)))
+_POR_16 = bytes(((b << 4) & 0xFF) for b in range(256))
+_NIBBLE_ALTO = bytes((b >> 4) for b in range(256))
+_NIBBLE_BAJO = bytes((b & 0x0F) for b in range(256))
+
+# Bytes que no son dígitos ASCII (se borran al leer texto)
+_NO_DIGITOS = bytes(b for b in range(256) if not 0x30 <= b <= 0x39)
+
+# Tamaño de cada lectura de los archivos de texto
+BLOQUE_LECTURA = 1 << 20
+
+# Dígitos que forman un compás en la curva de actividad
+DIGITOS_POR_COMPAS = 8
+
+
+# Empaqueta valores 0-9 de dos en dos (el primero en el nibble alto).
+# El OR de los nibbles se hace con enteros grandes para no iterar en Python.
+def _empacar_bcd(valores):
+    if len(valores) % 2:
+        valores = valores + b"\x00"
+    n = len(valores) // 2
+    altos = int.from_bytes(valores[0::2].translate(_POR_16), "big")
+    bajos = int.from_bytes(valores[1::2], "big")
+    return (altos | bajos).to_bytes(n, "big")
+
+
+# Desempaqueta bytes BCD a valores 0-9 (dos por byte)
+def _desempacar_bcd(empacados):
+    salida = bytearray(2 * len(empacados))
+    salida[0::2] = empacados.translate(_NIBBLE_ALTO)
+    salida[1::2] = empacados.translate(_NIBBLE_BAJO)
+    return salida
+
+
+# Cabecera de un archivo .dig
+def cabecera_bin(constante, n_enteros, n_digitos, formato="u8"):
+    return CABECERA.pack(MAGIC, FORMATOS[formato], n_enteros, n_digitos,
+                         constante.encode("ascii")[:16])
+
+
+# Texto ASCII de dígitos ("31415...") a valores 0-9, un byte por dígito
+def valores_de_texto(digitos):
+    if isinstance(digitos, str):
+        digitos = digitos.encode("ascii")
+    return bytes(digitos).translate(_ASCII_A_VALOR)
+
+
+# Escribe dígitos (texto ASCII como "31415...") en un archivo .dig
+def escribir_digitos_bin(ruta, digitos, constante, n_enteros=1, formato="u8"):
+    valores = valores_de_texto(digitos)
+    codigo = FORMATOS[formato]
+
+    with open(ruta, "wb") as f:
+        f.write(cabecera_bin(constante, n_enteros, len(valores), formato))
+        if codigo == FORMATO_BCD:
+            f.write(_empacar_bcd(valores))
+        else:
+            f.write(valores)
+    return len(valores)
+
+
+# Almacén de dígitos abierto con mmap
+class AlmacenDigitos:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.formato, self.n_enteros, self.n_digitos, nombre = \
+            CABECERA.unpack_from(self._mapa, 0)
+        if magic != MAGIC:
+            self._mapa.close()
+            raise ValueError(f"No es un archivo de dígitos: {ruta}")
+        self.constante = nombre.rstrip(b"\x00").decode("ascii")
+        self._datos = memoryview(self._mapa)[CABECERA.size:]
+
+    def __len__(self):
+        return self.n_digitos
+
+    # Dígitos [inicio, fin) como valores 0-9. Con formato u8 es una vista sin
+    # copia sobre el archivo; con bcd se desempaqueta solo ese tramo.
+    def rebanada(self, inicio, fin=None):
+        fin = self.n_digitos if fin is None else min(fin, self.n_digitos)
+        inicio = max(0, min(inicio, fin))
+        if self.formato == FORMATO_U8:
+            return self._datos[inicio:fin]
+        primero = inicio // 2
+        ultimo = (fin + 1) // 2
+        valores = _desempacar_bcd(bytes(self._datos[primero:ultimo]))
+        desfase = inicio - 2 * primero
+        return memoryview(valores)[desfase:desfase + (fin - inicio)]
+
+    # Recorre los dígitos desde una posición, leyendo por bloques
+    def iterar(self, desde=0, bloque=1 << 16):
+        posicion = desde
+        while posicion < self.n_digitos:
+            yield from self.rebanada(posicion, posicion + bloque)
+            posicion += bloque
+
+    def close(self):
+        self._datos.release()
+        self._mapa.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Recorre los dígitos de un .dig desde una posición y cierra el archivo al final
+def iterar_digitos_bin(ruta, desde=0):
+    with AlmacenDigitos(ruta) as almacen:
+        yield from almacen.iterar(desde)
+
+
+# Recorre un archivo de texto en bloques binarios y entrega solo sus dígitos,
+# como valores 0-9 (o como ASCII con ascii=True). Comas, saltos de línea,
+# el punto decimal y cualquier otro byte se descartan con bytes.translate,
+# sin recorrer el texto carácter por carácter en Python.
+def iterar_bloques_texto(ruta, bloque=BLOQUE_LECTURA, ascii=False):
+    tabla = None if ascii else _ASCII_A_VALOR
+    with open(ruta, "rb") as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            valores = datos.translate(tabla, _NO_DIGITOS)
+            if valores:
+                yield valores
+
+
+# Bloques de valores 0-9 de un .dig o de un archivo de texto
+def iterar_bloques_digitos(ruta, bloque=BLOQUE_LECTURA):
+    if not ruta.endswith(EXTENSION):
+        yield from iterar_bloques_texto(ruta, bloque)
+        return
+    with AlmacenDigitos(ruta) as almacen:
+        for inicio in range(0, len(almacen), bloque):
+            yield bytes(almacen.rebanada(inicio, inicio + bloque))
+
+
+# Todos los dígitos de un archivo como arreglo de uint8 (array "B")
+def leer_digitos(ruta):
+    digitos = array("B")
+    for valores in iterar_bloques_digitos(ruta):
+        digitos.frombytes(valores)
+    return digitos
+
+
+# Recorre los dígitos (enteros 0-9) de un .dig o de un archivo de texto
+# empezando en la posición desde. Los bloques anteriores se saltan enteros.
+def iterar_digitos(ruta, desde=0):
+    if ruta.endswith(EXTENSION):
+        yield from iterar_digitos_bin(ruta, desde)
+        return
+    for valores in iterar_bloques_texto(ruta):
+        if desde >= len(valores):
+            desde -= len(valores)
+            continue
+        yield from valores[desde:]
+        desde = 0
+
+
+# Curva de densidad de los dígitos: para cada uno de n_compases compases, el
+# promedio de sus digitos_por_compas dígitos entre 9 (de 0 a 1), empezando en
+# la posición desde. Es una señal de actividad por compás como la de
+# traffic2midi.compute_bar_activities (la usa drums.py); los compases sin
+# dígitos quedan en 0.
+def actividad_por_compas(ruta, n_compases, digitos_por_compas=DIGITOS_POR_COMPAS, desde=0):
+    necesarios = desde + n_compases * digitos_por_compas
+    digitos = array("B")
+    for valores in iterar_bloques_digitos(ruta):
+        digitos.frombytes(valores)
+        if len(digitos) >= necesarios:
+            break
+    digitos = digitos[desde:necesarios]
+    maximo = 9 * digitos_por_compas
+    return [sum(digitos[i:i + digitos_por_compas]) / maximo
+            for i in range(0, n_compases * digitos_por_compas, digitos_por_compas)]
+
+
+# Lector anterior de melodycsv.py/bajocsv.py (csv.reader e isdigit por
+# carácter); se conserva como referencia para comparar_lectores
+def _leer_digitos_csv_reader(ruta):
+    secuencia_digitos = []
+    with open(ruta, newline="", encoding="utf-8") as f:
+        for fila in csv.reader(f):
+            for celda in fila:
+                for ch in str(celda).strip():
+                    if ch.isdigit():
+                        secuencia_digitos.append(ch)
+    return secuencia_digitos
+
+
+# Mide el lector por bloques contra el de csv.reader sobre el mismo archivo.
+# Regresa (dígitos, segundos de referencia, segundos del lector rápido); los
+# segundos de referencia son None si csv.reader no puede leer el archivo
+# (un volcado en una sola línea más largo que su límite de campo, o un .dig).
+def comparar_lectores(ruta, repeticiones=3):
+    tiempos = {}
+    resultados = {}
+    lectores = (("referencia", _leer_digitos_csv_reader), ("rapido", leer_digitos))
+    for nombre, lector in lectores:
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            try:
+                resultados[nombre] = lector(ruta)
+            except (csv.Error, ValueError):
+                break
+            transcurrido = time.perf_counter() - inicio
+            mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+        tiempos[nombre] = mejor
+
+    if "referencia" in resultados:
+        esperado = "".join(resultados["referencia"]).encode("ascii")
+        if resultados["rapido"].tobytes() != valores_de_texto(esperado):
+            raise ValueError(f"Los lectores no coinciden en '{ruta}'")
+    return len(resultados["rapido"]), tiempos["referencia"], tiempos["rapido"]
+
+
+# Convierte un archivo de dígitos en texto (CSV de uno por fila o volcado en
+# una sola línea, de cualquier tamaño) al formato binario. Se lee por bloques
+# y cada bloque se escribe empacado en cuanto se lee, así la memoria no crece
+# con el archivo; el número de dígitos se escribe en la cabecera al final.
+def convertir_csv(ruta_csv, ruta_bin=None, formato="u8"):
+    ruta_bin = ruta_bin or os.path.splitext(ruta_csv)[0] + EXTENSION
+    constante = os.path.splitext(os.path.basename(ruta_csv))[0]
+    bcd = FORMATOS[formato] == FORMATO_BCD
+
+    with instrument.stage("conversión CSV") as etapa, open(ruta_bin, "wb") as f:
+        f.write(cabecera_bin(constante, 1, 0, formato))
+        n = 0
+        pendiente = b""     # en bcd, un dígito suelto espera a su pareja
+        for valores in iterar_bloques_texto(ruta_csv):
+            n += len(valores)
+            if bcd:
+                valores = pendiente + valores
+                corte = len(valores) - len(valores) % 2
+                pendiente = valores[corte:]
+                f.write(_empacar_bcd(valores[:corte]))
+            else:
+                f.write(valores)
+        if pendiente:
+            f.write(_empacar_bcd(pendiente))
+
+        f.seek(0)
+        f.write(cabecera_bin(constante, 1, n, formato))
+        etapa.count(digits=n)
+    return ruta_bin, n
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python digitstore.py archivo.csv [u8|bcd]")
+    elif sys.argv[1] == "--bench":
+        for ruta in sys.argv[2:]:
+            n, t_ref, t_rapido = comparar_lectores(ruta)
+            if t_ref is None:
+                print(f"{ruta}: {n} dígitos; csv.reader no puede leerlo, "
+                      f"por bloques {t_rapido * 1000:.1f} ms")
+            else:
+                print(f"{ruta}: {n} dígitos; csv.reader {t_ref * 1000:.1f} ms, "
+                      f"por bloques {t_rapido * 1000:.1f} ms "
+                      f"({t_ref / t_rapido if t_rapido else 0:.1f}x)")
+    else:
+        formato = sys.argv[2] if len(sys.argv) > 2 else "u8"
+        ruta, n = convertir_csv(sys.argv[1], formato=formato)
+        print(f"Se guardaron {n} dígitos en '{ruta}'.")
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-# Genera una pista de batería en 4/4 con 45 compases.
-# Usa un groove tranquilo con variaciones en kick, snare y hi-hats.
+# Genera una pista de batería en 4/4 con 45 compases (o los que se pidan).
+# Usa un groove tranquilo con variaciones en kick, snare y hi-hats, descrito
+# como datos (DEFAULT_GROOVE o un archivo JSON) y compilado en plantillas.
 # Produce un archivo MIDI con un solo track de batería (canal 10 GM).
 
+import json
+import math
 import os
-from midiutil import MIDIFile
+import sys
+from bisect import bisect_right
+
+import instrument
+from smfwriter import NoteTemplate, SMFStreamWriter
 
 # Configuración musical
 TEMPO_BPM = 120
@@ -27,117 +34,315 @@ OP_HAT = 46
 CRASH = 49
 
 
-# Golpes de bombo
-def add_kick(midi, time, dur=0.25, vel=95):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, KICK, time, dur, vel)
-
-
-def add_kick_ghost(midi, time, dur=0.2, vel=70):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, KICK, time, dur, vel)
-
-
-# Golpes de tarola
-def add_snare(midi, time, dur=0.25, vel=90):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, SNARE, time, dur, vel)
-
-
-def add_snare_ghost(midi, time, dur=0.18, vel=65):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, SNARE, time, dur, vel)
-
-
-# Hi-hats
-def add_hat_closed(midi, time, dur=0.16, vel=72):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, CH_HAT, time, dur, vel)
-
-
-def add_hat_closed_soft(midi, time, dur=0.14, vel=60):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, CH_HAT, time, dur, vel)
-
-
-def add_hat_open(midi, time, dur=0.32, vel=80):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, OP_HAT, time, dur, vel)
-
-
-# Crash
-def add_crash(midi, time, dur=0.9, vel=92):
-    midi.addNote(DRUM_TRACK, DRUM_CHANNEL, CRASH, time, dur, vel)
+# Notas GM por nombre (para grooves leídos de un archivo)
+DRUM_NOTES = {"KICK": KICK, "SNARE": SNARE, "CH_HAT": CH_HAT, "OP_HAT": OP_HAT,
+              "CRASH": CRASH}
+
+# Compases que se juntan antes de escribirlos al disco
+BARS_PER_FLUSH = 64
+
+# Groove tranquilo con variaciones en kick, snare y hi-hats, como datos:
+# - sounds: articulación -> [nota GM, duración en tiempos]
+# - layers: capas en orden; "hits" son golpes [articulación, tiempo en el
+#   compás, velocidad] (con una duración como cuarto valor si cambia) y
+#   "when" las condiciones que debe cumplir el compás para sonar:
+#     [periodo, [restos]]  -> el índice del compás % periodo está en restos
+#     "first" / "last"     -> primer / último compás de la pieza
+DEFAULT_GROOVE = {
+    "name": "tranquilo",
+    "sounds": {
+        "kick": [KICK, 0.25],
+        "kick_ghost": [KICK, 0.2],
+        "snare": [SNARE, 0.25],
+        "snare_ghost": [SNARE, 0.18],
+        "hat": [CH_HAT, 0.16],
+        "hat_soft": [CH_HAT, 0.14],
+        "hat_open": [OP_HAT, 0.32],
+        "crash": [CRASH, 0.9],
+    },
+    "layers": [
+        # Kick principal
+        {"hits": [["kick", 0.0, 96]]},
+        # Compases A (0 y 2 de cada 4): segundo kick y ghost
+        {"when": [[4, [0, 2]]], "hits": [["kick", 2.0, 92], ["kick_ghost", 1.5, 68]]},
+        # Compases B (1 y 3 de cada 4): segundo kick, salvo cada tercer compás
+        {"when": [[4, [1, 3]], [3, [0, 2]]], "hits": [["kick", 2.0, 90]]},
+        # Snares en 2 y 4
+        {"hits": [["snare", 1.0, 88], ["snare", 3.0, 90]]},
+        # Ghost notes de snare
+        {"when": [[4, [0, 2]]], "hits": [["snare_ghost", 0.75, 62]]},
+        {"when": [[4, [1, 3]]], "hits": [["snare_ghost", 2.75, 62]]},
+        # Hi-hat a corcheas en los compases A
+        {"when": [[4, [0, 2]]], "hits": [
+            ["hat", 0.0, 72], ["hat_soft", 0.5, 62], ["hat", 1.0, 72], ["hat_soft", 1.5, 62],
+            ["hat", 2.0, 72], ["hat_soft", 2.5, 62], ["hat", 3.0, 72], ["hat_soft", 3.5, 62],
+        ]},
+        # Hi-hat a negras en los compases B, con un adorno de vez en cuando
+        {"when": [[4, [1, 3]]], "hits": [
+            ["hat", 0.0, 70], ["hat", 1.0, 66], ["hat", 2.0, 70], ["hat", 3.0, 66],
+        ]},
+        {"when": [[4, [1, 3]], [6, [1, 5]]], "hits": [["hat_soft", 1.5, 60]]},
+        # Crash de entrada
+        {"when": ["first"], "hits": [["crash", 0.0, 90, 1.0]]},
+        # Fill: open hat suave cada 16 compases
+        {"when": [[16, [15]]], "hits": [["hat_open", 3.5, 78]]},
+        # Pequeño cierre en el último compás
+        {"when": ["last"], "hits": [["hat", 3.0, 75], ["hat", 3.5, 75], ["snare", 3.0, 94]]},
+    ],
+}
+
+
+# Groove que sigue la actividad de los datos (0 a 1 por compás): con poca
+# actividad el hi-hat va a negras, con actividad media a corcheas y con mucha
+# a semicorcheas; las ghost notes y el kick extra aparecen al subir la
+# actividad, y antes de un salto grande de actividad suena un redoble.
+REACTIVE_GROOVE = {
+    "name": "reactivo",
+    "sounds": DEFAULT_GROOVE["sounds"],
+    "layers": [
+        # Kick en 1 y 3; ghost y kick extra con más actividad
+        {"hits": [["kick", 0.0, 96], ["kick", 2.0, 90]]},
+        {"when": [["activity", 0.4, None]], "hits": [["kick_ghost", 1.5, 68]]},
+        {"when": [["activity", 0.8, None]], "hits": [["kick_ghost", 3.5, 72]]},
+        # Snares en 2 y 4
+        {"hits": [["snare", 1.0, 88], ["snare", 3.0, 90]]},
+        # Ghost notes de snare según la actividad
+        {"when": [["activity", 0.35, None]], "hits": [["snare_ghost", 0.75, 62]]},
+        {"when": [["activity", 0.6, None]], "hits": [["snare_ghost", 2.75, 62]]},
+        # Densidad del hi-hat
+        {"when": [["activity", None, 0.3]], "hits": [
+            ["hat", 0.0, 70], ["hat", 1.0, 66], ["hat", 2.0, 70], ["hat", 3.0, 66],
+        ]},
+        {"when": [["activity", 0.3, 0.7]], "hits": [
+            ["hat", 0.0, 72], ["hat_soft", 0.5, 62], ["hat", 1.0, 72], ["hat_soft", 1.5, 62],
+            ["hat", 2.0, 72], ["hat_soft", 2.5, 62], ["hat", 3.0, 72], ["hat_soft", 3.5, 62],
+        ]},
+        {"when": [["activity", 0.7, None]], "hits": [
+            [name, step * 0.25, vel] for step, (name, vel) in enumerate(
+                [("hat", 74), ("hat_soft", 58), ("hat_soft", 64), ("hat_soft", 58)] * 4)
+        ]},
+        # Crash de entrada
+        {"when": ["first"], "hits": [["crash", 0.0, 90, 1.0]]},
+        # Fill: open hat cada 16 compases si hay algo de actividad
+        {"when": [[16, [15]], ["activity", 0.3, None]], "hits": [["hat_open", 3.5, 78]]},
+        # Redoble antes de un salto de actividad
+        {"when": [["rise", 0.3]], "hits": [
+            ["snare_ghost", 3.25, 70], ["snare", 3.5, 84], ["snare", 3.75, 92],
+        ]},
+        # Pequeño cierre en el último compás
+        {"when": ["last"], "hits": [["hat", 3.0, 75], ["hat", 3.5, 75], ["snare", 3.0, 94]]},
+    ],
+}
+
+# Actividad que se usa con un groove reactivo cuando no hay datos
+DEFAULT_ACTIVITY = 0.5
+
+
+# Groove compilado: cada capa se resuelve una sola vez en notas
+# (nota, tiempo en el compás, duración, velocidad). Un compás queda descrito
+# por su estado: resto del periodo común de las condiciones (mcm de los
+# periodos), nivel de actividad, nivel de subida hacia el compás siguiente y
+# si es el primero o el último. Los niveles son los intervalos entre los
+# umbrales que usan las capas, así que hay pocos estados posibles.
+# La plantilla de cada estado se arma la primera vez que se pide y se
+# guarda también como NoteTemplate (ya en ticks y eventos MIDI del canal):
+# un compás es una copia de su plantilla desplazada a su tiempo.
+class CompiledGroove:
+    def __init__(self, groove, beats_per_bar=BEATS_PER_BAR, channel=DRUM_CHANNEL):
+        self.name = groove.get("name", "")
+        self.beats_per_bar = beats_per_bar
+        self.channel = channel
+
+        sounds = {}
+        for name, (note, dur) in groove["sounds"].items():
+            if isinstance(note, str):
+                if note not in DRUM_NOTES:
+                    raise ValueError(f"Nota de batería desconocida: {note}")
+                note = DRUM_NOTES[note]
+            sounds[name] = (note, dur)
+
+        self.period = 1
+        self.layers = []
+        activity_edges = set()
+        rise_edges = set()
+        for layer in groove["layers"]:
+            conditions = []
+            for condition in layer.get("when", []):
+                if condition in ("first", "last"):
+                    conditions.append((condition, None))
+                elif condition[0] == "activity":
+                    _kind, low, high = condition
+                    low = float("-inf") if low is None else low
+                    high = float("inf") if high is None else high
+                    activity_edges.update((low, high))
+                    conditions.append(("activity", (low, high)))
+                elif condition[0] == "rise":
+                    rise_edges.add(condition[1])
+                    conditions.append(("rise", condition[1]))
+                else:
+                    every, residues = condition
+                    conditions.append((every, frozenset(residues)))
+                    self.period = math.lcm(self.period, every)
+
+            hits = []
+            for hit in layer["hits"]:
+                name, beat, vel = hit[:3]
+                if name not in sounds:
+                    raise ValueError(f"Articulación desconocida: {name}")
+                note, dur = sounds[name]
+                hits.append((note, beat, hit[3] if len(hit) > 3 else dur, vel))
+            self.layers.append((conditions, hits))
+
+        self.activity_edges = sorted(e for e in activity_edges if math.isfinite(e))
+        self.rise_edges = sorted(rise_edges)
+        self.reactive = bool(activity_edges or rise_edges)
+        self.cache = {}
+
+    # Notas de las capas que suenan en un compás con ese estado. Cada nivel
+    # se representa con el umbral donde empieza (-inf para el primero).
+    def _build(self, residue, level, rise_level, first, last):
+        activity = self.activity_edges[level - 1] if level else float("-inf")
+        rise = self.rise_edges[rise_level - 1] if rise_level else float("-inf")
+        notes = []
+        for conditions, hits in self.layers:
+            for kind, value in conditions:
+                if kind == "first":
+                    ok = first
+                elif kind == "last":
+                    ok = last
+                elif kind == "activity":
+                    ok = value[0] <= activity < value[1]
+                elif kind == "rise":
+                    ok = rise >= value
+                else:
+                    ok = residue % kind in value
+                if not ok:
+                    break
+            else:
+                notes.extend(hits)
+        return tuple(notes)
+
+    # Estado del compás bar_index en una pieza de n_bars compases
+    def _state(self, bar_index, n_bars, activities):
+        level = rise_level = 0
+        if self.reactive:
+            if activities is None:
+                activity = following = DEFAULT_ACTIVITY
+            else:
+                activity = activities[bar_index]
+                following = (activities[bar_index + 1]
+                             if bar_index + 1 < len(activities) else activity)
+            level = bisect_right(self.activity_edges, activity)
+            rise_level = bisect_right(self.rise_edges, following - activity)
+        return (bar_index % self.period, level, rise_level,
+                bar_index == 0, bar_index == n_bars - 1)
+
+    # Plantilla del compás: (notas, NoteTemplate)
+    def _templates_for(self, bar_index, n_bars, activities=None):
+        state = self._state(bar_index, n_bars, activities)
+        templates = self.cache.get(state)
+        if templates is None:
+            notes = self._build(*state)
+            templates = self.cache[state] = (notes, NoteTemplate(self.channel, notes))
+        return templates
+
+    # Notas (nota, tiempo en el compás, duración, velocidad) del compás
+    # bar_index en una pieza de n_bars compases; activities es la actividad
+    # por compás (0 a 1) para los grooves reactivos
+    def template(self, bar_index, n_bars, activities=None):
+        return self._templates_for(bar_index, n_bars, activities)[0]
+
+    # Notas del compás ya desplazadas a su tiempo en la pieza
+    def bar_notes(self, bar_index, n_bars, activities=None):
+        base_time = bar_index * self.beats_per_bar
+        return [(note, base_time + beat, dur, vel)
+                for note, beat, dur, vel in self.template(bar_index, n_bars, activities)]
+
+    # Agrega un compás al MIDI (sin mandarlo al disco)
+    def add_bar(self, midi, bar_index, n_bars, track=DRUM_TRACK, activities=None):
+        return midi.add_template(track, self._templates_for(bar_index, n_bars, activities)[1],
+                                 bar_index * self.beats_per_bar)
+
+    # Escribe los compases first_bar..first_bar + count - 1 de una pieza de
+    # n_bars compases; con un SMFStreamWriter, cada BARS_PER_FLUSH compases
+    # se mandan al disco
+    def render(self, midi, n_bars, first_bar=0, count=None, track=DRUM_TRACK,
+               activities=None):
+        end = n_bars if count is None else first_bar + count
+        stream = hasattr(midi, "flush")
+        for bar in range(first_bar, end):
+            self.add_bar(midi, bar, n_bars, track, activities)
+            if stream and (bar + 1) % BARS_PER_FLUSH == 0:
+                midi.flush((bar + 1) * self.beats_per_bar)
+
+
+# Lee un groove de un archivo JSON con el mismo formato que DEFAULT_GROOVE
+# (las notas pueden ir como número o por nombre: "KICK", "SNARE", ...)
+def load_groove(path):
+    with open(path, encoding="utf-8") as f:
+        groove = json.load(f)
+    if not isinstance(groove, dict) or "sounds" not in groove or "layers" not in groove:
+        raise ValueError(f"Groove no válido (faltan 'sounds' o 'layers'): {path}")
+    return groove
+
+
+DEFAULT_COMPILED = CompiledGroove(DEFAULT_GROOVE)
 
 
 # Agrega un compás de groove según el índice de compás
-def add_groove_bar(midi, bar_index):
-    base_time = bar_index * BEATS_PER_BAR
-    bar_type_a = (bar_index % 4 in (0, 2))
-
-    # Kick principal
-    add_kick(midi, base_time + 0.0, vel=96)
-
-    if bar_type_a:
-        add_kick(midi, base_time + 2.0, vel=92)
-        add_kick_ghost(midi, base_time + 1.5, vel=68)
+def add_groove_bar(midi, bar_index, n_bars=TARGET_BARS, groove=DEFAULT_COMPILED,
+                   activities=None):
+    midi.add_notes(DRUM_TRACK, groove.channel,
+                   groove.bar_notes(bar_index, n_bars, activities))
+
+
+# Actividad por compás de una captura (la misma que usa traffic2midi.py, con
+# su índice de actividad en disco) o de un archivo de dígitos (densidad de
+# los dígitos, digitstore.actividad_por_compas)
+def load_activities(path, n_bars):
+    if path.endswith((".pcap", ".pcapng")):
+        from traffic2midi import compute_bar_activities_from_pcap
+        return compute_bar_activities_from_pcap(path, n_bars=n_bars)
+    import digitstore
+    return digitstore.actividad_por_compas(path, n_bars)
+
+
+# Crea el archivo MIDI con la pista de batería a partir de un groove
+# (DEFAULT_GROOVE si no se da otro, REACTIVE_GROOVE si hay actividad).
+# activities es la actividad por compás (0 a 1) ya calculada para los otros
+# tracks, así la batería no vuelve a leer los datos. Los compases terminados
+# se escriben al disco, así n_bars puede ser tan grande como se quiera.
+def create_drum_midi(path, n_bars=TARGET_BARS, groove=None, activities=None):
+    if groove is None:
+        compiled = DEFAULT_COMPILED if activities is None else CompiledGroove(REACTIVE_GROOVE)
     else:
-        if bar_index % 3 != 1:
-            add_kick(midi, base_time + 2.0, vel=90)
-
-    # Snares en 2 y 4
-    add_snare(midi, base_time + 1.0, vel=88)
-    add_snare(midi, base_time + 3.0, vel=90)
-
-    # Ghost notes de snare
-    if bar_type_a:
-        add_snare_ghost(midi, base_time + 0.75, vel=62)
-    else:
-        add_snare_ghost(midi, base_time + 2.75, vel=62)
-
-    # Hi-hats
-    if bar_type_a:
-        # Hi-hat a corcheas
-        for step in range(8):
-            t = base_time + step * 0.5
-            if step % 2 == 0:
-                add_hat_closed(midi, t, vel=72)
-            else:
-                add_hat_closed_soft(midi, t, vel=62)
-    else:
-        # Hi-hat a negras
-        for beat in range(4):
-            t = base_time + beat
-            vel = 70 if beat in (0, 2) else 66
-            add_hat_closed(midi, t, vel=vel)
-        if bar_index % 6 in (1, 5):
-            add_hat_closed_soft(midi, base_time + 1.5, vel=60)
-
-    # Crash de entrada
-    if bar_index == 0:
-        add_crash(midi, base_time + 0.0, dur=1.0, vel=90)
-
-    # Open hat suave cada 16 compases
-    if bar_index % 16 == 15:
-        add_hat_open(midi, base_time + 3.5, dur=0.32, vel=78)
-
-    # Pequeño cierre en el último compás
-    if bar_index == TARGET_BARS - 1:
-        add_hat_closed(midi, base_time + 3.0, vel=75)
-        add_hat_closed(midi, base_time + 3.5, vel=75)
-        add_snare(midi, base_time + 3.0, vel=94)
-
-
-# Crea el archivo MIDI con la pista de batería
-def create_drum_midi(path):
-    midi = MIDIFile(
+        compiled = CompiledGroove(groove)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    with instrument.stage("batería", bars=n_bars), SMFStreamWriter(
+        path,
         numTracks=1,
         deinterleave=False,
         removeDuplicates=False
-    )
-    midi.addTempo(DRUM_TRACK, 0, TEMPO_BPM)
-
-    for bar in range(TARGET_BARS):
-        add_groove_bar(midi, bar)
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(path, "wb") as f:
-        midi.writeFile(f)
+    ) as midi:
+        midi.addTempo(DRUM_TRACK, 0, TEMPO_BPM)
+        compiled.render(midi, n_bars, activities=activities)
+
+
+# Uso: python drums.py [compases] [groove.json] [--data captura.pcapng|digitos.csv]
+# Con --data la batería sigue la actividad de esos datos.
+def main():
+    args = sys.argv[1:]
+    data_path = None
+    if "--data" in args[:-1]:
+        i = args.index("--data")
+        data_path = args[i + 1]
+        del args[i:i + 2]
+    n_bars = int(args[0]) if args else TARGET_BARS
+    create_drum_midi(MIDI_OUTPUT_PATH, n_bars,
+                     load_groove(args[1]) if len(args) > 1 else None,
+                     load_activities(data_path, n_bars) if data_path else None)
+    print(f"Drums generados en: {MIDI_OUTPUT_PATH}")
 
 
 if __name__ == "__main__":
-    create_drum_midi(MIDI_OUTPUT_PATH)
-    print(f"Drums generados en: {MIDI_OUTPUT_PATH}")
+    main()
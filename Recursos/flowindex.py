@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Índice de flujos (conversaciones por 5-tupla) construido en una pasada.
+# Guarda para cada flujo seguido sus bytes por compás (solo los compases en
+# que tuvo tráfico, así su tamaño no depende del largo de la pieza) y su
+# primer/último timestamp. La memoria está acotada: como mucho
+# FLOW_CAPACITY flujos seguidos; un sketch count-min estima el tamaño de
+# los flujos no seguidos y, cuando uno supera al flujo seguido más chico,
+# lo reemplaza (estilo heavy hitters). Así millones de flujos cortos no
+# llenan la RAM y los N flujos más pesados sí quedan en el índice.
+
+import ipaddress
+import mmap
+import zlib
+from array import array
+
+import pcapreader
+from trafficfeatures import bar_assigner, decode_packet
+
+# Flujos que se siguen a la vez
+FLOW_CAPACITY = 1024
+
+# Tamaño del sketch count-min (filas x columnas)
+SKETCH_DEPTH = 4
+SKETCH_WIDTH = 1 << 16
+
+
+# Sketch count-min de bytes por flujo
+class CountMinSketch:
+    def __init__(self, depth=SKETCH_DEPTH, width=SKETCH_WIDTH):
+        self.depth = depth
+        self.width = width
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    # Suma value al flujo y regresa la estimación actualizada
+    def add(self, key, value):
+        estimate = None
+        for seed, row in enumerate(self.rows):
+            col = zlib.crc32(key, seed) % self.width
+            row[col] += value
+            if estimate is None or row[col] < estimate:
+                estimate = row[col]
+        return estimate
+
+
+# Datos de un flujo seguido: bytes por compás ({compás: bytes}, sin los
+# compases vacíos), totales y tiempos
+class FlowStats:
+    __slots__ = ("key", "bar_bytes", "total", "packets", "first_ts", "last_ts",
+                 "error")
+
+    def __init__(self, key, ts, error=0):
+        self.key = key
+        self.bar_bytes = {}
+        self.total = error
+        self.packets = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.error = error   # bytes estimados antes de empezar a seguirlo
+
+    # Descripción legible: "TCP 10.0.0.1:443 <-> 10.0.0.2:51000"
+    def label(self):
+        return describe_flow_key(self.key)
+
+
+# Resultado del índice de flujos
+class FlowIndex:
+    def __init__(self, flows, n_bars, evicted, admitted, untracked_bytes):
+        self.flows = flows
+        self.n_bars = n_bars
+        self.evicted = evicted
+        self.admitted = admitted
+        self.untracked_bytes = untracked_bytes
+
+    # Los n flujos con más bytes
+    def top(self, n):
+        return sorted(self.flows.values(), key=lambda f: f.total, reverse=True)[:n]
+
+    def summary(self):
+        return (f"Flujos seguidos: {len(self.flows)}, desalojados: {self.evicted}, "
+                f"admitidos: {self.admitted}, bytes sin flujo seguido: "
+                f"{self.untracked_bytes}")
+
+
+# Clave de conversación independiente del sentido: protocolo + extremos
+# ordenados (dirección+puerto), a partir de la clave de decode_packet
+def conversation_key(flow_key):
+    proto, rest = flow_key[:1], flow_key[1:]
+    if len(rest) in (12, 36):
+        addr_len = (len(rest) - 4) // 2
+        ports = rest[-4:]
+    else:
+        addr_len = len(rest) // 2
+        ports = bytes(4)
+    a = rest[:addr_len] + ports[:2]
+    b = rest[addr_len:2 * addr_len] + ports[2:]
+    return proto + min(a, b) + max(a, b)
+
+
+# Texto legible de una clave de conversation_key
+def describe_flow_key(key):
+    proto = {6: "TCP", 17: "UDP"}.get(key[0], f"IP/{key[0]}")
+    half = (len(key) - 1) // 2
+    ends = []
+    for end in (key[1:1 + half], key[1 + half:]):
+        addr = ipaddress.ip_address(end[:-2])
+        port = int.from_bytes(end[-2:], "big")
+        ends.append(f"{addr}:{port}")
+    return f"{proto} {ends[0]} <-> {ends[1]}"
+
+
+# Construye el índice de flujos de una captura con memoria acotada
+def build_flow_index(pcap_path, n_bars, mode="count", capacity=FLOW_CAPACITY):
+    buf = pcapreader.open_capture(pcap_path)
+    try:
+        layout = pcapreader.split_capture(buf, 1)
+        flows = {}
+        sketch = CountMinSketch()
+        evicted = 0
+        admitted = 0
+        untracked_bytes = 0
+        min_flow = None   # flujo seguido más chico (se recalcula al desalojar)
+
+        if layout.n_packets:
+            bar_of = bar_assigner(layout.n_packets, layout.t_start, layout.t_end,
+                                  n_bars, mode)
+            for i, (ts, caplen, _origlen, off, linktype) in enumerate(
+                    pcapreader.iter_packets(buf)):
+                decoded = decode_packet(buf, off, caplen, linktype)
+                if decoded is None:
+                    untracked_bytes += caplen
+                    continue
+                key = conversation_key(decoded[1])
+
+                flow = flows.get(key)
+                if flow is None:
+                    estimate = sketch.add(key, caplen)
+                    if len(flows) < capacity:
+                        flow = flows[key] = FlowStats(key, ts)
+                        admitted += 1
+                    else:
+                        if min_flow is None:
+                            min_flow = min(flows.values(), key=lambda f: f.total)
+                        if estimate <= min_flow.total:
+                            untracked_bytes += caplen
+                            continue
+                        # El flujo nuevo ya pesa más que el más chico: lo reemplaza
+                        del flows[min_flow.key]
+                        untracked_bytes += min_flow.total - min_flow.error
+                        evicted += 1
+                        flow = flows[key] = FlowStats(key, ts, error=estimate - caplen)
+                        admitted += 1
+                        min_flow = None
+                elif flow is min_flow:
+                    min_flow = None
+
+                bar = bar_of(i, ts)
+                flow.bar_bytes[bar] = flow.bar_bytes.get(bar, 0) + caplen
+                flow.total += caplen
+                flow.packets += 1
+                flow.last_ts = ts
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+    return FlowIndex(flows, n_bars, evicted, admitted, untracked_bytes)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Medición opcional por etapas para todos los scripts de Recursos.
+# Se activa con variables de entorno, sin cambiar la forma de correr nada:
+#   RECURSOS_PROFILE=perfil.json        activa la medición y dónde guardarla
+#                                       ("-" para escribirla en stderr)
+#   RECURSOS_PROFILE_TRACEMALLOC=1      también el pico de memoria de Python
+#                                       de cada etapa (tracemalloc, más lento)
+#   RECURSOS_PROFILE_STAGE=etapa        guarda un perfil de cProfile de esa
+#                                       etapa en "etapa.prof"
+#   RECURSOS_PROFILE_STAGE_OUT=ruta     (o en esa ruta)
+# De cada etapa se guarda el tiempo de pared, el tiempo de CPU, el pico de
+# RSS del proceso hasta ese momento, el pico de tracemalloc, lo procesado
+# (paquetes, dígitos, notas...) y la velocidad. Todo sale en JSON al
+# terminar el programa.
+# Desactivada, stage() regresa siempre el mismo objeto que no hace nada.
+#
+#   with instrument.stage("lectura PCAP") as etapa:
+#       lengths = read_packet_lengths(path)
+#       etapa.count(packets=len(lengths))
+
+import atexit
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:         # Windows
+    resource = None
+
+OUTPUT = os.environ.get("RECURSOS_PROFILE")
+ENABLED = bool(OUTPUT)
+TRACEMALLOC = ENABLED and os.environ.get("RECURSOS_PROFILE_TRACEMALLOC", "") not in ("", "0")
+PROFILE_STAGE = os.environ.get("RECURSOS_PROFILE_STAGE") if ENABLED else None
+PROFILE_OUT = os.environ.get("RECURSOS_PROFILE_STAGE_OUT")
+
+# ru_maxrss viene en KB en Linux y en bytes en macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_records = []
+_open_stages = []
+_profiler = None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, **items):
+        pass
+
+    def end(self, **items):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+class Stage:
+    def __init__(self, name, items):
+        global _profiler
+        self.name = name
+        self.items = dict(items)
+        self.depth = len(_open_stages)
+        self.parent = _open_stages[-1].name if _open_stages else None
+        self.tracemalloc_peak = 0
+        _open_stages.append(self)
+
+        if TRACEMALLOC:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.profiling = name == PROFILE_STAGE
+        if self.profiling:
+            if _profiler is None:
+                import cProfile
+                _profiler = cProfile.Profile()
+            _profiler.enable()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+    # Suma cantidades procesadas: count(packets=n), count(digits=n, notes=m)
+    def count(self, **items):
+        for key, value in items.items():
+            self.items[key] = self.items.get(key, 0) + value
+
+    def end(self, **items):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        self.count(**items)
+        if self.profiling:
+            _profiler.disable()
+            _profiler.dump_stats(PROFILE_OUT or f"{self.name}.prof")
+        _open_stages.remove(self)
+
+        record = {
+            "stage": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "pid": os.getpid(),
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "rss_peak_bytes": _peak_rss(),
+            "items": self.items,
+            "per_second": {key: value / wall if wall else None
+                           for key, value in self.items.items()},
+        }
+        if TRACEMALLOC:
+            import tracemalloc
+            # reset_peak borra el pico de las etapas que contienen a esta:
+            # se les pasa el de esta antes de perderlo
+            peak = max(tracemalloc.get_traced_memory()[1], self.tracemalloc_peak)
+            record["tracemalloc_peak_bytes"] = peak
+            for outer in _open_stages:
+                outer.tracemalloc_peak = max(outer.tracemalloc_peak, peak)
+        _records.append(record)
+
+
+# Etapa medida (o el objeto vacío si la medición está desactivada).
+# items son cantidades ya conocidas al empezar.
+def stage(name, **items):
+    if not ENABLED:
+        return _NULL_STAGE
+    return Stage(name, items)
+
+
+# Como stage() pero sin with: begin(nombre) ... etapa.end(digits=n)
+begin = stage
+
+
+# Regresa y olvida las etapas medidas en este proceso (para mandarlas desde
+# un proceso del pool al principal, que las junta con add_records)
+def take_records():
+    if not ENABLED:
+        return []
+    records = _records[:]
+    del _records[:]
+    return records
+
+
+def add_records(records):
+    _records.extend(records)
+
+
+def report():
+    return {
+        "argv": sys.argv,
+        "pid": os.getpid(),
+        "python": sys.version.split()[0],
+        "tracemalloc": TRACEMALLOC,
+        "profile_stage": PROFILE_STAGE,
+        "rss_peak_bytes": _peak_rss(),
+        "stages": _records,
+    }
+
+
+def _write_report():
+    import json
+    import multiprocessing
+
+    # Solo escribe el proceso principal (no los del pool)
+    if multiprocessing.parent_process() is not None or not _records:
+        return
+    text = json.dumps(report(), indent=2, ensure_ascii=False)
+    if OUTPUT == "-":
+        print(text, file=sys.stderr)
+    else:
+        with open(OUTPUT, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if ENABLED:
+    atexit.register(_write_report)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Motor de transiciones compartido por la melodía (grados de la escala en
+# melodycsv.py) y el acompañamiento (acordes en traffic2midi.py).
+# Las reglas de cada paso son las mismas en los dos: de los estados
+# permitidos tras el anterior se toma el más cercano al objetivo (a veces el
+# segundo, para variar), sin repetir tres veces seguidas el mismo estado ni
+# prolongar un patrón ABAB.
+# Como esas reglas solo dependen de los tres estados anteriores, del
+# objetivo y de la "moneda" de variación, se precompilan una vez en una
+# tabla: cada paso de la generación es una sola consulta a una lista.
+
+import random
+
+# Probabilidad de usar el segundo candidato más cercano
+VARIATION_PROBABILITY = 0.35
+
+
+class MarkovEngine:
+    # states: estados en orden (la distancia al objetivo es la distancia
+    # entre posiciones); transitions: estado -> estados permitidos después;
+    # start: estado del primer paso (por defecto el primero)
+    def __init__(self, states, transitions, start=None,
+                 variation=VARIATION_PROBABILITY):
+        self.states = list(states)
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.variation = variation
+        n = len(self.states)
+        start = self.states[0] if start is None else start
+
+        # Candidatos por (estado anterior, objetivo), ordenados por distancia
+        # (orden estable: a igual distancia manda el orden de transitions)
+        candidates = []
+        for state in self.states:
+            allowed = [self.index[s] for s in transitions.get(state, self.states)]
+            candidates.append([sorted(allowed, key=lambda i, t=t: abs(i - t))
+                               for t in range(n)])
+
+        # Historias (h3, h2, h1): los tres estados anteriores, con n como
+        # "sin estado" al principio de la secuencia
+        none = n
+        histories = [(h3, h2, h1) for h3 in range(n + 1) for h2 in range(n + 1)
+                     for h1 in range(n)]
+        history_id = {h: i for i, h in enumerate(histories)}
+
+        # Cada historia ocupa una fila de 2 * n entradas: la historia h empieza
+        # en h * 2 * n y table[fila + 2 * objetivo + moneda] es el inicio de
+        # la fila de la historia siguiente, así un paso es una sola suma
+        row = 2 * n
+        table = []
+        for h3, h2, h1 in histories:
+            for t in range(n):
+                ordered = candidates[h1][t]
+                for coin in (0, 1):
+                    state = self._resolve(ordered, coin, h3, h2, h1, none)
+                    table.append(history_id[(h2, h1, state)] * row)
+
+        self.n_targets = n
+        self.table = table
+        self.varies = [len(candidates[h1][0]) > 1 for _h3, _h2, h1 in histories]
+        self.always_varies = all(self.varies)
+        self.labels = [self.states[h1] for _h3, _h2, h1 in histories
+                       for _ in range(row)]
+        self.row = row
+        self.history_id = history_id
+        self.none = none
+        self.first = history_id[(none, none, self.index[start])] * row
+
+    # Un paso con las reglas originales (solo se usa al compilar la tabla)
+    @staticmethod
+    def _resolve(ordered, coin, h3, h2, h1, none):
+        candidate = ordered[1] if coin and len(ordered) > 1 else ordered[0]
+
+        # Evitar tres veces seguidas el mismo estado
+        if h2 != none and candidate == h1 == h2:
+            for alt in ordered:
+                if alt != candidate:
+                    candidate = alt
+                    break
+
+        # Evitar patrón ABAB prolongado
+        if h3 != none and h3 == h1 and candidate == h2:
+            for alt in ordered:
+                if alt not in (h1, h2):
+                    candidate = alt
+                    break
+
+        return candidate
+
+    # Posición objetivo para una actividad entre 0 y 1
+    def target_index(self, activity):
+        return min(self.n_targets - 1, int(activity * self.n_targets))
+
+    # Posiciones objetivo para una lista de actividades
+    def target_indices(self, activities):
+        n = self.n_targets
+        last = n - 1
+        return [t if (t := int(a * n)) < n else last for a in activities]
+
+    # Historia interna a partir de los últimos estados (etiquetas)
+    def history_of(self, recent):
+        recent = [self.index[s] for s in recent[-3:]]
+        recent = [self.none] * (3 - len(recent)) + recent
+        return self.history_id[tuple(recent)] * self.row
+
+    # Sigue una secuencia por los objetivos dados (posiciones 0..n-1).
+    # history es la historia que regresó una llamada anterior (None para
+    # empezar desde start); así una secuencia larga se genera por tramos.
+    # Regresa (estados, historia final).
+    def walk(self, targets, rng=random, history=None):
+        table = self.table
+        p = self.variation
+        rnd = rng.random
+
+        targets = iter(targets)
+        path = []
+        if history is None:
+            if next(targets, None) is None:
+                return [], None
+            history = self.first
+            path.append(history)
+
+        if self.always_varies:
+            path += [history := table[history + t + t + (rnd() < p)] for t in targets]
+        else:
+            row = self.row
+            varies = self.varies
+            for t in targets:
+                coin = varies[history // row] and rnd() < p
+                history = table[history + t + t + coin]
+                path.append(history)
+
+        return list(map(self.labels.__getitem__, path)), history
+
+    # Secuencia de estados para los objetivos dados
+    def generate(self, targets, rng=random):
+        return self.walk(targets, rng)[0]
+
+    # Estado siguiente tras los estados recientes (para generar paso a paso,
+    # como en el modo en vivo)
+    def next_state(self, recent, target, rng=random):
+        if not recent:
+            return self.labels[self.first]
+        return self.walk((target,), rng, self.history_of(recent))[0][0]
+
+    # Varias secuencias a la vez sobre los mismos objetivos, una por semilla
+    # (cada una con su propio random.Random)
+    def generate_batch(self, targets, seeds):
+        targets = list(targets)
+        return [self.walk(targets, random.Random(seed))[0] for seed in seeds]
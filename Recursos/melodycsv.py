@@ -3,13 +3,18 @@
 
 # Genera una melodía en Do mayor a partir de dígitos de un archivo CSV.
 # Usa reglas de transición entre grados de la escala para mantener coherencia melódica.
-# Produce hasta 45 compases en 4/4 en un solo track MIDI.
+# Produce hasta 45 compases en 4/4 en un solo track MIDI (o los que se pidan,
+# incluso una nota por dígito de todo el archivo; el MIDI se escribe por bloques).
 
-import csv
 import os
 import sys
 import random
-from midiutil import MIDIFile
+from itertools import chain, islice
+
+import digitstore
+import instrument
+from markov import MarkovEngine
+from smfwriter import SMFStreamWriter
 
 # Rutas
 CSV_INPUT_PATH = "entrada_digitos_pi.csv"
@@ -21,6 +26,9 @@ BEATS_PER_BAR = 4
 TARGET_BARS = 45
 MAX_BEATS = BEATS_PER_BAR * TARGET_BARS
 
+# Notas que se juntan antes de mandarlas al archivo MIDI
+NOTAS_POR_BLOQUE = 4096
+
 # Escala de Do en registro medio
 ESCALA_DO = [60, 62, 64, 65, 67, 69, 71]
 SCALE_DEGREES = list(range(len(ESCALA_DO)))
@@ -56,92 +64,78 @@ def velocidad_para_digito(d):
     return max(50, min(110, v))
 
 
-# Lee dígitos desde un archivo CSV
+# Lee dígitos desde un archivo CSV (o un texto con los dígitos en una sola línea)
 def leer_digitos_desde_csv(csv_path):
-    secuencia_digitos = []
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        lector = csv.reader(f)
-        for fila in lector:
-            for celda in fila:
-                for ch in str(celda).strip():
-                    if ch.isdigit():
-                        secuencia_digitos.append(ch)
-    return secuencia_digitos
-
-
-# Genera una secuencia de grados de la escala a partir de los dígitos
-def generar_secuencia_grados(digitos):
-    grados = []
-
-    for i, ch in enumerate(digitos):
-        d = int(ch)
-        a = actividad_desde_digito(d)
-
-        if i == 0:
-            current = 0
-        else:
-            prev = grados[-1]
-
-            idx = int(a * len(SCALE_DEGREES))
-            idx = min(len(SCALE_DEGREES) - 1, idx)
+    bloques = digitstore.iterar_bloques_texto(csv_path, ascii=True)
+    return list(b"".join(bloques).decode("ascii"))
 
-            allowed = DEGREE_TRANSITIONS.get(prev, SCALE_DEGREES)
 
-            candidates_sorted = sorted(
-                allowed,
-                key=lambda deg: abs(deg - idx)
-            )
+# Recorre los dígitos de un CSV o de un archivo binario .dig (digitstore.py)
+# empezando en la posición desde. En .dig el salto es inmediato (mmap).
+def iterar_digitos(ruta, desde=0):
+    return digitstore.iterar_digitos(ruta, desde)
 
-            candidate = candidates_sorted[0]
 
-            # A veces usamos el segundo candidato para variar
-            if len(candidates_sorted) > 1 and random.random() < 0.35:
-                candidate = candidates_sorted[1]
+# Motor de transiciones entre grados, compilado una sola vez (markov.py)
+MOTOR_GRADOS = MarkovEngine(SCALE_DEGREES, DEGREE_TRANSITIONS)
 
-            # Evitar tres notas seguidas en el mismo grado
-            if len(grados) >= 2 and candidate == grados[-1] == grados[-2]:
-                for alt in candidates_sorted:
-                    if alt != candidate:
-                        candidate = alt
-                        break
+# Posición objetivo en la escala para cada dígito (como entero o como texto)
+OBJETIVO_DIGITO = {d: MOTOR_GRADOS.target_index(actividad_desde_digito(d)) for d in range(10)}
+OBJETIVO_DIGITO.update({str(d): t for d, t in list(OBJETIVO_DIGITO.items())})
 
-            # Evitar patrón ABAB prolongado
-            if len(grados) >= 3 and grados[-3] == grados[-1] and candidate == grados[-2]:
-                for alt in candidates_sorted:
-                    if alt not in (grados[-1], grados[-2]):
-                        candidate = alt
-                        break
 
-            current = candidate
+# Elige los grados de la escala a partir de los dígitos, por tramos de
+# NOTAS_POR_BLOQUE dígitos. Entrega pares (dígito, grado); rng es la fuente
+# de azar (el módulo random o un random.Random con semilla).
+def iterar_grados(digitos, rng=random):
+    digitos = iter(digitos)
+    historia = None
 
-        grados.append(current)
+    while True:
+        tramo = [int(ch) for ch in islice(digitos, NOTAS_POR_BLOQUE)]
+        if not tramo:
+            return
+        grados, historia = MOTOR_GRADOS.walk([OBJETIVO_DIGITO[d] for d in tramo],
+                                             rng, historia)
+        yield from zip(tramo, grados)
 
-    return grados
 
-
-# Crea el archivo MIDI con la melodía
-def crear_midi_desde_digitos(digitos, midi_path, nombre_pista):
-    midi = MIDIFile(numTracks=1)
-    track = 0
-    canal = 0
+# Genera una secuencia de grados de la escala a partir de los dígitos
+def generar_secuencia_grados(digitos, rng=random):
+    return MOTOR_GRADOS.generate([OBJETIVO_DIGITO[ch] for ch in digitos], rng)
+
+
+# Escribe la melodía en un track de midi (SMFWriter, SMFStreamWriter o el
+# EventRecorder de smfwriter.py) con el canal dado.
+# Los dígitos pueden ser un iterador: se consumen solo hasta llenar los
+# max_beats tiempos (con max_beats=None, hasta que se acaben). Las notas
+# salen por bloques (con flush), así la memoria no crece con la duración.
+# Con rng = random.Random(semilla) la melodía es reproducible.
+# Regresa (dígitos usados, notas emitidas).
+def escribir_melodia(midi, track, canal, digitos, nombre_pista, max_beats=MAX_BEATS,
+                     rng=random):
     tiempo_actual = 0.0
 
     midi.addTrackName(track, tiempo_actual, nombre_pista)
     midi.addTempo(track, tiempo_actual, BASE_TEMPO)
 
-    grados = generar_secuencia_grados(digitos)
+    pares = iterar_grados(digitos, rng)
+    usados = 0
+    notas = 0
+    notas_midi = []
 
-    for ch, grado in zip(digitos, grados):
-        if tiempo_actual >= MAX_BEATS:
+    while max_beats is None or tiempo_actual < max_beats:
+        par = next(pares, None)
+        if par is None:
             break
-
-        d = int(ch)
+        d, grado = par
+        usados += 1
 
         # Dígito 0 se usa como silencio
         if d == 0:
             dur_sil = duracion_para_digito(d)
-            if tiempo_actual + dur_sil > MAX_BEATS:
-                dur_sil = MAX_BEATS - tiempo_actual
+            if max_beats is not None and tiempo_actual + dur_sil > max_beats:
+                dur_sil = max_beats - tiempo_actual
             tiempo_actual += dur_sil
             continue
 
@@ -149,48 +143,68 @@ def crear_midi_desde_digitos(digitos, midi_path, nombre_pista):
         dur = duracion_para_digito(d)
         vel = velocidad_para_digito(d)
 
-        # Ajuste si la nota alcanza el final de los 45 compases
-        if tiempo_actual + dur >= MAX_BEATS:
-            dur = MAX_BEATS - tiempo_actual
+        # Ajuste si la nota alcanza el final de la pieza
+        if max_beats is not None and tiempo_actual + dur >= max_beats:
+            dur = max_beats - tiempo_actual
             pitch = ESCALA_DO[0]  # cierra en la tónica
             if dur <= 0:
                 break
 
-        midi.addNote(
-            track,
-            canal,
-            pitch,
-            tiempo_actual,
-            dur,
-            vel
-        )
+        notas_midi.append((pitch, tiempo_actual, dur, vel))
 
         tiempo_actual += dur
 
+        # Las notas ya decididas salen al disco por bloques
+        if len(notas_midi) >= NOTAS_POR_BLOQUE:
+            notas += midi.add_notes(track, canal, notas_midi)
+            notas_midi = []
+            midi.flush(tiempo_actual)
+
+    notas += midi.add_notes(track, canal, notas_midi)
+
+    return usados, notas
+
+
+# Crea el archivo MIDI con la melodía en un solo track
+def crear_midi_desde_digitos(digitos, midi_path, nombre_pista, max_beats=MAX_BEATS,
+                             rng=random):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    with open(midi_path, "wb") as salida:
-        midi.writeFile(salida)
+    with instrument.stage("melodía") as etapa, SMFStreamWriter(midi_path, numTracks=1) as midi:
+        usados, notas = escribir_melodia(midi, 0, 0, digitos, nombre_pista, max_beats, rng)
+        etapa.count(digits=usados, notes=notas)
+        return usados, notas
 
 
+# Uso: python melodycsv.py [archivo.csv|archivo.dig] [dígito_inicial] [compases|todo] [semilla]
+# Con "todo" se toca una nota por dígito hasta el final del archivo.
+# Con una semilla la misma entrada da siempre la misma melodía.
 def main():
     global CSV_INPUT_PATH
 
     if len(sys.argv) > 1:
         CSV_INPUT_PATH = sys.argv[1]
+    desde = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    max_beats = MAX_BEATS
+    if len(sys.argv) > 3:
+        max_beats = None if sys.argv[3] == "todo" else int(sys.argv[3]) * BEATS_PER_BAR
+    rng = random.Random(int(sys.argv[4])) if len(sys.argv) > 4 else random
 
     name = os.path.splitext(os.path.basename(CSV_INPUT_PATH))[0]
     midi_output_path = os.path.join(OUTPUT_DIR, f"{name}_melodia.mid")
 
-    print("Leyendo dígitos desde:", CSV_INPUT_PATH)
-    digitos = leer_digitos_desde_csv(CSV_INPUT_PATH)
-    print(f"Se leyeron {len(digitos)} dígitos.")
+    print("Leyendo dígitos desde:", CSV_INPUT_PATH, f"(a partir del dígito {desde})")
+    digitos = iterar_digitos(CSV_INPUT_PATH, desde)
+    primero = next(digitos, None)
 
-    if not digitos:
-        print("No se encontraron dígitos en el CSV. No se generará el MIDI.")
+    if primero is None:
+        print("No se encontraron dígitos en el archivo. No se generará el MIDI.")
         return
 
     print("Creando archivo MIDI en:", midi_output_path)
-    crear_midi_desde_digitos(digitos, midi_output_path, name)
+    usados, notas = crear_midi_desde_digitos(chain([primero], digitos),
+                                             midi_output_path, name, max_beats, rng)
+    digitos.close()
+    print(f"Se usaron {usados} dígitos ({notas} notas).")
     print("Listo. Archivo MIDI generado.")
 
 
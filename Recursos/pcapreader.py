@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Lector ligero de archivos PCAP y PCAPNG.
+# Recorre directamente las cabeceras de registros y bloques (sin scapy) y
+# entrega timestamps y longitudes capturadas/originales en arreglos compactos.
+# Soporta PCAP clásico (micro y nanosegundos) y PCAPNG con Enhanced Packet
+# Blocks, Simple Packet Blocks y Packet Blocks obsoletos, en ambos endianness.
+
+import mmap
+import struct
+from array import array
+from collections import namedtuple
+
+# Números mágicos de PCAP clásico
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+
+# Tipos de bloque de PCAPNG
+BLOCK_SHB = 0x0A0D0D0A    # Section Header Block
+BLOCK_IDB = 0x00000001    # Interface Description Block
+BLOCK_PB = 0x00000002     # Packet Block (obsoleto)
+BLOCK_SPB = 0x00000003    # Simple Packet Block
+BLOCK_EPB = 0x00000006    # Enhanced Packet Block
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Opciones de interfaz que afectan a los timestamps
+OPT_ENDOFOPT = 0
+OPT_IF_TSRESOL = 9
+OPT_IF_TSOFFSET = 14
+
+# Resolución por defecto de PCAPNG: microsegundos
+DEFAULT_TSRESOL = 1e-6
+
+# Tipo de enlace por defecto (Ethernet)
+LINKTYPE_ETHERNET = 1
+
+PacketRecords = namedtuple(
+    "PacketRecords", ["timestamps", "caplens", "origlens"]
+)
+
+
+# Interfaz declarada en un IDB
+class _Interface:
+    __slots__ = ("linktype", "snaplen", "tsresol", "tsoffset")
+
+    def __init__(self, linktype, snaplen, tsresol=DEFAULT_TSRESOL, tsoffset=0):
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.tsresol = tsresol
+        self.tsoffset = tsoffset
+
+
+# Convierte el valor de la opción if_tsresol a segundos por unidad
+def _tsresol_from_option(value):
+    if value & 0x80:
+        return 2.0 ** -(value & 0x7F)
+    return 10.0 ** -value
+
+
+# Lee las opciones de un IDB para conocer la resolución de sus timestamps
+def _parse_interface(buf, off, blen, endian):
+    linktype, _reserved, snaplen = struct.unpack_from(endian + "HHI", buf, off + 8)
+    iface = _Interface(linktype, snaplen)
+
+    opt = off + 16
+    end = off + blen - 4
+    while opt + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, opt)
+        if code == OPT_ENDOFOPT:
+            break
+        value = opt + 4
+        if code == OPT_IF_TSRESOL and length >= 1:
+            iface.tsresol = _tsresol_from_option(buf[value])
+        elif code == OPT_IF_TSOFFSET and length >= 8:
+            iface.tsoffset = struct.unpack_from(endian + "q", buf, value)[0]
+        opt = value + ((length + 3) & ~3)
+
+    return iface
+
+
+# Estado de una sección PCAPNG (orden de bytes, interfaces declaradas y
+# último timestamp) y decodificador de sus bloques. Lo comparten el
+# recorrido completo, split_capture y StreamParser.
+class _PcapngSection:
+    __slots__ = ("endian", "interfaces", "last_ts", "_header", "_epb", "_pb")
+
+    def __init__(self, endian="<", interfaces=(), last_ts=0.0):
+        self.interfaces = list(interfaces)
+        self.last_ts = last_ts
+        self._set_endian(endian)
+
+    def _set_endian(self, endian):
+        self.endian = endian
+        self._header = struct.Struct(endian + "II")
+        self._epb = struct.Struct(endian + "IIIII")
+        self._pb = struct.Struct(endian + "HHIIII")
+
+    # (tipo, longitud) del bloque en off. Un SHB empieza una sección nueva,
+    # con su propio orden de bytes y sin interfaces.
+    def block_header(self, buf, off):
+        if struct.unpack_from("<I", buf, off)[0] == BLOCK_SHB:
+            bom = struct.unpack_from("<I", buf, off + 8)[0]
+            self._set_endian("<" if bom == BYTE_ORDER_MAGIC else ">")
+            self.interfaces = []
+        return self._header.unpack_from(buf, off)
+
+    def _interface(self, iface_id):
+        if iface_id >= len(self.interfaces):
+            raise ValueError(f"Paquete PCAPNG de la interfaz {iface_id}, que no "
+                             f"está declarada")
+        return self.interfaces[iface_id]
+
+    # Decodifica un bloque completo. Regresa (timestamp, caplen, origlen,
+    # offset de los datos, linktype) si es un paquete; None si no.
+    def decode(self, buf, off, btype, blen):
+        if btype == BLOCK_EPB:
+            iface_id, ts_high, ts_low, caplen, origlen = self._epb.unpack_from(buf, off + 8)
+            iface = self._interface(iface_id)
+            self.last_ts = ((ts_high << 32) | ts_low) * iface.tsresol + iface.tsoffset
+            return self.last_ts, caplen, origlen, off + 28, iface.linktype
+
+        if btype == BLOCK_SPB:
+            # Sin timestamp: se conserva el último visto para mantener el orden
+            origlen = struct.unpack_from(self.endian + "I", buf, off + 8)[0]
+            iface = self._interface(0)
+            caplen = min(origlen, blen - 16)
+            if iface.snaplen:
+                caplen = min(caplen, iface.snaplen)
+            return self.last_ts, caplen, origlen, off + 12, iface.linktype
+
+        if btype == BLOCK_PB:
+            iface_id, _drops, ts_high, ts_low, caplen, origlen = self._pb.unpack_from(
+                buf, off + 8
+            )
+            iface = self._interface(iface_id)
+            self.last_ts = ((ts_high << 32) | ts_low) * iface.tsresol + iface.tsoffset
+            return self.last_ts, caplen, origlen, off + 28, iface.linktype
+
+        if btype == BLOCK_IDB:
+            self.interfaces.append(_parse_interface(buf, off, blen, self.endian))
+        return None
+
+
+# Indica si el buffer empieza con una cabecera PCAP o PCAPNG conocida
+def detect_format(buf):
+    if len(buf) < 4:
+        return None
+    if struct.unpack_from("<I", buf, 0)[0] == BLOCK_SHB:
+        return "pcapng"
+    for endian in ("<", ">"):
+        magic = struct.unpack_from(endian + "I", buf, 0)[0]
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            return "pcap"
+    return None
+
+
+# Lee la cabecera global de un PCAP clásico: (endian, fracción de segundo, linktype)
+def _pcap_header(buf):
+    endian = "<"
+    magic = struct.unpack_from("<I", buf, 0)[0]
+    if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+        endian = ">"
+        magic = struct.unpack_from(">I", buf, 0)[0]
+    frac = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0xFFFF
+    return endian, frac, linktype
+
+
+# Recorre un PCAP clásico y entrega (timestamp, caplen, origlen, offset, linktype).
+# Con chunk solo recorre los registros de ese tramo.
+def _iter_pcap(buf, chunk=None):
+    size = len(buf)
+    if size < 24:
+        return
+
+    endian, frac, linktype = _pcap_header(buf)
+
+    off = 24
+    if chunk is not None:
+        off, size = chunk.start, chunk.end
+
+    record = struct.Struct(endian + "IIII")
+    unpack_from = record.unpack_from
+    while off + 16 <= size:
+        ts_sec, ts_frac, caplen, origlen = unpack_from(buf, off)
+        data = off + 16
+        if data + caplen > len(buf):
+            break  # registro truncado al final del archivo
+        yield ts_sec + ts_frac * frac, caplen, origlen, data, linktype
+        off = data + caplen
+
+
+# Recorre un PCAPNG y entrega (timestamp, caplen, origlen, offset, linktype).
+# Con chunk empieza a mitad de archivo usando el estado de sección guardado
+# (orden de bytes, interfaces y último timestamp) y se detiene en chunk.end.
+def _iter_pcapng(buf, chunk=None):
+    size = len(buf)
+    off = 0
+    stop = size
+    section = _PcapngSection()
+    if chunk is not None:
+        off, stop = chunk.start, chunk.end
+        section = _PcapngSection(chunk.endian, chunk.interfaces, chunk.last_ts)
+
+    block_header = section.block_header
+    decode = section.decode
+    while off + 12 <= stop:
+        btype, blen = block_header(buf, off)
+        if blen < 12 or off + blen > size:
+            break  # bloque truncado o corrupto
+        packet = decode(buf, off, btype, blen)
+        if packet is not None:
+            yield packet
+        off += blen
+
+
+# Recorre los paquetes de un buffer PCAP/PCAPNG (bytes, mmap o memoryview).
+# Con chunk (de split_capture) solo recorre ese tramo del archivo.
+def iter_packets(buf, chunk=None):
+    fmt = detect_format(buf)
+    if fmt == "pcapng":
+        return _iter_pcapng(buf, chunk)
+    if fmt == "pcap":
+        return _iter_pcap(buf, chunk)
+    raise ValueError("Formato de captura no reconocido (se esperaba PCAP o PCAPNG)")
+
+
+# Tramo de una captura que empieza en un límite de bloque/registro.
+# first_packet es el índice global de su primer paquete; endian, interfaces
+# y last_ts describen la sección PCAPNG vigente en start.
+CaptureChunk = namedtuple(
+    "CaptureChunk",
+    ["start", "end", "first_packet", "endian", "interfaces", "last_ts"]
+)
+
+# Resumen de la caminata de cabeceras hecha por split_capture
+CaptureLayout = namedtuple(
+    "CaptureLayout", ["chunks", "n_packets", "t_start", "t_end"]
+)
+
+
+# Recorre solo las cabeceras de la captura y la divide en n_chunks tramos de
+# bytes parecidos, cada uno empezando en un límite de bloque. También cuenta
+# los paquetes y el rango de tiempo, que hacen falta para repartir compases.
+def split_capture(buf, n_chunks):
+    fmt = detect_format(buf)
+    if fmt is None:
+        raise ValueError("Formato de captura no reconocido (se esperaba PCAP o PCAPNG)")
+    if fmt == "pcap":
+        return _split_pcap(buf, n_chunks)
+    return _split_pcapng(buf, n_chunks)
+
+
+def _split_pcap(buf, n_chunks):
+    size = len(buf)
+    endian, frac, _linktype = _pcap_header(buf) if size >= 24 else ("<", 1e-6, 0)
+    record = struct.Struct(endian + "IIII")
+    targets = [size * k // n_chunks for k in range(1, n_chunks)]
+
+    starts = [(24, 0)]
+    n_packets = 0
+    t_start = float("inf")
+    t_end = float("-inf")
+    off = 24
+    while off + 16 <= size:
+        if targets and off >= targets[0]:
+            while targets and off >= targets[0]:
+                targets.pop(0)
+            starts.append((off, n_packets))
+        ts_sec, ts_frac, caplen, _origlen = record.unpack_from(buf, off)
+        if off + 16 + caplen > size:
+            break
+        ts = ts_sec + ts_frac * frac
+        t_start = min(t_start, ts)
+        t_end = max(t_end, ts)
+        n_packets += 1
+        off += 16 + caplen
+
+    chunks = []
+    for i, (start, first) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else size
+        chunks.append(CaptureChunk(start, end, first, endian, (), 0.0))
+    return CaptureLayout(chunks, n_packets, t_start, t_end)
+
+
+def _split_pcapng(buf, n_chunks):
+    size = len(buf)
+    targets = [size * k // n_chunks for k in range(1, n_chunks)]
+
+    section = _PcapngSection()
+    starts = [(0, 0, section.endian, (), section.last_ts)]
+    n_packets = 0
+    t_start = float("inf")
+    t_end = float("-inf")
+
+    off = 0
+    while off + 12 <= size:
+        if targets and off >= targets[0]:
+            while targets and off >= targets[0]:
+                targets.pop(0)
+            starts.append((off, n_packets, section.endian, tuple(section.interfaces),
+                           section.last_ts))
+
+        btype, blen = section.block_header(buf, off)
+        if blen < 12 or off + blen > size:
+            break
+
+        if section.decode(buf, off, btype, blen) is not None:
+            t_start = min(t_start, section.last_ts)
+            t_end = max(t_end, section.last_ts)
+            n_packets += 1
+
+        off += blen
+
+    chunks = []
+    for i, (start, first, chunk_endian, chunk_ifaces, chunk_ts) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else size
+        chunks.append(CaptureChunk(start, end, first, chunk_endian, chunk_ifaces, chunk_ts))
+    return CaptureLayout(chunks, n_packets, t_start, t_end)
+
+
+# Lector incremental para capturas que siguen creciendo (tcpdump -w, stdin).
+# Recibe trozos de bytes con feed() y entrega los paquetes completos; los
+# registros a medio escribir se guardan hasta que llegue el resto.
+class StreamParser:
+    def __init__(self):
+        self._buf = bytearray()
+        self.format = None
+        self._endian = "<"
+        self._frac = 1e-6
+        self._linktype = LINKTYPE_ETHERNET
+        self._section = _PcapngSection()
+        self.n_packets = 0
+
+    # Agrega bytes y entrega (timestamp, caplen, origlen, data, linktype)
+    # por cada paquete que quedó completo
+    def feed(self, data):
+        self._buf += data
+        records = []
+        pos = 0
+
+        if self.format is None:
+            if len(self._buf) < 24:
+                return records
+            self.format = detect_format(self._buf)
+            if self.format is None:
+                raise ValueError("Formato de captura no reconocido (se esperaba PCAP o PCAPNG)")
+            if self.format == "pcap":
+                pos = self._read_pcap_header()
+
+        if self.format == "pcap":
+            pos = self._feed_pcap(pos, records)
+        else:
+            pos = self._feed_pcapng(pos, records)
+
+        del self._buf[:pos]
+        self.n_packets += len(records)
+        return records
+
+    def _read_pcap_header(self):
+        self._endian, self._frac, self._linktype = _pcap_header(self._buf)
+        return 24
+
+    def _feed_pcap(self, pos, records):
+        buf = self._buf
+        size = len(buf)
+        record = struct.Struct(self._endian + "IIII")
+        while pos + 16 <= size:
+            ts_sec, ts_frac, caplen, origlen = record.unpack_from(buf, pos)
+            data = pos + 16
+            if data + caplen > size:
+                break
+            records.append((ts_sec + ts_frac * self._frac, caplen, origlen,
+                            bytes(buf[data:data + caplen]), self._linktype))
+            pos = data + caplen
+        return pos
+
+    def _feed_pcapng(self, pos, records):
+        buf = self._buf
+        size = len(buf)
+        section = self._section
+        while pos + 12 <= size:
+            btype, blen = section.block_header(buf, pos)
+            if blen < 12:
+                raise ValueError("Bloque PCAPNG corrupto")
+            if pos + blen > size:
+                break  # bloque incompleto: esperar más datos
+
+            packet = section.decode(buf, pos, btype, blen)
+            if packet is not None:
+                ts, caplen, origlen, data, linktype = packet
+                records.append((ts, caplen, origlen, bytes(buf[data:data + caplen]),
+                                linktype))
+            pos += blen
+        return pos
+
+
+# Abre una captura como buffer de solo lectura mapeado en memoria
+def open_capture(path):
+    with open(path, "rb") as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""  # archivo vacío: no se puede mapear
+
+
+# Lee timestamps y longitudes de todos los paquetes en arreglos compactos
+def read_packet_records(path):
+    timestamps = array("d")
+    caplens = array("I")
+    origlens = array("I")
+
+    buf = open_capture(path)
+    try:
+        for ts, caplen, origlen, _off, _linktype in iter_packets(buf):
+            timestamps.append(ts)
+            caplens.append(caplen)
+            origlens.append(origlen)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+    return PacketRecords(timestamps, caplens, origlens)
+
+
+# Recorre (timestamp, caplen, origlen) de cada paquete sin guardar nada en memoria
+def iter_records(path):
+    buf = open_capture(path)
+    try:
+        for ts, caplen, origlen, _off, _linktype in iter_packets(buf):
+            yield ts, caplen, origlen
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+# Recorre solo las longitudes capturadas, sin guardar nada en memoria
+def iter_packet_lengths(path):
+    for _ts, caplen, _origlen in iter_records(path):
+        yield caplen
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Genera capturas PCAPNG sintéticas y deterministas.
+# Sirve como sustituto local de tcpdump para probar el modo en vivo de
+# traffic2midi.py y para medir el rendimiento con capturas de cualquier tamaño.
+# Los paquetes llevan cabeceras Ethernet/IPv4/IPv6/TCP/UDP reales, con flujos
+# de popularidad desigual, ráfagas de SYN y un tráfico que sube y baja.
+
+import math
+import random
+import struct
+import sys
+import time
+
+import instrument
+
+# Parámetros por defecto
+DEFAULT_SEED = 0
+DEFAULT_RATE = 200.0          # paquetes por segundo en promedio
+DEFAULT_FLOWS = 64
+IPV6_RATIO = 0.1
+UDP_RATIO = 0.3
+SYN_RATIO = 0.02
+MAX_PAYLOAD = 1400
+RATE_PERIOD = 60.0            # segundos de un ciclo completo de subida y bajada
+
+# Cabeceras
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+PROTO_TCP = 6
+PROTO_UDP = 17
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+_SHB = 0x0A0D0D0A
+_IDB = 0x00000001
+_EPB = 0x00000006
+
+
+# Bloque PCAPNG con su longitud al inicio y al final (cuerpo alineado a 4)
+def _block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = 12 + len(body)
+    return struct.pack("<II", btype, length) + body + struct.pack("<I", length)
+
+
+# Section Header Block + Interface Description Block (Ethernet, microsegundos)
+def pcapng_header():
+    shb = _block(_SHB, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    idb = _block(_IDB, struct.pack("<HHI", 1, 0, 0))
+    return shb + idb
+
+
+# Enhanced Packet Block con timestamp en microsegundos
+def epb_block(ts, data):
+    ticks = int(round(ts * 1e6))
+    body = struct.pack("<IIIII", 0, ticks >> 32, ticks & 0xFFFFFFFF,
+                       len(data), len(data)) + data
+    return _block(_EPB, body)
+
+
+# Flujos sintéticos: (ipv6, proto, ip_origen, ip_destino, puerto_o, puerto_d)
+def make_flows(rng, n_flows=DEFAULT_FLOWS):
+    flows = []
+    for _ in range(n_flows):
+        ipv6 = rng.random() < IPV6_RATIO
+        proto = PROTO_UDP if rng.random() < UDP_RATIO else PROTO_TCP
+        n_addr = 16 if ipv6 else 4
+        src = bytes(rng.getrandbits(8) for _ in range(n_addr))
+        dst = bytes(rng.getrandbits(8) for _ in range(n_addr))
+        flows.append((ipv6, proto, src, dst,
+                      rng.randint(1024, 65535), rng.choice((53, 80, 443, 8080))))
+    return flows
+
+
+# Construye los bytes de un paquete del flujo dado
+def build_packet(flow, payload, tcp_flags=TCP_ACK):
+    ipv6, proto, src, dst, sport, dport = flow
+
+    if proto == PROTO_TCP:
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, tcp_flags,
+                         65535, 0, 0)
+    else:
+        l4 = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0)
+    l4 += payload
+
+    if ipv6:
+        ip = struct.pack("!IHBB", 6 << 28, len(l4), proto, 64) + src + dst
+        ethertype = ETHERTYPE_IPV6
+    else:
+        ip = struct.pack("!BBHHHBBH", 0x45, 0, 20 + len(l4), 0, 0, 64, proto, 0) + src + dst
+        ethertype = ETHERTYPE_IPV4
+
+    eth = b"\x02\x00\x00\x00\x00\x01\x02\x00\x00\x00\x00\x02" + struct.pack("!H", ethertype)
+    return eth + ip + l4
+
+
+# Genera (timestamp, bytes) de paquetes sintéticos de forma determinista.
+# La tasa de paquetes oscila con un periodo de RATE_PERIOD segundos y los
+# flujos se eligen con una distribución sesgada (pocos flujos dominan).
+def synth_packets(n_packets=None, seed=DEFAULT_SEED, start_ts=1_700_000_000.0,
+                  rate=DEFAULT_RATE, n_flows=DEFAULT_FLOWS):
+    rng = random.Random(seed)
+    flows = make_flows(rng, n_flows)
+    weights = [1.0 / (i + 1) for i in range(n_flows)]
+    cum_weights = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cum_weights.append(total)
+    payload_pool = bytes(rng.getrandbits(8) for _ in range(MAX_PAYLOAD))
+    seen = set()
+
+    ts = start_ts
+    i = 0
+    while n_packets is None or i < n_packets:
+        phase = math.sin(2 * math.pi * (ts - start_ts) / RATE_PERIOD)
+        ts += rng.expovariate(rate * (1.0 + 0.8 * phase))
+
+        flow_id = rng.choices(range(n_flows), cum_weights=cum_weights)[0]
+        flags = TCP_ACK
+        if flow_id not in seen or rng.random() < SYN_RATIO:
+            flags = TCP_SYN
+            seen.add(flow_id)
+        size = int(rng.random() ** 2 * MAX_PAYLOAD)
+        yield ts, build_packet(flows[flow_id], payload_pool[:size], flags)
+        i += 1
+
+
+# Escribe una captura sintética con n_packets paquetes o hasta target_bytes
+def write_synthetic_pcapng(path, n_packets=None, target_bytes=None,
+                           seed=DEFAULT_SEED, rate=DEFAULT_RATE):
+    written = 0
+    count = 0
+    with instrument.stage("captura sintética") as stage, open(path, "wb") as f:
+        header = pcapng_header()
+        f.write(header)
+        written += len(header)
+        for ts, data in synth_packets(n_packets, seed=seed, rate=rate):
+            if target_bytes is not None and written >= target_bytes:
+                break
+            block = epb_block(ts, data)
+            f.write(block)
+            written += len(block)
+            count += 1
+        stage.count(packets=count, bytes=written)
+    return count, written
+
+
+# Escribe paquetes en tiempo real (como tcpdump -w) con timestamps del reloj.
+# Cada paquete se escribe y se vacía al disco en cuanto "llega".
+def write_live(out, seconds, seed=DEFAULT_SEED, rate=DEFAULT_RATE):
+    out.write(pcapng_header())
+    out.flush()
+
+    start_wall = time.time()
+    count = 0
+    for ts, data in synth_packets(seed=seed, start_ts=start_wall, rate=rate):
+        if ts - start_wall >= seconds:
+            break
+        delay = ts - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        out.write(epb_block(time.time(), data))
+        out.flush()
+        count += 1
+    return count
+
+
+def main():
+    # Uso:
+    #   python pcapsynth.py salida.pcapng [megabytes]
+    #   python pcapsynth.py --live salida.pcapng|- [segundos]
+    args = sys.argv[1:]
+    if args and args[0] == "--live":
+        target = args[1] if len(args) > 1 else "-"
+        seconds = float(args[2]) if len(args) > 2 else 30.0
+        if target == "-":
+            count = write_live(sys.stdout.buffer, seconds)
+        else:
+            with open(target, "wb") as f:
+                count = write_live(f, seconds)
+        print(f"Se escribieron {count} paquetes en vivo.", file=sys.stderr)
+        return
+
+    path = args[0] if args else "synthetic.pcapng"
+    megabytes = float(args[1]) if len(args) > 1 else 1.0
+    count, written = write_synthetic_pcapng(path, target_bytes=int(megabytes * 1e6))
+    print(f"Captura sintética: {count} paquetes, {written} bytes en '{path}'.")
+
+
+if __name__ == "__main__":
+    main()
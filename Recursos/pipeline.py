@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Genera la pieza completa con un solo comando.
+# Corre en paralelo (un proceso por etapa) el acompañamiento del PCAP
+# (traffic2midi.py), la melodía de π (melodycsv.py), el bajo de e
+# (bajocsv.py) y la batería (drums.py). Cada etapa guarda sus eventos en un
+# EventRecorder (smfwriter.py) en memoria; al final se juntan en un solo MIDI
+# multitrack con un único mapa de tempo, sin archivos intermedios.
+# La actividad por compás de la captura se calcula una sola vez y la usan
+# el acompañamiento y la batería.
+# Reporta el tiempo de pared de cada etapa y del total.
+# Los resultados de cada etapa se guardan en una caché en disco
+# (stagecache.py) con la clave de sus entradas y parámetros: al cambiar, por
+# ejemplo, solo la batería, las demás etapas y la actividad no se recalculan.
+
+import os
+import random
+import sys
+import time
+
+import activityindex
+import bajocsv
+import digitstore
+import drums
+import flowindex
+import instrument
+import markov
+import melodycsv
+import pcapreader
+import smfwriter
+import traffic2midi
+import trafficfeatures
+from smfwriter import EventRecorder, SMFWriter
+from stagecache import CACHE_DIR, CACHE_MAX_BYTES, MB, StageCache
+
+# Entradas y salida por defecto
+PCAP_PATH = "traffic1.pcapng"
+MELODY_PATH = os.path.join("CSV", "pi.csv")
+BASS_PATH = os.path.join("CSV", "e.csv")
+OUTPUT_PATH = os.path.join("MIDI's", "pieza.mid")
+
+# Tempo único de la pieza (el de traffic2midi, melodycsv y bajocsv; la
+# batería se generaba a 120 BPM por separado)
+PIECE_TEMPO = traffic2midi.TEMPO_BPM
+TARGET_BARS = traffic2midi.TARGET_BARS
+
+STAGES = ("acompañamiento", "melodía", "bajo", "batería")
+
+# Módulos de los que depende el resultado de cada etapa (para la clave de la
+# caché; markov y smfwriter van en todas)
+TRAFFIC_MODULES = (traffic2midi, pcapreader, activityindex, trafficfeatures, flowindex)
+STAGE_MODULES = {
+    "actividad": TRAFFIC_MODULES,
+    "acompañamiento": TRAFFIC_MODULES,
+    "melodía": (melodycsv, digitstore),
+    "bajo": (bajocsv, digitstore),
+    "batería": (drums, digitstore),
+}
+
+
+# Etapa: pad y arpegios del PCAP con la actividad ya calculada
+def _accompaniment_stage(pcap_path, n_bars, activities, seed):
+    recorder = EventRecorder()
+    plan = traffic2midi.plan_accompaniment(pcap_path, n_bars=n_bars, seed=seed,
+                                           activities=activities)
+    traffic2midi.write_accompaniment(recorder, plan)
+    return recorder
+
+
+# Etapa: melodía a partir de los dígitos
+def _melody_stage(path, n_bars, seed):
+    recorder = EventRecorder()
+    rng = random if seed is None else random.Random(seed)
+    name = os.path.splitext(os.path.basename(path))[0]
+    digits = melodycsv.iterar_digitos(path)
+    melodycsv.escribir_melodia(recorder, 0, 0, digits, name,
+                               n_bars * melodycsv.BEATS_PER_BAR, rng)
+    digits.close()
+    return recorder
+
+
+# Etapa: bajo a partir de los dígitos
+def _bass_stage(path, n_bars):
+    recorder = EventRecorder()
+    name = os.path.splitext(os.path.basename(path))[0]
+    digits = bajocsv.iterar_digitos(path)
+    bajocsv.escribir_bajo(recorder, 0, 0, digits, name, n_bars * bajocsv.BEATS_PER_BAR)
+    digits.close()
+    return recorder
+
+
+# Etapa: batería que sigue la actividad de la captura
+def _drum_stage(n_bars, activities):
+    recorder = EventRecorder()
+    recorder.addTrackName(drums.DRUM_TRACK, 0, "Drums")
+    groove = drums.CompiledGroove(drums.REACTIVE_GROOVE)
+    groove.render(recorder, n_bars, activities=activities)
+    return recorder
+
+
+# Corre una etapa y mide su tiempo de pared dentro del proceso que la corre.
+# Regresa también lo medido por instrument.py en ese proceso.
+def _timed(name, stage, *args):
+    start = time.perf_counter()
+    with instrument.stage(name) as measured:
+        recorder = stage(*args)
+        measured.count(events=len(recorder.calls))
+    return recorder, time.perf_counter() - start, instrument.take_records()
+
+
+# Parámetros de cada etapa para la clave de la caché: archivos de entrada,
+# compases, semilla, tablas de escalas y acordes, y el código de los módulos
+# que la generan (si cambia el código, cambia la clave). Sin semilla la
+# melodía y el acompañamiento salen distintos cada vez y no se guardan.
+def stage_keys(cache, pcap_path, melody_path, bass_path, n_bars, seed):
+    def code(stage):
+        return [cache.file_digest(m.__file__)
+                for m in (markov, smfwriter) + STAGE_MODULES[stage]]
+
+    pcap = cache.file_digest(pcap_path)
+    activity = cache.key("actividad", pcap=pcap, bars=n_bars, mode=traffic2midi.BAR_MODE,
+                         code=code("actividad"))
+    keys = {
+        "acompañamiento": None if seed is None else cache.key(
+            "acompañamiento", pcap=pcap, bars=n_bars, seed=seed,
+            tempo=traffic2midi.TEMPO_BPM, chords=traffic2midi.CHORDS,
+            transitions=traffic2midi.CHORD_TRANSITIONS,
+            rhythms=traffic2midi.RHYTHM_PATTERNS, activity=activity,
+            code=code("acompañamiento")),
+        "melodía": None if seed is None else cache.key(
+            "melodía", digits=cache.file_digest(melody_path), bars=n_bars, seed=seed,
+            tempo=melodycsv.BASE_TEMPO, scale=melodycsv.ESCALA_DO,
+            transitions=melodycsv.DEGREE_TRANSITIONS, code=code("melodía")),
+        "bajo": cache.key(
+            "bajo", digits=cache.file_digest(bass_path), bars=n_bars,
+            tempo=bajocsv.BASE_TEMPO, scale=bajocsv.ESCALA_DO, code=code("bajo")),
+        "batería": cache.key(
+            "batería", bars=n_bars, groove=drums.REACTIVE_GROOVE, activity=activity,
+            code=code("batería")),
+    }
+    return activity, keys
+
+
+# Canales para cada etapa: los de la primera se quedan igual y las demás
+# se pasan a canales libres (el 10 GM, índice 9, solo para batería)
+def assign_channels(recorders):
+    used = set()
+    maps = []
+    for recorder in recorders:
+        mapping = {}
+        for channel in sorted(recorder.channels_used()):
+            if channel == drums.DRUM_CHANNEL or (channel not in used
+                                                 and channel not in mapping.values()):
+                mapping[channel] = channel
+            else:
+                free = [c for c in range(16) if c != drums.DRUM_CHANNEL
+                        and c not in used and c not in mapping.values()]
+                if not free:
+                    raise ValueError("No quedan canales MIDI libres para todas las etapas")
+                mapping[channel] = free[0]
+        used.update(mapping.values())
+        maps.append(mapping)
+    return maps
+
+
+# Junta los eventos de las etapas en un solo MIDI: los tracks de cada etapa
+# van uno tras otro y el tempo se pone una sola vez. midi es cualquier
+# objeto con los métodos de SMFWriter (por defecto, un SMFWriter nuevo).
+def merge_recorders(recorders, tempo=PIECE_TEMPO, midi=None):
+    counts = [max(recorder.tracks_used(), default=-1) + 1 for recorder in recorders]
+    if midi is None:
+        midi = SMFWriter(numTracks=sum(counts))
+    midi.addTempo(0, 0, tempo)
+    offset = 0
+    for recorder, mapping, count in zip(recorders, assign_channels(recorders), counts):
+        recorder.replay(midi, offset, mapping, tempo=False)
+        offset += count
+    return midi
+
+
+# Corre las etapas (con workers=1, una tras otra en este proceso). cache es
+# un StageCache (None para no usar caché). Regresa (EventRecorder de cada
+# etapa en el orden de STAGES, tiempos en segundos de la actividad y de cada
+# etapa); las etapas tomadas de la caché cuentan 0.
+def run_stages(pcap_path=PCAP_PATH, melody_path=MELODY_PATH, bass_path=BASS_PATH,
+               n_bars=TARGET_BARS, seed=None, workers=None, cache=None):
+    start = time.perf_counter()
+    times = {}
+
+    def compute_activities():
+        return traffic2midi.compute_bar_activities_from_pcap(pcap_path, n_bars=n_bars)
+
+    if cache is None:
+        keys = dict.fromkeys(STAGES)
+        activities = compute_activities()
+    else:
+        activity_key, keys = stage_keys(cache, pcap_path, melody_path, bass_path,
+                                        n_bars, seed)
+        activities = cache.cached(activity_key, compute_activities)
+    times["actividad"] = time.perf_counter() - start
+
+    jobs = {
+        "acompañamiento": (_accompaniment_stage, pcap_path, n_bars, activities, seed),
+        "melodía": (_melody_stage, melody_path, n_bars, seed),
+        "bajo": (_bass_stage, bass_path, n_bars),
+        "batería": (_drum_stage, n_bars, activities),
+    }
+    results = {}
+    if cache is not None:
+        for name in STAGES:
+            if keys[name] is not None:
+                found, recorder = cache.get(keys[name])
+                if found:
+                    results[name] = (recorder, 0.0, [])
+                    del jobs[name]
+
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers == 1 or len(jobs) <= 1:
+        for name, job in jobs.items():
+            results[name] = _timed(name, *job)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(_timed, name, *job) for name, job in jobs.items()}
+            for name, future in futures.items():
+                results[name] = future.result()
+    stages_done = time.perf_counter()
+
+    recorders = []
+    for name in STAGES:
+        recorder, seconds, records = results[name]
+        instrument.add_records(records)
+        if cache is not None and name in jobs and keys[name] is not None:
+            cache.put(keys[name], recorder)
+        recorders.append(recorder)
+        times[name] = seconds
+    times["etapas (pared)"] = stages_done - start - times["actividad"]
+    return recorders, times
+
+
+# Genera la pieza completa en output_path (mismas opciones que run_stages).
+# Regresa los tiempos (segundos) por etapa, de la actividad, de la mezcla y
+# del total.
+def build_piece(output_path=OUTPUT_PATH, pcap_path=PCAP_PATH, melody_path=MELODY_PATH,
+                bass_path=BASS_PATH, n_bars=TARGET_BARS, seed=None, tempo=PIECE_TEMPO,
+                workers=None, cache=None):
+    start = time.perf_counter()
+    recorders, times = run_stages(pcap_path, melody_path, bass_path, n_bars, seed,
+                                  workers, cache)
+    stages_done = time.perf_counter()
+
+    with instrument.stage("mezcla"):
+        midi = merge_recorders(recorders, tempo)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "wb") as f:
+        midi.writeFile(f)
+    times["mezcla"] = time.perf_counter() - stages_done
+    times["total"] = time.perf_counter() - start
+    return times
+
+
+# Tabla de tiempos por etapa
+def print_times(times):
+    for name, seconds in times.items():
+        print(f"{name:<16}{seconds * 1000:>10.1f} ms")
+    work = sum(times[name] for name in STAGES)
+    wall = times["etapas (pared)"]
+    print(f"Etapas: {work:.2f} s de trabajo en {wall:.2f} s de pared "
+          f"({work / wall if wall else 0:.1f}x).")
+
+
+# Uso: python pipeline.py [--pcap captura] [--melody digitos] [--bass digitos]
+#                         [--bars N] [--seed N] [--tempo BPM] [--workers N] [--out archivo.mid]
+#                         [--cache-dir carpeta] [--cache-mb MB] [--no-cache]
+def main():
+    options = {"pcap": PCAP_PATH, "melody": MELODY_PATH, "bass": BASS_PATH,
+               "bars": TARGET_BARS, "seed": None, "tempo": PIECE_TEMPO,
+               "workers": None, "out": OUTPUT_PATH, "cache-dir": CACHE_DIR,
+               "cache-mb": CACHE_MAX_BYTES // MB, "no-cache": False}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        name = args[i][2:]
+        if args[i] == "--no-cache":
+            options["no-cache"] = True
+            i += 1
+            continue
+        if not args[i].startswith("--") or name not in options or i + 1 >= len(args):
+            print(f"Opción no válida: '{args[i]}'")
+            sys.exit(1)
+        value = args[i + 1]
+        text = ("pcap", "melody", "bass", "out", "cache-dir")
+        options[name] = value if name in text else int(value)
+        i += 2
+
+    for name in ("pcap", "melody", "bass"):
+        if not os.path.exists(options[name]):
+            print(f"No se encontró el archivo: {options[name]}")
+            sys.exit(1)
+
+    cache = None
+    if not options["no-cache"]:
+        cache = StageCache(options["cache-dir"], options["cache-mb"] * MB)
+    times = build_piece(options["out"], options["pcap"], options["melody"], options["bass"],
+                        options["bars"], options["seed"], options["tempo"], options["workers"],
+                        cache)
+    print_times(times)
+    if cache is not None:
+        cache.save_stats()
+        print(cache.summary())
+    print(f"Pieza generada en: {options['out']}")
+
+
+if __name__ == "__main__":
+    main()
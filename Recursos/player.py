@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Reproduce la pieza en tiempo real en vez de escribir un .mid.
+# Las etapas de pipeline.py (acompañamiento, melodía, bajo y batería) se
+# juntan igual que para el archivo, pero en una línea de tiempo de mensajes
+# MIDI que un planificador con asyncio manda a su hora, al tempo de la
+# pieza, con el reloj monotónico. Los mensajes van a una salida
+# intercambiable:
+#   udp:host:puerto[/dirección]   mensajes OSC por UDP (tipo "m", MIDI)
+#   pipe:ruta                     bytes MIDI crudos a una tubería con nombre
+#   memory                        se guardan en memoria (para pruebas)
+# Al terminar reporta el retraso de cada mensaje respecto a su hora (media,
+# percentiles, máximo) y el jitter (desviación estándar del retraso).
+
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import time
+
+import pipeline
+from smfwriter import (
+    NOTE_OFF, NOTE_ON, PRIORITY_NOTE_OFF, PRIORITY_NOTE_ON, PRIORITY_PROGRAM,
+    PROGRAM_CHANGE, TICKS_PER_QUARTER
+)
+from stagecache import CACHE_DIR, StageCache
+
+# Espera antes del primer mensaje (segundos)
+START_DELAY = 0.5
+
+# Los últimos segundos antes de cada mensaje se esperan activamente (cediendo
+# el loop) en vez de dormir, porque asyncio.sleep puede despertar tarde
+SPIN_SECONDS = 0.002
+
+# Un mensaje que sale con más retraso que esto cuenta como tarde (segundos)
+LATE_THRESHOLD = 0.005
+
+CONTROL_CHANGE = 0xB0
+ALL_NOTES_OFF = 123
+
+OSC_ADDRESS = "/midi"
+
+
+# Línea de tiempo de mensajes MIDI. Tiene los métodos de SMFWriter para que
+# EventRecorder.replay (y pipeline.merge_recorders) la llene igual que un
+# archivo; los tiempos se redondean a ticks como en el archivo.
+class EventTimeline:
+    def __init__(self, ticks_per_quarternote=TICKS_PER_QUARTER):
+        self.ticks_per_quarternote = ticks_per_quarternote
+        self.events = []        # (tick, prioridad, orden, mensaje)
+        self.tempo = None
+
+    def quarter_to_tick(self, time):
+        return int(time * self.ticks_per_quarternote)
+
+    def _add(self, tick, priority, message):
+        self.events.append((tick, priority, len(self.events), message))
+
+    def addNote(self, track, channel, pitch, time, duration, volume):
+        self.add_notes(track, channel, [(pitch, time, duration, volume)])
+
+    def add_notes(self, track, channel, notes):
+        count = 0
+        for pitch, time, duration, volume in notes:
+            tick = self.quarter_to_tick(time)
+            self._add(tick, PRIORITY_NOTE_ON, bytes((NOTE_ON | channel, pitch, volume)))
+            self._add(tick + self.quarter_to_tick(duration), PRIORITY_NOTE_OFF,
+                      bytes((NOTE_OFF | channel, pitch, volume)))
+            count += 1
+        return count
+
+    def add_template(self, track, template, time):
+        return self.add_notes(track, template.channel,
+                              [(pitch, time + t, duration, volume)
+                               for pitch, t, duration, volume in template.notes])
+
+    # Un solo tempo para toda la pieza (el primero que llega)
+    def addTempo(self, track, time, tempo):
+        if self.tempo is None:
+            self.tempo = tempo
+
+    def addProgramChange(self, tracknum, channel, time, program):
+        self._add(self.quarter_to_tick(time), PRIORITY_PROGRAM,
+                  bytes((PROGRAM_CHANGE | channel, program)))
+
+    def addTrackName(self, track, time, trackName):
+        pass
+
+    def flush(self, time):
+        pass
+
+    # Mensajes en orden de envío: [(tick, mensaje)]. Como en el archivo, de
+    # varios note-on (o note-off) de la misma nota y canal en el mismo tick
+    # solo se manda el primero.
+    def messages(self):
+        seen = set()
+        messages = []
+        for tick, _priority, _seq, message in sorted(self.events):
+            key = (tick, message[:2])
+            if key not in seen:
+                seen.add(key)
+                messages.append((tick, message))
+        return messages
+
+
+# Salida en memoria: guarda (hora de envío, mensaje)
+class MemorySink:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append((time.monotonic(), message))
+
+    def close(self):
+        pass
+
+
+# Mensaje OSC con un argumento MIDI (tipo "m": puerto, estado, dato 1, dato 2)
+def osc_midi_message(address, message):
+    def padded(text):
+        data = text.encode("ascii") + b"\0"
+        return data + b"\0" * (-len(data) % 4)
+    return padded(address) + padded(",m") + b"\0" + message.ljust(3, b"\0")
+
+
+# Salida OSC por UDP (por ejemplo a SuperCollider, Pure Data o Max)
+class UDPOSCSink:
+    def __init__(self, host, port, address=OSC_ADDRESS):
+        self.target = (host, port)
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, message):
+        try:
+            self.socket.sendto(osc_midi_message(self.address, message), self.target)
+        except BlockingIOError:
+            pass            # UDP: si el buffer está lleno el mensaje se pierde
+
+    def close(self):
+        self.socket.close()
+
+
+# Salida a una tubería con nombre (se crea si no existe). Abrirla espera a
+# que otro proceso la abra para leer.
+class PipeSink:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        self.pipe = open(path, "wb", buffering=0)
+
+    def send(self, message):
+        self.pipe.write(message)
+
+    def close(self):
+        self.pipe.close()
+
+
+# Salida a partir de su descripción ("memory", "udp:host:puerto[/dirección]"
+# o "pipe:ruta")
+def open_sink(spec):
+    kind, _sep, rest = spec.partition(":")
+    if kind == "memory":
+        return MemorySink()
+    if kind == "udp":
+        target, _sep, address = rest.partition("/")
+        host, _sep, port = target.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Salida UDP no válida: '{spec}' (usa udp:host:puerto)")
+        return UDPOSCSink(host, int(port), "/" + address if address else OSC_ADDRESS)
+    if kind == "pipe" and rest:
+        return PipeSink(rest)
+    raise ValueError(f"Salida desconocida: '{spec}' (memory, udp:host:puerto o pipe:ruta)")
+
+
+# Retraso de cada mensaje respecto a su hora programada (segundos)
+class PlaybackStats:
+    def __init__(self, late_threshold=LATE_THRESHOLD):
+        self.late_threshold = late_threshold
+        self.lateness = []
+
+    def summary(self):
+        if not self.lateness:
+            return {"events": 0}
+        ordered = sorted(self.lateness)
+        n = len(ordered)
+        return {
+            "events": n,
+            "mean": statistics.fmean(ordered),
+            "p50": ordered[n // 2],
+            "p95": ordered[min(n - 1, int(0.95 * n))],
+            "p99": ordered[min(n - 1, int(0.99 * n))],
+            "max": ordered[-1],
+            "jitter": statistics.pstdev(ordered),
+            "late": sum(1 for x in ordered if x > self.late_threshold),
+            "late_threshold": self.late_threshold,
+        }
+
+
+# Manda los mensajes [(tick, mensaje)] a sink a su hora, al tempo dado.
+# Si se cancela a la mitad, apaga las notas de los canales usados.
+# Regresa las estadísticas de retraso.
+async def play(messages, sink, tempo, ticks_per_quarternote=TICKS_PER_QUARTER,
+               start_delay=START_DELAY, spin=SPIN_SECONDS, stats=None):
+    clock = time.monotonic
+    stats = stats or PlaybackStats()
+    lateness = stats.lateness
+    seconds_per_tick = 60.0 / (tempo * ticks_per_quarternote)
+    channels = {message[0] & 0x0F for _tick, message in messages}
+
+    start = clock() + start_delay
+    sent = 0
+    try:
+        n = len(messages)
+        while sent < n:
+            tick = messages[sent][0]
+            due = start + tick * seconds_per_tick
+            wait = due - clock()
+            if wait > spin:
+                await asyncio.sleep(wait - spin)
+            while clock() < due:
+                await asyncio.sleep(0)
+            while sent < n and messages[sent][0] == tick:
+                sink.send(messages[sent][1])
+                lateness.append(clock() - due)
+                sent += 1
+    finally:
+        if sent < len(messages):
+            for channel in sorted(channels):
+                sink.send(bytes((CONTROL_CHANGE | channel, ALL_NOTES_OFF, 0)))
+    return stats
+
+
+# Línea de tiempo de la pieza a partir de los EventRecorder de las etapas
+def timeline_from_recorders(recorders, tempo=pipeline.PIECE_TEMPO):
+    timeline = EventTimeline()
+    pipeline.merge_recorders(recorders, tempo, timeline)
+    return timeline
+
+
+def print_stats(summary):
+    if not summary["events"]:
+        print("No se mandó ningún mensaje.")
+        return
+    ms = {key: summary[key] * 1000 for key in ("mean", "p50", "p95", "p99", "max", "jitter")}
+    print(f"{summary['events']} mensajes; retraso medio {ms['mean']:.2f} ms, "
+          f"p50 {ms['p50']:.2f} ms, p95 {ms['p95']:.2f} ms, p99 {ms['p99']:.2f} ms, "
+          f"máx {ms['max']:.2f} ms; jitter {ms['jitter']:.2f} ms")
+    print(f"{summary['late']} mensajes con más de "
+          f"{summary['late_threshold'] * 1000:.0f} ms de retraso.")
+
+
+# Uso: python player.py [--sink udp:127.0.0.1:57120[/midi] | pipe:ruta | memory]
+#                       [--pcap captura] [--melody digitos] [--bass digitos]
+#                       [--bars N] [--seed N] [--tempo BPM] [--no-cache]
+def main():
+    options = {"sink": "udp:127.0.0.1:57120", "pcap": pipeline.PCAP_PATH,
+               "melody": pipeline.MELODY_PATH, "bass": pipeline.BASS_PATH,
+               "bars": pipeline.TARGET_BARS, "seed": None, "tempo": pipeline.PIECE_TEMPO,
+               "no-cache": False}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        name = args[i][2:]
+        if args[i] == "--no-cache":
+            options["no-cache"] = True
+            i += 1
+            continue
+        if not args[i].startswith("--") or name not in options or i + 1 >= len(args):
+            print(f"Opción no válida: '{args[i]}'")
+            sys.exit(1)
+        value = args[i + 1]
+        options[name] = value if name in ("sink", "pcap", "melody", "bass") else int(value)
+        i += 2
+
+    try:
+        sink = open_sink(options["sink"])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    cache = None if options["no-cache"] else StageCache(CACHE_DIR)
+    recorders, _times = pipeline.run_stages(options["pcap"], options["melody"],
+                                            options["bass"], options["bars"],
+                                            options["seed"], cache=cache)
+    timeline = timeline_from_recorders(recorders, options["tempo"])
+    messages = timeline.messages()
+    seconds = messages[-1][0] * 60.0 / (options["tempo"] * TICKS_PER_QUARTER) if messages else 0
+    print(f"Reproduciendo {len(messages)} mensajes ({seconds:.0f} s) en {options['sink']}... "
+          f"(Ctrl+C para parar)")
+
+    stats = PlaybackStats()
+    try:
+        asyncio.run(play(messages, sink, options["tempo"], stats=stats))
+    except KeyboardInterrupt:
+        print("\nDetenido.")
+    finally:
+        sink.close()
+    print_stats(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
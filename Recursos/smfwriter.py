@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Escritor de archivos MIDI estándar (SMF formato 1) sin midiutil.
+# Las notas de cada track se guardan en arreglos paralelos compactos (tick,
+# duración, canal, nota, velocidad y orden de inserción) en lugar de dos
+# objetos de Python por nota. Al escribir, cada note-on/note-off se vuelve un
+# entero empaquetado (tick, prioridad, orden), se ordenan todos de una vez y
+# se codifican con tiempos delta.
+# Acepta los métodos de midiutil.MIDIFile que usan los scripts (addNote,
+# addTempo, addProgramChange, addTrackName, writeFile) más add_notes para
+# agregar notas en lote, y escribe los mismos bytes que midiutil: mismo orden
+# de eventos, misma eliminación de duplicados y mismo deinterleave de notas
+# encimadas.
+# SMFStreamWriter escribe piezas de cualquier duración: los compases que ya
+# terminaron se codifican y salen al disco con flush(), así la memoria no
+# crece con la duración de la pieza.
+# NoteTemplate guarda un grupo de notas ya convertido a ticks y a eventos;
+# add_template lo copia desplazado a otro tiempo (patrones que se repiten).
+# EventRecorder solo guarda lo que se agrega, para generar tracks en otro
+# proceso y juntarlos después en un solo archivo.
+
+import shutil
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+
+import instrument
+
+TICKS_PER_QUARTER = 960
+
+# Prioridad de cada tipo de evento dentro del mismo tick (igual que midiutil)
+PRIORITY_TRACK_NAME = 0
+PRIORITY_PROGRAM = 1
+PRIORITY_NOTE_OFF = 2
+PRIORITY_NOTE_ON = 3
+PRIORITY_TEMPO = 3
+
+# Clave de orden de un evento: tick | prioridad | orden de inserción
+_SEQ_BITS = 40
+_PRIORITY_SHIFT = _SEQ_BITS
+_TICK_SHIFT = _SEQ_BITS + 2
+_SEQ_MASK = (1 << _SEQ_BITS) - 1
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+END_OF_TRACK = b"\x00\xff\x2f\x00"
+
+
+# Cantidad de longitud variable de MIDI (7 bits por byte, el más
+# significativo primero)
+def var_length(value):
+    out = bytearray((value & 0x7F,))
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.reverse()
+    return bytes(out)
+
+
+# Eventos de un track: notas en arreglos paralelos y eventos meta/de
+# programa (pocos) como bytes ya codificados
+class _Track:
+    def __init__(self):
+        self.ticks = array("q")
+        self.durations = array("q")
+        self.channels = array("B")
+        self.pitches = array("B")
+        self.velocities = array("B")
+        self.seqs = array("q")
+
+        self.meta = {}          # orden -> (tick, prioridad, bytes del evento)
+        self.meta_seqs = []
+        self.next_seq = 0
+
+    def add_note(self, channel, pitch, tick, duration, velocity):
+        self.ticks.append(tick)
+        self.durations.append(duration)
+        self.channels.append(channel)
+        self.pitches.append(pitch)
+        self.velocities.append(velocity)
+        self.seqs.append(self.next_seq)
+        self.next_seq += 1
+
+    def add_meta(self, tick, priority, data):
+        self.meta[self.next_seq] = (tick, priority, data)
+        self.meta_seqs.append(self.next_seq)
+        self.next_seq += 1
+
+    # Índice de la nota con ese orden de inserción
+    def note_index(self, seq):
+        if not self.meta_seqs:
+            return seq
+        return seq - bisect_right(self.meta_seqs, seq)
+
+    # Claves de orden de todos los eventos. Con remove_duplicates se quedan
+    # solo los primeros de cada (tick, nota, canal) para note-on y note-off
+    # por separado, y los eventos meta repetidos, como hace midiutil.
+    def event_keys(self, remove_duplicates):
+        on_prio = PRIORITY_NOTE_ON << _PRIORITY_SHIFT
+        off_prio = PRIORITY_NOTE_OFF << _PRIORITY_SHIFT
+        keys = []
+
+        if remove_duplicates:
+            seen_on = set()
+            seen_off = set()
+            for tick, dur, ch, pitch, seq in zip(self.ticks, self.durations,
+                                                 self.channels, self.pitches, self.seqs):
+                on = (tick, pitch, ch)
+                if on not in seen_on:
+                    seen_on.add(on)
+                    keys.append((tick << _TICK_SHIFT) | on_prio | seq)
+                off = (tick + dur, pitch, ch)
+                if off not in seen_off:
+                    seen_off.add(off)
+                    keys.append(((tick + dur) << _TICK_SHIFT) | off_prio | seq)
+            seen_meta = set()
+            for seq, (tick, priority, data) in self.meta.items():
+                if (tick, data) not in seen_meta:
+                    seen_meta.add((tick, data))
+                    keys.append((tick << _TICK_SHIFT) | (priority << _PRIORITY_SHIFT) | seq)
+        else:
+            keys = [(t << _TICK_SHIFT) | on_prio | s for t, s in zip(self.ticks, self.seqs)]
+            keys += [((t + d) << _TICK_SHIFT) | off_prio | s
+                     for t, d, s in zip(self.ticks, self.durations, self.seqs)]
+            keys += [(tick << _TICK_SHIFT) | (priority << _PRIORITY_SHIFT) | seq
+                     for seq, (tick, priority, _data) in self.meta.items()]
+
+        keys.sort()
+        return keys
+
+    # Deinterleave de midiutil: con dos notas iguales (nota y canal)
+    # encimadas, el note-off que llega con otra todavía sonando se mueve al
+    # inicio de la nota más reciente, para no cortar la que sigue sonando
+    def deinterleave(self, keys):
+        stacks = {}
+        changed = False
+        for i, key in enumerate(keys):
+            seq = key & _SEQ_MASK
+            if seq in self.meta:
+                continue
+            note = self.note_index(seq)
+            voice = (self.pitches[note], self.channels[note])
+            if (key >> _PRIORITY_SHIFT) & 3 == PRIORITY_NOTE_ON:
+                stacks.setdefault(voice, []).append(key >> _TICK_SHIFT)
+            else:
+                stack = stacks.get(voice)
+                if not stack:
+                    continue
+                start = stack.pop()
+                if stack:
+                    keys[i] = (start << _TICK_SHIFT) | (key & ((1 << _TICK_SHIFT) - 1))
+                    changed = True
+        if changed:
+            keys.sort()
+        return keys
+
+    # Bytes del track (sin la cabecera MTrk)
+    def encode(self, remove_duplicates, deinterleave):
+        keys = self.event_keys(remove_duplicates)
+        if deinterleave:
+            keys = self.deinterleave(keys)
+
+        ticks = self.ticks
+        channels = self.channels
+        pitches = self.pitches
+        velocities = self.velocities
+        meta = self.meta
+        note_index = self.note_index
+
+        out = bytearray()
+        previous = 0
+        for key in keys:
+            tick = key >> _TICK_SHIFT
+            delta = tick - previous
+            previous = tick
+            if delta < 0x80:
+                out.append(delta)
+            else:
+                out += var_length(delta)
+
+            seq = key & _SEQ_MASK
+            event = meta.get(seq)
+            if event is not None:
+                out += event[2]
+                continue
+            note = note_index(seq)
+            if (key >> _PRIORITY_SHIFT) & 3 == PRIORITY_NOTE_ON:
+                status = NOTE_ON
+            else:
+                status = NOTE_OFF
+            out += bytes((status | channels[note], pitches[note], velocities[note]))
+        out += END_OF_TRACK
+        return bytes(out)
+
+
+# Grupo de notas (pitch, tiempo, duración, velocidad) de un canal, con
+# tiempos relativos al inicio del grupo, ya convertido a ticks y a eventos
+# note-on/note-off con su clave de orden. add_template lo agrega desplazado
+# sin volver a convertir nota por nota. El tick de cada nota es el del
+# inicio más el de su tiempo relativo (se redondean por separado).
+class NoteTemplate:
+    def __init__(self, channel, notes, ticks_per_quarternote=TICKS_PER_QUARTER):
+        tpq = ticks_per_quarternote
+        self.channel = channel
+        self.ticks_per_quarternote = tpq
+        self.ticks = array("q")
+        self.durations = array("q")
+        self.pitches = array("B")
+        self.velocities = array("B")
+        self.events = []        # (clave relativa, bytes del evento)
+        self.notes = list(notes)
+
+        on_prio = PRIORITY_NOTE_ON << _PRIORITY_SHIFT
+        off_prio = PRIORITY_NOTE_OFF << _PRIORITY_SHIFT
+        for seq, (pitch, time, duration, volume) in enumerate(self.notes):
+            tick = int(time * tpq)
+            ticks = int(duration * tpq)
+            self.ticks.append(tick)
+            self.durations.append(ticks)
+            self.pitches.append(pitch)
+            self.velocities.append(volume)
+            self.events.append(((tick << _TICK_SHIFT) | on_prio | seq,
+                                bytes((NOTE_ON | channel, pitch, volume))))
+            self.events.append((((tick + ticks) << _TICK_SHIFT) | off_prio | seq,
+                                bytes((NOTE_OFF | channel, pitch, volume))))
+        self.count = len(self.ticks)
+
+
+# Archivo MIDI de formato 1: el track 0 del archivo es el de tempo y los
+# tracks de notas se numeran desde 0 igual que en midiutil
+class SMFWriter:
+    def __init__(self, numTracks=1, removeDuplicates=True, deinterleave=True,
+                 ticks_per_quarternote=TICKS_PER_QUARTER):
+        self.numTracks = numTracks + 1
+        self.remove_duplicates = removeDuplicates
+        self.deinterleave = deinterleave
+        self.ticks_per_quarternote = ticks_per_quarternote
+        self.tracks = [_Track() for _ in range(self.numTracks)]
+
+    def quarter_to_tick(self, time):
+        return int(time * self.ticks_per_quarternote)
+
+    def addNote(self, track, channel, pitch, time, duration, volume):
+        self.tracks[track + 1].add_note(channel, pitch, self.quarter_to_tick(time),
+                                        self.quarter_to_tick(duration), volume)
+
+    # Agrega en lote notas (pitch, tiempo, duración, velocidad) de un canal
+    def add_notes(self, track, channel, notes):
+        t = self.tracks[track + 1]
+        tpq = self.ticks_per_quarternote
+        ticks_append = t.ticks.append
+        durations_append = t.durations.append
+        pitches_append = t.pitches.append
+        velocities_append = t.velocities.append
+        seqs_append = t.seqs.append
+        seq = t.next_seq
+        count = 0
+        for pitch, time, duration, volume in notes:
+            ticks_append(int(time * tpq))
+            durations_append(int(duration * tpq))
+            pitches_append(pitch)
+            velocities_append(volume)
+            seqs_append(seq + count)
+            count += 1
+        t.channels.extend(bytes((channel,)) * count)
+        t.next_seq = seq + count
+        return count
+
+    # Agrega una NoteTemplate empezando en time (en negras)
+    def add_template(self, track, template, time):
+        t = self.tracks[track + 1]
+        offset = self.quarter_to_tick(time)
+        count = template.count
+        seq = t.next_seq
+        t.ticks.extend(map(offset.__add__, template.ticks))
+        t.durations.extend(template.durations)
+        t.pitches.extend(template.pitches)
+        t.velocities.extend(template.velocities)
+        t.channels.extend(bytes((template.channel,)) * count)
+        t.seqs.extend(range(seq, seq + count))
+        t.next_seq = seq + count
+        return count
+
+    # En formato 1 el tempo siempre va al track de tempo
+    def addTempo(self, track, time, tempo):
+        data = b"\xff\x51\x03" + struct.pack(">L", int(60000000 / tempo))[1:]
+        self.tracks[0].add_meta(self.quarter_to_tick(time), PRIORITY_TEMPO, data)
+
+    def addProgramChange(self, tracknum, channel, time, program):
+        self.tracks[tracknum + 1].add_meta(self.quarter_to_tick(time), PRIORITY_PROGRAM,
+                                           bytes((PROGRAM_CHANGE | channel, program)))
+
+    def addTrackName(self, track, time, trackName):
+        name = trackName.encode("ISO-8859-1")
+        self.tracks[track + 1].add_meta(self.quarter_to_tick(time), PRIORITY_TRACK_NAME,
+                                        b"\xff\x03" + var_length(len(name)) + name)
+
+    # Cabecera MThd del archivo
+    def header(self):
+        return b"MThd" + struct.pack(">LHHH", 6, 1, self.numTracks,
+                                     self.ticks_per_quarternote)
+
+    def writeFile(self, fileHandle):
+        with instrument.stage("writeFile", tracks=len(self.tracks)) as stage:
+            fileHandle.write(self.header())
+            for track in self.tracks:
+                data = track.encode(self.remove_duplicates, self.deinterleave)
+                fileHandle.write(b"MTrk" + struct.pack(">L", len(data)))
+                fileHandle.write(data)
+                stage.count(bytes=8 + len(data))
+
+
+# Track de SMFStreamWriter: eventos pendientes (aún pueden llegar otros en el
+# mismo tick) y los bytes ya codificados en un archivo temporal
+class _StreamTrack:
+    def __init__(self):
+        self.spool = tempfile.TemporaryFile()
+        self.length = 0
+        self.pending = []       # (clave, bytes del evento sin el delta)
+        self.next_seq = 0
+        self.last_tick = 0
+        self.seen = set()       # eventos pendientes, para descartar duplicados
+        self.stacks = {}        # notas sonando por (nota, canal), para deinterleave
+
+    def add(self, tick, priority, data, remove_duplicates):
+        if remove_duplicates:
+            # note-on/off: iguales si coinciden tick, estado+canal y nota;
+            # eventos meta y de programa: si coinciden todos sus bytes
+            identity = (tick, data[:2]) if data[0] < 0xC0 else (tick, data)
+            if identity in self.seen:
+                self.next_seq += 1
+                return
+            self.seen.add(identity)
+        self.pending.append(((tick << _TICK_SHIFT) | (priority << _PRIORITY_SHIFT)
+                             | self.next_seq, data))
+        self.next_seq += 1
+
+    # Codifica los eventos con tick < until (todos con until=None)
+    def flush(self, until, deinterleave):
+        if until is None:
+            ready, self.pending = self.pending, []
+        else:
+            limit = until << _TICK_SHIFT
+            ready = [e for e in self.pending if e[0] < limit]
+            self.pending = [e for e in self.pending if e[0] >= limit]
+            self.seen = {identity for identity in self.seen if identity[0] >= until}
+        if not ready:
+            return
+        ready.sort()
+
+        if deinterleave:
+            changed = False
+            for i, (key, data) in enumerate(ready):
+                status = data[0] & 0xF0
+                if status not in (NOTE_ON, NOTE_OFF):
+                    continue
+                voice = (data[1], data[0] & 0x0F)
+                if status == NOTE_ON:
+                    self.stacks.setdefault(voice, []).append(key >> _TICK_SHIFT)
+                    continue
+                stack = self.stacks.get(voice)
+                if not stack:
+                    continue
+                start = stack.pop()
+                if stack:
+                    # Un note-off que se mueve antes de lo ya escrito se
+                    # queda al inicio de este bloque
+                    start = max(start, self.last_tick)
+                    ready[i] = ((start << _TICK_SHIFT) | (key & ((1 << _TICK_SHIFT) - 1)),
+                                data)
+                    changed = True
+                else:
+                    del self.stacks[voice]
+            if changed:
+                ready.sort()
+
+        out = bytearray()
+        previous = self.last_tick
+        for key, data in ready:
+            tick = key >> _TICK_SHIFT
+            delta = tick - previous
+            previous = tick
+            if delta < 0x80:
+                out.append(delta)
+            else:
+                out += var_length(delta)
+            out += data
+        self.last_tick = previous
+        self.spool.write(out)
+        self.length += len(out)
+
+    # Cierra el track y copia su chunk MTrk completo a f
+    def write_chunk(self, f):
+        self.spool.write(END_OF_TRACK)
+        self.length += len(END_OF_TRACK)
+        f.write(b"MTrk" + struct.pack(">L", self.length))
+        self.spool.seek(0)
+        shutil.copyfileobj(self.spool, f)
+        self.spool.close()
+
+
+# Archivo MIDI de formato 1 escrito por partes. Mismos métodos que SMFWriter;
+# flush(time) codifica y manda al disco todos los eventos anteriores a time
+# (en negras), así que después solo se pueden agregar notas que empiecen en
+# time o después. Cada track se codifica en un archivo temporal y close()
+# arma el archivo final con la longitud de cada chunk ya conocida.
+# Produce los mismos bytes que SMFWriter, salvo cuando dos notas iguales se
+# enciman a través de un flush (el note-off movido por el deinterleave no
+# puede regresar antes de lo ya escrito).
+class SMFStreamWriter:
+    def __init__(self, path, numTracks=1, removeDuplicates=True, deinterleave=True,
+                 ticks_per_quarternote=TICKS_PER_QUARTER):
+        self.path = path
+        self.numTracks = numTracks + 1
+        self.remove_duplicates = removeDuplicates
+        self.deinterleave = deinterleave
+        self.ticks_per_quarternote = ticks_per_quarternote
+        self.tracks = [_StreamTrack() for _ in range(self.numTracks)]
+        self.closed = False
+
+    def quarter_to_tick(self, time):
+        return int(time * self.ticks_per_quarternote)
+
+    def addNote(self, track, channel, pitch, time, duration, volume):
+        self.add_notes(track, channel, ((pitch, time, duration, volume),))
+
+    # Agrega en lote notas (pitch, tiempo, duración, velocidad) de un canal
+    def add_notes(self, track, channel, notes):
+        t = self.tracks[track + 1]
+        tpq = self.ticks_per_quarternote
+        on_prio = PRIORITY_NOTE_ON
+        off_prio = PRIORITY_NOTE_OFF
+        count = 0
+        for pitch, time, duration, volume in notes:
+            tick = int(time * tpq)
+            seq = t.next_seq
+            t.add(tick, on_prio, bytes((NOTE_ON | channel, pitch, volume)),
+                  self.remove_duplicates)
+            # El note-off comparte el orden de inserción de su note-on
+            t.next_seq = seq
+            t.add(tick + int(duration * tpq), off_prio,
+                  bytes((NOTE_OFF | channel, pitch, volume)), self.remove_duplicates)
+            t.next_seq = seq + 1
+            count += 1
+        return count
+
+    # Agrega una NoteTemplate empezando en time (en negras). Sin eliminar
+    # duplicados, sus eventos pasan tal cual con la clave desplazada.
+    def add_template(self, track, template, time):
+        t = self.tracks[track + 1]
+        offset = self.quarter_to_tick(time)
+        if not self.remove_duplicates:
+            base = (offset << _TICK_SHIFT) + t.next_seq
+            t.pending.extend([(key + base, data) for key, data in template.events])
+            t.next_seq += template.count
+            return template.count
+
+        first = t.next_seq
+        for i in range(template.count):
+            key, on = template.events[2 * i]
+            off_key, off = template.events[2 * i + 1]
+            t.next_seq = first + i
+            t.add(offset + (key >> _TICK_SHIFT), PRIORITY_NOTE_ON, on, True)
+            t.next_seq = first + i
+            t.add(offset + (off_key >> _TICK_SHIFT), PRIORITY_NOTE_OFF, off, True)
+        t.next_seq = first + template.count
+        return template.count
+
+    def addTempo(self, track, time, tempo):
+        data = b"\xff\x51\x03" + struct.pack(">L", int(60000000 / tempo))[1:]
+        self.tracks[0].add(self.quarter_to_tick(time), PRIORITY_TEMPO, data,
+                           self.remove_duplicates)
+
+    def addProgramChange(self, tracknum, channel, time, program):
+        self.tracks[tracknum + 1].add(self.quarter_to_tick(time), PRIORITY_PROGRAM,
+                                      bytes((PROGRAM_CHANGE | channel, program)),
+                                      self.remove_duplicates)
+
+    def addTrackName(self, track, time, trackName):
+        name = trackName.encode("ISO-8859-1")
+        self.tracks[track + 1].add(self.quarter_to_tick(time), PRIORITY_TRACK_NAME,
+                                   b"\xff\x03" + var_length(len(name)) + name,
+                                   self.remove_duplicates)
+
+    # Codifica y escribe todo lo anterior a time (en negras)
+    def flush(self, time):
+        until = self.quarter_to_tick(time)
+        for track in self.tracks:
+            track.flush(until, self.deinterleave)
+
+    # Escribe los eventos que faltan y arma el archivo final
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with instrument.stage("cierre MIDI", tracks=len(self.tracks)):
+            for track in self.tracks:
+                track.flush(None, self.deinterleave)
+            with open(self.path, "wb") as f:
+                f.write(b"MThd" + struct.pack(">LHHH", 6, 1, self.numTracks,
+                                              self.ticks_per_quarternote))
+                for track in self.tracks:
+                    track.write_chunk(f)
+
+    # Descarta lo escrito hasta ahora sin tocar el archivo de salida
+    def discard(self):
+        if self.closed:
+            return
+        self.closed = True
+        for track in self.tracks:
+            track.spool.close()
+
+    def __enter__(self):
+        return self
+
+    # Si hubo un error a la mitad no se escribe un archivo truncado (que
+    # parecería válido) encima del que ya existía
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self.discard()
+
+
+# Guarda en orden las llamadas para agregar notas y eventos (mismos métodos
+# que los escritores) sin codificar nada. Se puede mandar entre procesos y
+# replay() las repite en un escritor real, con los tracks desplazados y los
+# canales cambiados, para juntar en un solo MIDI tracks hechos por separado.
+class EventRecorder:
+    def __init__(self, numTracks=1):
+        self.numTracks = numTracks
+        self.calls = []         # (método, track, argumentos)
+
+    def addNote(self, track, channel, pitch, time, duration, volume):
+        self.calls.append(("add_notes", track, (channel, [(pitch, time, duration, volume)])))
+
+    def add_notes(self, track, channel, notes):
+        notes = list(notes)
+        self.calls.append(("add_notes", track, (channel, notes)))
+        return len(notes)
+
+    def add_template(self, track, template, time):
+        self.calls.append(("add_template", track, (template, time)))
+        return template.count
+
+    def addTempo(self, track, time, tempo):
+        self.calls.append(("addTempo", track, (time, tempo)))
+
+    def addProgramChange(self, tracknum, channel, time, program):
+        self.calls.append(("addProgramChange", tracknum, (channel, time, program)))
+
+    def addTrackName(self, track, time, trackName):
+        self.calls.append(("addTrackName", track, (time, trackName)))
+
+    # No hay nada que mandar al disco
+    def flush(self, time):
+        pass
+
+    # Tracks y canales usados
+    def tracks_used(self):
+        return sorted({track for _method, track, _args in self.calls})
+
+    def channels_used(self):
+        channels = set()
+        for method, _track, args in self.calls:
+            if method == "add_template":
+                channels.add(args[0].channel)
+            elif method in ("add_notes", "addProgramChange"):
+                channels.add(args[0])
+        return channels
+
+    # Repite las llamadas en midi: el track t pasa a track_offset + t y el
+    # canal c a channel_map.get(c, c). Con tempo=False se omiten los cambios
+    # de tempo (cuando el archivo final lleva un solo mapa de tempo).
+    def replay(self, midi, track_offset=0, channel_map=None, tempo=True):
+        channel_map = channel_map or {}
+        remapped = {}
+        for method, track, args in self.calls:
+            track += track_offset
+            if method == "add_notes":
+                channel, notes = args
+                midi.add_notes(track, channel_map.get(channel, channel), notes)
+            elif method == "add_template":
+                template, time = args
+                channel = channel_map.get(template.channel, template.channel)
+                if channel != template.channel:
+                    if id(template) not in remapped:
+                        remapped[id(template)] = NoteTemplate(
+                            channel, template.notes, template.ticks_per_quarternote)
+                    template = remapped[id(template)]
+                midi.add_template(track, template, time)
+            elif method == "addTempo":
+                if tempo:
+                    midi.addTempo(track, *args)
+            elif method == "addProgramChange":
+                channel, time, program = args
+                midi.addProgramChange(track, channel_map.get(channel, channel), time, program)
+            else:
+                midi.addTrackName(track, *args)
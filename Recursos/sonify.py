@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Un solo comando para todos los scripts, con subcomandos:
+#   python -m sonify digits|melody|bass|drums|traffic|all|play [argumentos]
+#   python -m sonify startup
+# Cada subcomando importa solo el script que lo corre (y este, lo que
+# necesita), así la ayuda o una batería no cargan mpmath, el pool de
+# procesos ni nada de lo demás. Los argumentos son los mismos que los del
+# script correspondiente.
+# "startup" mide cuánto tarda en arrancar cada subcomando (un intérprete nuevo
+# que importa su script) contra el presupuesto de arranque.
+
+import os
+import sys
+import time
+
+# Subcomando -> (script, descripción, uso)
+COMMANDS = {
+    "digits": ("digitCSV", "dígitos de constantes irracionales a CSV o .dig",
+               "[pi:1000000 e:500000 ...] [--dig] [--procesos N] [--carpeta DIR]"),
+    "melody": ("melodycsv", "melodía a partir de dígitos",
+               "[archivo.csv|archivo.dig] [dígito_inicial] [compases|todo] [semilla]"),
+    "bass": ("bajocsv", "línea de bajo a partir de dígitos",
+             "[archivo.csv|archivo.dig] [dígito_inicial] [compases|todo]"),
+    "drums": ("drums", "batería (con --data sigue la actividad de los datos)",
+              "[compases] [groove.json] [--data captura.pcapng|digitos.csv]"),
+    "traffic": ("traffic2midi", "acompañamiento a partir de la captura",
+                "[--bars N | --bar-seconds S] [--seed N] [--drums] | --live [captura|-] "
+                "| --live-check [segundos]"),
+    "all": ("pipeline", "pieza completa en un solo MIDI",
+            "[--pcap captura] [--melody digitos] [--bass digitos] [--bars N] [--seed N] "
+            "[--tempo BPM] [--workers N] [--out archivo.mid] [--no-cache]"),
+    "play": ("player", "reproduce la pieza en tiempo real (OSC/UDP, tubería o memoria)",
+             "[--sink udp:host:puerto[/dirección]|pipe:ruta|memory] [--pcap captura] "
+             "[--melody digitos] [--bass digitos] [--bars N] [--seed N] [--tempo BPM] "
+             "[--no-cache]"),
+}
+
+# Tiempo máximo de arranque (intérprete incluido) de los subcomandos que lo tienen
+STARTUP_BUDGET_SECONDS = 0.100
+BUDGETED_COMMANDS = ("melody", "bass", "drums")
+STARTUP_REPEATS = 5
+
+
+def usage():
+    lines = ["Uso: python -m sonify SUBCOMANDO [argumentos]", ""]
+    for name, (_module, description, _args) in COMMANDS.items():
+        lines.append(f"  {name:<9}{description}")
+    lines.append(f"  {'startup':<9}mide el arranque de cada subcomando")
+    lines.append("")
+    lines.append("python -m sonify SUBCOMANDO --help muestra sus argumentos.")
+    return "\n".join(lines)
+
+
+# Importa el script de un subcomando
+def load(name):
+    import importlib
+    return importlib.import_module(COMMANDS[name][0])
+
+
+# Tiempo de arranque de un subcomando: el mínimo de `repeats` intérpretes
+# nuevos que importan su script (None para el intérprete vacío)
+def measure_startup(name, repeats=STARTUP_REPEATS):
+    import subprocess
+    code = "pass" if name is None else f"import sonify; sonify.load({name!r})"
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Tabla de arranque; regresa False si algún subcomando pasa del presupuesto
+def report_startup(repeats=STARTUP_REPEATS):
+    ok = True
+    print(f"{'intérprete':<10}{measure_startup(None, repeats) * 1000:>9.1f} ms")
+    for name in COMMANDS:
+        seconds = measure_startup(name, repeats)
+        verdict = ""
+        if name in BUDGETED_COMMANDS:
+            within = seconds < STARTUP_BUDGET_SECONDS
+            ok = ok and within
+            verdict = "  ok" if within else "  sobre el presupuesto"
+        print(f"{name:<10}{seconds * 1000:>9.1f} ms{verdict}")
+    print(f"Presupuesto: {STARTUP_BUDGET_SECONDS * 1000:.0f} ms para "
+          f"{', '.join(BUDGETED_COMMANDS)}.")
+    return ok
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if not args or args[0] in ("-h", "--help", "help"):
+        print(usage())
+        return
+    name = args[0]
+    if name == "startup":
+        sys.exit(0 if report_startup() else 1)
+    if name not in COMMANDS:
+        print(f"Subcomando desconocido: '{name}'\n\n{usage()}")
+        sys.exit(2)
+    _module, description, arguments = COMMANDS[name]
+    if args[1:2] in (["-h"], ["--help"]):
+        print(f"Uso: python -m sonify {name} {arguments}\n{description}")
+        return
+
+    module = load(name)
+    sys.argv = [module.__file__] + args[1:]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Caché en disco de los resultados intermedios del pipeline (pipeline.py):
+# actividad por compás, eventos de cada track ya generados, etc.
+# La clave de cada resultado es un hash de todo lo que lo determina: nombre
+# de la etapa, digest del contenido de sus archivos de entrada y parámetros
+# (compases, tempo, tablas de escalas y acordes, semilla...). Si nada de eso
+# cambia la etapa no se vuelve a correr; si algo cambia, la clave es otra.
+# El tamaño total tiene un tope: al pasarlo se borran los resultados usados
+# hace más tiempo (LRU, por la fecha de modificación, que se renueva en cada
+# acierto). Lleva la cuenta de aciertos, fallos y desalojos.
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+CACHE_DIR = ".stagecache"
+MB = 1024 * 1024
+CACHE_MAX_BYTES = 256 * MB
+
+# Cambiar si cambia el formato de lo que se guarda
+CACHE_VERSION = 1
+
+EXTENSION = ".pkl"
+DIGESTS_FILE = "digests.json"
+STATS_FILE = "stats.json"
+
+# Tamaño de lectura para calcular el digest de un archivo
+DIGEST_READ_SIZE = 1 << 20
+
+
+class StageCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.digests = self._load_json(DIGESTS_FILE)
+
+    def _load_json(self, name):
+        try:
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Escribe primero a un temporal para no dejar archivos a medias
+    def _write_atomic(self, path, data):
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    # Digest SHA-256 del contenido de un archivo. Se recuerda por ruta,
+    # tamaño y fecha de modificación, así un archivo que no cambió no se
+    # vuelve a leer.
+    def file_digest(self, path):
+        stat = os.stat(path)
+        memo_key = os.path.abspath(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        memo = self.digests.get(memo_key)
+        if memo and memo[0] == signature:
+            return memo[1]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(DIGEST_READ_SIZE)
+                if not data:
+                    break
+                h.update(data)
+        digest = h.hexdigest()
+        self.digests[memo_key] = [signature, digest]
+        self._write_atomic(os.path.join(self.directory, DIGESTS_FILE),
+                           json.dumps(self.digests).encode("utf-8"))
+        return digest
+
+    # Clave de una etapa a partir de sus entradas y parámetros (cualquier
+    # cosa que json pueda escribir; lo demás se escribe con repr)
+    def key(self, stage, **parts):
+        text = json.dumps([CACHE_VERSION, stage, parts], sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + EXTENSION)
+
+    # (True, valor) si la clave está en la caché, (False, None) si no.
+    # Un resultado que no se puede cargar (corrupto, o de clases que ya no
+    # existen o cambiaron) se borra y cuenta como fallo: la etapa se recalcula.
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except OSError:
+            self.misses += 1
+            return False, None
+        except Exception:
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            self.misses += 1
+            return False, None
+        os.utime(path)          # usado ahora: es el último en desalojarse
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    # Valor de la caché o, si no está, compute() guardado para la próxima
+    def cached(self, key, compute):
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # Resultados guardados: [(fecha de uso, bytes, ruta)]
+    def entries(self):
+        entries = []
+        for sub in os.listdir(self.directory):
+            folder = os.path.join(self.directory, sub)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(EXTENSION):
+                    path = os.path.join(folder, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return entries
+
+    # Borra los resultados usados hace más tiempo hasta quedar bajo el tope
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _used, size, _path in entries)
+        for _used, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+        return total
+
+    # Guarda las cuentas de esta ejecución sumadas a las anteriores
+    def save_stats(self):
+        totals = self._load_json(STATS_FILE)
+        for name in ("hits", "misses", "evictions"):
+            totals[name] = totals.get(name, 0) + getattr(self, name)
+        self._write_atomic(os.path.join(self.directory, STATS_FILE),
+                           json.dumps(totals).encode("utf-8"))
+        return totals
+
+    # Resumen de una línea de esta ejecución
+    def summary(self):
+        entries = self.entries()
+        size = sum(size for _used, size, _path in entries)
+        return (f"Caché: {self.hits} aciertos, {self.misses} fallos, "
+                f"{self.evictions} desalojos; {len(entries)} resultados, "
+                f"{size / MB:.1f} de {self.max_bytes / MB:.0f} MB")
+
+    # Borra todo lo guardado
+    def clear(self):
+        for _used, _size, path in self.entries():
+            os.remove(path)
@@ -4,14 +4,27 @@
 # Genera un acompañamiento en Do mayor a partir de un archivo PCAP/PCAPNG.
 # Usa la cantidad de bytes por bloque de paquetes como nivel de actividad
 # para elegir acordes y patrones rítmicos.
-# Produce 45 compases en 4/4 con:
+# Produce 45 compases en 4/4 (o los que se pidan) con:
 # - Track 0: Soft Pad
 # - Track 1: Arpegios de piano
 
-from midiutil import MIDIFile
-from scapy.all import rdpcap
+import math
 import os
 import random
+import sys
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate, islice
+from operator import gt
+
+import instrument
+import pcapreader
+from activityindex import (
+    bar_sums_from_prefix, count_bar_edges, load_or_build_index, time_bar_edges
+)
+from markov import MarkovEngine
+from smfwriter import SMFStreamWriter
 
 # Configuración de archivos y parámetros generales
 PCAP_INPUT_PATH = r"traffic1.pcapng"
@@ -22,10 +35,48 @@ BEATS_PER_BAR = 4
 TARGET_BARS = 45
 TOTAL_BEATS = BEATS_PER_BAR * TARGET_BARS
 
+# Lectura en streaming: recorre la captura paquete a paquete y solo guarda
+# las sumas por compás (memoria constante sin importar el tamaño del PCAP)
+STREAMING_INGEST = True
+
+# Cómo se reparten los paquetes entre compases:
+# - "count": el mismo número de paquetes por compás
+# - "time": ventanas de tiempo iguales (bytes por segundo de captura)
+BAR_MODE = "count"
+
+# Índice de actividad junto a la captura (traffic1.pcapng.actidx): la primera
+# ejecución lo construye y las siguientes solo leen O(compases) valores de él
+USE_ACTIVITY_INDEX = True
+
+# Procesos para leer capturas grandes en paralelo (por tramos de bytes).
+# Con 1 se usa la lectura de un solo proceso.
+PARALLEL_WORKERS = 1
+
 # Instrumentos (GM Program numbers)
 PAD_PROGRAM = 89         # Soft Pad
 ARPEGGIO_PROGRAM = 0     # Piano
 
+# Pistas extra guiadas por canales de tráfico (ver trafficfeatures.py).
+# Cada entrada: (canal, programa GM, transposición en semitonos, velocidad máxima)
+# Se agregan a partir del track 2 cuando USE_FEATURE_TRACKS está activo.
+USE_FEATURE_TRACKS = False
+FEATURE_TRACKS = [
+    ("udp_bytes", 11, 12, 70),    # Vibráfono: tráfico UDP
+    ("flows", 46, 24, 60),        # Arpa: conversaciones distintas
+    ("syn", 115, 12, 90),         # Woodblock: ráfagas de SYN
+]
+
+# Voces melódicas: las FLOW_VOICES conversaciones más pesadas (5-tupla) de la
+# captura, cada una en su propio track (ver flowindex.py).
+# Cada voz: (programa GM, transposición en semitonos)
+FLOW_VOICES = 0
+FLOW_VOICE_LAYOUT = [
+    (73, 12),     # Flauta
+    (65, 0),      # Saxo alto
+    (24, 12),     # Guitarra de nylon
+    (40, 19),     # Violín
+]
+
 # Acordes en Do
 CHORDS = {
     "C":  [48, 52, 55, 60],
@@ -59,99 +110,329 @@ RHYTHM_PATTERNS = [
 ]
 
 
-# Lee longitudes de los paquetes del archivo PCAP/PCAPNG
-def read_packet_lengths(pcap_path):
-    packets = rdpcap(pcap_path)
-    lengths = [len(p) for p in packets]
-    return lengths
+# Lee timestamps y longitudes de los paquetes del archivo PCAP/PCAPNG.
+# Usa el lector nativo de bloques; scapy solo se importa si el formato no se
+# reconoce (por ejemplo, capturas que scapy sabe leer pero el lector no).
+# Si tampoco scapy la puede leer (archivo vacío o que no es una captura)
+# lanza ValueError con un mensaje claro.
+def read_packet_records(pcap_path):
+    with instrument.stage("lectura PCAP") as stage:
+        try:
+            records = pcapreader.read_packet_records(pcap_path)
+            stage.count(packets=len(records.caplens))
+            return records.timestamps, records.caplens
+        except ValueError:
+            pass
+    with instrument.stage("lectura PCAP (scapy)") as stage:
+        from scapy.all import rdpcap
+        from scapy.error import Scapy_Exception
+        try:
+            packets = rdpcap(pcap_path)
+        except Scapy_Exception as e:
+            raise ValueError(f"No se pudo leer la captura '{pcap_path}': {e}") from None
+        timestamps = array("d", (float(p.time) for p in packets))
+        lengths = array("I", (len(p) for p in packets))
+        stage.count(packets=len(lengths))
+        return timestamps, lengths
 
 
-# Calcula un nivel de actividad por compás a partir de las longitudes
-def compute_bar_activities(lengths, n_bars=TARGET_BARS):
-    if not lengths:
+# Lee longitudes de los paquetes del archivo PCAP/PCAPNG
+def read_packet_lengths(pcap_path):
+    return read_packet_records(pcap_path)[1]
+
+
+# Recorre las longitudes de los paquetes una a una, sin disecar protocolos
+# ni cargar la captura completa en memoria
+def iter_packet_lengths(pcap_path):
+    return pcapreader.iter_packet_lengths(pcap_path)
+
+
+# Sumas acumuladas de bytes: prefix[i] = bytes de los primeros i paquetes.
+# Se calculan una vez y sirven para cualquier número de compases.
+def build_prefix_sums(lengths):
+    return array("q", accumulate(lengths, initial=0))
+
+
+# Indica si los timestamps vienen en orden no decreciente
+def _is_sorted(values):
+    return not any(map(gt, values, islice(values, 1, None)))
+
+
+# Suma los bytes por compás repartiendo los paquetes por conteo o por tiempo.
+# Con timestamps ordenados solo hace O(n_bars log n) búsquedas sobre las
+# sumas acumuladas; si no están ordenados, cae a una pasada por paquete.
+def compute_bar_sums(lengths, n_bars=TARGET_BARS, timestamps=None,
+                     mode=BAR_MODE, prefix=None):
+    if not len(lengths):
+        return [0] * n_bars
+    if prefix is None:
+        prefix = build_prefix_sums(lengths)
+
+    if mode == "time" and timestamps is not None:
+        if _is_sorted(timestamps):
+            return bar_sums_from_prefix(prefix, n_bars, timestamps=timestamps)
+
+        time_edges = time_bar_edges(min(timestamps), max(timestamps), n_bars)
+        if time_edges is not None:
+            bar_sums = [0] * n_bars
+            for t, length in zip(timestamps, lengths):
+                bar_sums[bisect_right(time_edges, t)] += length
+            return bar_sums
+
+    return bar_sums_from_prefix(prefix, n_bars)
+
+
+# Suma los bytes de cada compás leyendo la captura en streaming.
+# La primera pasada cuenta paquetes y rango de tiempo; la segunda reparte
+# los bytes igual que compute_bar_sums, guardando solo n_bars acumuladores.
+def stream_bar_sums(pcap_path, n_bars=TARGET_BARS, mode=BAR_MODE):
+    n_packets = 0
+    t_start = float("inf")
+    t_end = float("-inf")
+    for ts, _caplen, _origlen in pcapreader.iter_records(pcap_path):
+        n_packets += 1
+        t_start = min(t_start, ts)
+        t_end = max(t_end, ts)
+    if n_packets == 0:
+        return [0] * n_bars
+
+    bar_sums = [0] * n_bars
+    time_edges = None
+    if mode == "time":
+        time_edges = time_bar_edges(t_start, t_end, n_bars)
+
+    if time_edges is not None:
+        for ts, caplen, _origlen in pcapreader.iter_records(pcap_path):
+            bar_sums[bisect_right(time_edges, ts)] += caplen
+    else:
+        edges = count_bar_edges(n_packets, n_bars)
+        bar = 0
+        for i, length in enumerate(iter_packet_lengths(pcap_path)):
+            while i >= edges[bar + 1]:
+                bar += 1
+            bar_sums[bar] += length
+    return bar_sums
+
+
+# Normaliza las sumas por compás a valores entre 0 y 1
+def normalize_bar_sums(bar_sums):
+    max_sum = max(bar_sums, default=0) or 1
+    return [s / max_sum for s in bar_sums]
+
+
+# Calcula un nivel de actividad por compás a partir de las longitudes.
+# mode="count" reparte los paquetes en bloques iguales; mode="time" usa
+# ventanas de tiempo iguales (requiere timestamps).
+def compute_bar_activities(lengths, n_bars=TARGET_BARS, timestamps=None,
+                           mode=BAR_MODE):
+    if not len(lengths):
         return [0.0] * n_bars
 
-    bar_size = max(1, len(lengths) // n_bars)
-
-    bar_sums = []
-    for i in range(n_bars):
-        start = i * bar_size
-        end = min(len(lengths), (i + 1) * bar_size)
-        chunk = lengths[start:end] or [0]
-        bar_sums.append(sum(chunk))
-
-    max_sum = max(bar_sums) or 1
-    activities = [s / max_sum for s in bar_sums]
-    return activities
-
-
-# Genera una secuencia de acordes a partir de la actividad
-def choose_chord_sequence(activities):
-    chords = []
+    bar_sums = compute_bar_sums(lengths, n_bars, timestamps=timestamps, mode=mode)
+    return normalize_bar_sums(bar_sums)
+
+
+# Calcula la actividad por compás directamente desde la captura.
+# El índice y la lectura en streaming usan el lector nativo; si este no
+# reconoce el formato se lee con read_packet_records (que intenta scapy).
+# Si el índice no se puede escribir junto a la captura (por ejemplo, en una
+# carpeta de solo lectura) se lee en streaming sin índice.
+def compute_bar_activities_from_pcap(pcap_path, n_bars=TARGET_BARS,
+                                     streaming=STREAMING_INGEST, mode=BAR_MODE,
+                                     use_index=USE_ACTIVITY_INDEX):
+    with instrument.stage("actividad", bars=n_bars):
+        try:
+            if use_index:
+                try:
+                    with load_or_build_index(pcap_path) as index:
+                        return normalize_bar_sums(index.bar_sums(n_bars, mode=mode))
+                except OSError:
+                    streaming = True
+            if streaming:
+                return normalize_bar_sums(stream_bar_sums(pcap_path, n_bars, mode=mode))
+        except ValueError:
+            pass
+        timestamps, lengths = read_packet_records(pcap_path)
+        return compute_bar_activities(lengths, n_bars=n_bars,
+                                      timestamps=timestamps, mode=mode)
+
+
+# Motor de transiciones entre acordes, compilado una sola vez (markov.py)
+CHORD_ENGINE = MarkovEngine(CHORD_ORDER, CHORD_TRANSITIONS, start="C")
+
+
+# Elige el acorde del siguiente compás a partir de los acordes anteriores.
+# Solo mira los últimos acordes, así sirve también para el modo en vivo.
+def next_chord(chords, a, rng=random):
+    return CHORD_ENGINE.next_state(chords, CHORD_ENGINE.target_index(a), rng)
+
+
+# Genera una secuencia de acordes a partir de la actividad.
+# rng es la fuente de azar (el módulo random o un random.Random con semilla).
+def choose_chord_sequence(activities, rng=random):
+    with instrument.stage("acordes", bars=len(activities)):
+        chords = CHORD_ENGINE.generate(CHORD_ENGINE.target_indices(activities), rng)
+        return force_cadences(chords)
+
+
+# Fuerza C cada 8 compases internos y en el último compás
+def force_cadences(chords):
+    if chords:
+        for i in range(8, len(chords) - 1, 8):
+            chords[i] = "C"
+        chords[-1] = "C"
+    return chords
 
-    for i, a in enumerate(activities):
-        if i == 0:
-            current = "C"  # siempre empieza en I
-        else:
-            prev = chords[-1]
 
-            idx = int(a * len(CHORD_ORDER))
-            idx = min(len(CHORD_ORDER) - 1, idx)
+# Elige un patrón rítmico según el nivel de actividad
+def choose_rhythm_pattern(activity):
+    idx = int(activity * len(RHYTHM_PATTERNS))
+    idx = min(len(RHYTHM_PATTERNS) - 1, idx)
+    return RHYTHM_PATTERNS[idx]
 
-            allowed = CHORD_TRANSITIONS.get(prev, CHORD_ORDER)
 
-            candidates_sorted = sorted(
-                allowed,
-                key=lambda name: abs(CHORD_ORDER.index(name) - idx)
-            )
+# Notas del pad para un compás: (pitch, tiempo, duración, velocidad)
+def pad_notes_for_bar(chord_name, bar_time):
+    notes = CHORDS[chord_name]
+    return [(pitch, bar_time, BEATS_PER_BAR, 70) for pitch in notes[:3]]
 
-            candidate = candidates_sorted[0]
 
-            # A veces usamos el segundo más cercano para variar
-            if len(candidates_sorted) > 1 and random.random() < 0.35:
-                candidate = candidates_sorted[1]
+# Notas del arpegio para un compás: (pitch, tiempo, duración, velocidad)
+def arpeggio_notes_for_bar(chord_name, activity, bar_time):
+    notes = CHORDS[chord_name]
+    pattern = choose_rhythm_pattern(activity)
 
-            # Evitar 3 compases seguidos con el mismo acorde
-            if len(chords) >= 2 and candidate == chords[-1] == chords[-2]:
-                for alt in candidates_sorted:
-                    if alt != candidate:
-                        candidate = alt
-                        break
+    bar_notes = []
+    t = 0.0
+    for i, dur in enumerate(pattern):
+        pitch = notes[i % len(notes)]
 
-            # Evitar patrón ABAB prolongado
-            if len(chords) >= 3 and chords[-3] == chords[-1] and candidate == chords[-2]:
-                for alt in candidates_sorted:
-                    if alt not in (chords[-1], chords[-2]):
-                        candidate = alt
-                        break
+        if activity > 0.75 and i % 2 == 0:
+            pitch += 12
 
-            current = candidate
+        bar_notes.append((pitch, bar_time + t, dur, 80))
+        t += dur
+    return bar_notes
 
-        chords.append(current)
 
-    # Forzar C en compases internos y al final
-    if chords:
-        for i in range(8, len(chords) - 1, 8):
-            chords[i] = "C"
-        chords[-1] = "C"
+# Notas de una pista de características para un compás: a mayor nivel, más
+# pulsos en el compás (de 1 a 8) recorriendo las notas del acorde
+def feature_notes_for_bar(chord_name, level, bar_time, transpose, max_velocity):
+    if level <= 0:
+        return []
 
-    return chords
+    notes = CHORDS[chord_name]
+    pulses = 1 + int(level * 7)
+    step = BEATS_PER_BAR / pulses
+    vel = int(40 + level * (max_velocity - 40))
+    return [(notes[i % len(notes)] + transpose, bar_time + i * step, step, vel)
+            for i in range(pulses)]
 
 
-# Elige un patrón rítmico según el nivel de actividad
-def choose_rhythm_pattern(activity):
-    idx = int(activity * len(RHYTHM_PATTERNS))
-    idx = min(len(RHYTHM_PATTERNS) - 1, idx)
-    return RHYTHM_PATTERNS[idx]
+# Notas de una voz de flujo para un compás: si el flujo tuvo tráfico, toca
+# de 1 a 4 negras con notas del acorde; el nivel elige la nota y el registro
+def flow_voice_notes_for_bar(chord_name, level, bar_time, transpose):
+    if level <= 0:
+        return []
 
+    notes = CHORDS[chord_name]
+    n_notes = 1 + int(level * 3)
+    step = BEATS_PER_BAR / n_notes
+    first = int(level * (len(notes) - 1))
+    vel = int(55 + level * 30)
+    return [(notes[(first + i) % len(notes)] + transpose, bar_time + i * step,
+             step, vel) for i in range(n_notes)]
 
-# Crea el archivo MIDI con pad y arpegios a partir del PCAP
-def create_midi_from_pcap(pcap_path, midi_path):
-    lengths = read_packet_lengths(pcap_path)
-    activities = compute_bar_activities(lengths, n_bars=TARGET_BARS)
-    chord_sequence = choose_chord_sequence(activities)
 
-    midi = MIDIFile(numTracks=2)
+# Número de compases para que cada uno cubra unos bar_seconds de captura
+# (para usar con mode="time"; por ejemplo un compás por segundo)
+def bars_for_capture(pcap_path, bar_seconds):
+    t_start = t_end = None
+    for ts, _caplen, _origlen in pcapreader.iter_records(pcap_path):
+        if t_start is None:
+            t_start = t_end = ts
+        else:
+            t_start = min(t_start, ts)
+            t_end = max(t_end, ts)
+    if t_start is None:
+        return 1
+    return max(1, math.ceil((t_end - t_start) / bar_seconds))
+
+
+# Datos ya calculados del acompañamiento: actividad y acorde por compás,
+# tracks de características con sus niveles, flujos que se vuelven voces,
+# groove de batería (o None), número de tracks y resumen del índice de
+# flujos (o None si no hay voces de flujos)
+AccompanimentPlan = namedtuple(
+    "AccompanimentPlan",
+    "activities chords feature_tracks feature_levels flows drum_groove n_tracks "
+    "flow_summary"
+)
+
+
+# Calcula todo lo que necesita el acompañamiento a partir del PCAP.
+# Con feature_tracks (lista como FEATURE_TRACKS) se hace una sola pasada de
+# decodificación de cabeceras y cada canal guía su propio track. Con
+# workers > 1 esa pasada se reparte entre procesos. Con flow_voices > 0 las
+# conversaciones más pesadas se vuelven voces melódicas en tracks propios.
+# Con seed los acordes son reproducibles (random.Random propio).
+# activities es la actividad por compás si ya se calculó (no se vuelve a leer
+# la captura para ella). Con drums=True se agrega un track de batería que
+# sigue esa misma actividad (drums.REACTIVE_GROOVE), sin otra pasada.
+def plan_accompaniment(pcap_path, streaming=STREAMING_INGEST,
+                       use_index=USE_ACTIVITY_INDEX, feature_tracks=None,
+                       workers=PARALLEL_WORKERS, flow_voices=FLOW_VOICES,
+                       n_bars=TARGET_BARS, mode=BAR_MODE, seed=None,
+                       activities=None, drums=False):
+    if feature_tracks is None:
+        feature_tracks = FEATURE_TRACKS if USE_FEATURE_TRACKS else []
+
+    if workers > 1:
+        from trafficfeatures import extract_bar_features_parallel, normalize_channel
+        features = extract_bar_features_parallel(pcap_path, n_bars,
+                                                 mode=mode, workers=workers)
+    elif feature_tracks:
+        from trafficfeatures import extract_bar_features, normalize_channel
+        features = extract_bar_features(pcap_path, n_bars, mode=mode)
+    elif activities is None:
+        activities = compute_bar_activities_from_pcap(
+            pcap_path, n_bars=n_bars, streaming=streaming, mode=mode,
+            use_index=use_index
+        )
+    if activities is None:
+        activities = normalize_channel(features["bytes"])
+    rng = random if seed is None else random.Random(seed)
+    chord_sequence = choose_chord_sequence(activities, rng)
+    feature_levels = [normalize_channel(features[channel_name])
+                      for channel_name, _program, _transpose, _vel in feature_tracks]
+
+    top_flows = []
+    flow_summary = None
+    if flow_voices:
+        from flowindex import build_flow_index
+        flow_index = build_flow_index(pcap_path, n_bars, mode=mode)
+        top_flows = flow_index.top(min(flow_voices, len(FLOW_VOICE_LAYOUT)))
+        flow_summary = flow_index.summary()
+
+    drum_groove = None
+    if drums:
+        from drums import DRUM_CHANNEL, REACTIVE_GROOVE, CompiledGroove
+        drum_groove = CompiledGroove(REACTIVE_GROOVE, BEATS_PER_BAR, DRUM_CHANNEL)
+
+    n_tracks = 2 + len(feature_tracks) + len(top_flows) + (1 if drums else 0)
+    return AccompanimentPlan(activities, chord_sequence, feature_tracks, feature_levels,
+                             top_flows, drum_groove, n_tracks, flow_summary)
+
+
+# Escribe el acompañamiento en midi (SMFWriter, SMFStreamWriter o el
+# EventRecorder de smfwriter.py), tracks 0 a plan.n_tracks - 1.
+# Las notas se generan compás por compás en todos los tracks y cada compás
+# terminado se manda con flush, así n_bars puede ser muy grande.
+def write_accompaniment(midi, plan):
+    activities = plan.activities
+    feature_tracks = plan.feature_tracks
+    drum_groove = plan.drum_groove
+    drum_track = plan.n_tracks - 1
 
     midi.addTempo(0, 0, TEMPO_BPM)
     midi.addTempo(1, 0, TEMPO_BPM)
@@ -159,54 +440,113 @@ def create_midi_from_pcap(pcap_path, midi_path):
     midi.addProgramChange(0, 0, 0, PAD_PROGRAM)
     midi.addProgramChange(1, 1, 0, ARPEGGIO_PROGRAM)
 
-    # Track 0: pad de acordes
-    current_time = 0.0
-    for chord_name in chord_sequence:
-        notes = CHORDS[chord_name]
-        pad_notes = notes[:3]
-        for pitch in pad_notes:
-            midi.addNote(
-                track=0,
-                channel=0,
-                pitch=pitch,
-                time=current_time,
-                duration=BEATS_PER_BAR,
-                volume=70
-            )
-        current_time += BEATS_PER_BAR
-
-    # Track 1: arpegios de piano
-    current_time = 0.0
-    for chord_name, activity in zip(chord_sequence, activities):
-        notes = CHORDS[chord_name]
-        pattern = choose_rhythm_pattern(activity)
-
-        t = 0.0
-        for i, dur in enumerate(pattern):
-            pitch = notes[i % len(notes)]
-
-            if activity > 0.75 and i % 2 == 0:
-                pitch += 12
-
-            midi.addNote(
-                track=1,
-                channel=1,
-                pitch=pitch,
-                time=current_time + t,
-                duration=dur,
-                volume=80
-            )
-            t += dur
-
-        current_time += BEATS_PER_BAR
-
-    with open(midi_path, "wb") as f:
-        midi.writeFile(f)
-
-
-if __name__ == "__main__":
-    if not os.path.exists(PCAP_INPUT_PATH):
+    # Tracks 2+: un track por canal de tráfico
+    for track, (_channel_name, program, _transpose, _vel) in enumerate(
+            feature_tracks, start=2):
+        midi.addTempo(track, 0, TEMPO_BPM)
+        midi.addProgramChange(track, track, 0, program)
+
+    # Tracks siguientes: una voz por conversación (flujo) más pesada
+    first_voice_track = 2 + len(feature_tracks)
+    voices = []
+    for voice, flow in enumerate(plan.flows):
+        track = first_voice_track + voice
+        channel = track if track < 9 else track + 1   # saltar el canal de batería
+        program, transpose = FLOW_VOICE_LAYOUT[voice]
+        midi.addTrackName(track, 0, flow.label())
+        midi.addTempo(track, 0, TEMPO_BPM)
+        midi.addProgramChange(track, channel, 0, program)
+        voices.append((track, channel, transpose, flow.bar_bytes,
+                       max(flow.bar_bytes.values(), default=0) or 1))
+
+    # Último track: batería que sigue la actividad
+    if drum_groove:
+        midi.addTrackName(drum_track, 0, "Drums")
+        midi.addTempo(drum_track, 0, TEMPO_BPM)
+
+    for bar, (chord_name, activity) in enumerate(zip(plan.chords, activities)):
+        bar_time = bar * BEATS_PER_BAR
+
+        for track, ((_name, _program, transpose, max_velocity), levels) in enumerate(
+                zip(feature_tracks, plan.feature_levels), start=2):
+            midi.add_notes(track, track, feature_notes_for_bar(
+                chord_name, levels[bar], bar_time, transpose, max_velocity))
+
+        for track, channel, transpose, bar_bytes, peak in voices:
+            midi.add_notes(track, channel, flow_voice_notes_for_bar(
+                chord_name, bar_bytes.get(bar, 0) / peak, bar_time, transpose))
+
+        # Track 0: pad de acordes; track 1: arpegios de piano
+        midi.add_notes(0, 0, pad_notes_for_bar(chord_name, bar_time))
+        midi.add_notes(1, 1, arpeggio_notes_for_bar(chord_name, activity, bar_time))
+        if drum_groove:
+            drum_groove.add_bar(midi, bar, len(activities), drum_track, activities)
+
+        midi.flush(bar_time + BEATS_PER_BAR)
+
+
+# Crea el archivo MIDI con pad y arpegios a partir del PCAP (mismas opciones
+# que plan_accompaniment). Cada compás terminado se escribe al disco.
+# Regresa el plan usado.
+def create_midi_from_pcap(pcap_path, midi_path, streaming=STREAMING_INGEST,
+                          use_index=USE_ACTIVITY_INDEX, feature_tracks=None,
+                          workers=PARALLEL_WORKERS, flow_voices=FLOW_VOICES,
+                          n_bars=TARGET_BARS, mode=BAR_MODE, seed=None,
+                          activities=None, drums=False):
+    plan = plan_accompaniment(pcap_path, streaming, use_index, feature_tracks, workers,
+                              flow_voices, n_bars, mode, seed, activities, drums)
+    with instrument.stage("escritura acompañamiento", bars=len(plan.chords)), \
+            SMFStreamWriter(midi_path, numTracks=plan.n_tracks) as midi:
+        write_accompaniment(midi, plan)
+    return plan
+
+
+# Uso:
+#   python traffic2midi.py [--bars N | --bar-seconds S] [--seed N] [--drums]
+#   python traffic2midi.py --live [captura|-]
+#   python traffic2midi.py --live-check [segundos]
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--live":
+        # Modo en vivo: sigue una captura que crece o lee un pcap por stdin ("-")
+        from trafficlive import run_live
+        run_live(sys.argv[2] if len(sys.argv) > 2 else "-", MIDI_OUTPUT_PATH)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--live-check":
+        # Latencia del modo en vivo con una captura sintética en tiempo real
+        from trafficlive import LATENCY_CHECK_SECONDS, check_latency
+        seconds = float(sys.argv[2]) if len(sys.argv) > 2 else LATENCY_CHECK_SECONDS
+        _stats, ok = check_latency(seconds)
+        print("Latencia dentro del presupuesto." if ok else "Latencia fuera del presupuesto.")
+        sys.exit(0 if ok else 1)
+    elif not os.path.exists(PCAP_INPUT_PATH):
         print(f"No se encontró el archivo: {PCAP_INPUT_PATH}")
     else:
-        create_midi_from_pcap(PCAP_INPUT_PATH, MIDI_OUTPUT_PATH)
+        args = sys.argv[1:]
+        drums = "--drums" in args
+        if drums:
+            args.remove("--drums")
+        seed = None
+        if "--seed" in args[:-1]:
+            i = args.index("--seed")
+            seed = int(args[i + 1])
+            del args[i:i + 2]
+
+        n_bars, mode = TARGET_BARS, BAR_MODE
+        if len(args) > 1 and args[0] == "--bars":
+            n_bars = int(args[1])
+        elif len(args) > 1 and args[0] == "--bar-seconds":
+            # Compases de tiempo fijo: ventanas de captura iguales
+            n_bars = bars_for_capture(PCAP_INPUT_PATH, float(args[1]))
+            mode = "time"
+        try:
+            plan = create_midi_from_pcap(PCAP_INPUT_PATH, MIDI_OUTPUT_PATH, n_bars=n_bars,
+                                         mode=mode, seed=seed, drums=drums)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        if plan.flow_summary:
+            print(plan.flow_summary)
         print(f"Archivo MIDI generado en: {MIDI_OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
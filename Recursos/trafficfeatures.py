@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Extracción de características por compás a partir de las cabeceras de los
+# paquetes (Ethernet/IPv4/IPv6/TCP/UDP), en una sola pasada sobre los bytes
+# crudos de la captura y sin crear objetos de scapy.
+# Canales por compás:
+# - bytes: bytes capturados (igual que compute_bar_activities)
+# - tcp_bytes / udp_bytes: bytes de paquetes TCP y UDP
+# - packets: número de paquetes
+# - flows: conversaciones distintas (5-tupla) vistas en el compás
+# - syn: paquetes SYN sin ACK (inicios de conexión, ráfagas de SYN)
+
+import mmap
+import os
+import struct
+from bisect import bisect_right
+from functools import partial
+
+import pcapreader
+from activityindex import time_bar_edges
+
+FEATURE_CHANNELS = ("bytes", "tcp_bytes", "udp_bytes", "packets", "flows", "syn")
+
+# Tipos de enlace soportados
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_ALT = 12
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+# Cabeceras de extensión de IPv6 que se saltan para llegar a TCP/UDP
+IPV6_EXTENSIONS = (0, 43, 60)
+IPV6_FRAGMENT = 44
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+_U16 = struct.Struct("!H")
+
+
+# Posición de la cabecera IP y su versión según el tipo de enlace
+def _network_offset(buf, off, caplen, linktype):
+    end = off + caplen
+    if linktype == LINKTYPE_ETHERNET:
+        pos = off + 12
+        if pos + 2 > end:
+            return None, 0
+        ethertype = _U16.unpack_from(buf, pos)[0]
+        while ethertype in ETHERTYPE_VLAN and pos + 6 <= end:
+            pos += 4
+            ethertype = _U16.unpack_from(buf, pos)[0]
+        pos += 2
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if off + 16 > end:
+            return None, 0
+        ethertype = _U16.unpack_from(buf, off + 14)[0]
+        pos = off + 16
+    elif linktype == LINKTYPE_NULL:
+        pos = off + 4
+        ethertype = None
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_RAW_ALT, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        pos = off
+        ethertype = None
+    else:
+        return None, 0
+
+    if pos >= end:
+        return None, 0
+    if ethertype is None:
+        version = buf[pos] >> 4
+    elif ethertype == ETHERTYPE_IPV4:
+        version = 4
+    elif ethertype == ETHERTYPE_IPV6:
+        version = 6
+    else:
+        return None, 0
+    return pos, version
+
+
+# Decodifica un paquete: (protocolo, clave de flujo, flags TCP) o None si no es IP
+def decode_packet(buf, off, caplen, linktype):
+    pos, version = _network_offset(buf, off, caplen, linktype)
+    if pos is None:
+        return None
+    end = off + caplen
+
+    if version == 4:
+        if pos + 20 > end:
+            return None
+        ihl = (buf[pos] & 0x0F) * 4
+        proto = buf[pos + 9]
+        addrs = bytes(buf[pos + 12:pos + 20])
+        fragment = _U16.unpack_from(buf, pos + 6)[0] & 0x1FFF
+        l4 = pos + ihl if fragment == 0 else end
+    elif version == 6:
+        if pos + 40 > end:
+            return None
+        proto = buf[pos + 6]
+        addrs = bytes(buf[pos + 8:pos + 40])
+        l4 = pos + 40
+        while proto in IPV6_EXTENSIONS and l4 + 2 <= end:
+            proto, l4 = buf[l4], l4 + (buf[l4 + 1] + 1) * 8
+        if proto == IPV6_FRAGMENT and l4 + 8 <= end:
+            proto, l4 = buf[l4], l4 + 8
+    else:
+        return None
+
+    ports = b""
+    flags = 0
+    if proto in (PROTO_TCP, PROTO_UDP) and l4 + 4 <= end:
+        ports = bytes(buf[l4:l4 + 4])
+        if proto == PROTO_TCP and l4 + 14 <= end:
+            flags = buf[l4 + 13]
+
+    return proto, bytes((proto,)) + addrs + ports, flags
+
+
+# Cuenta paquetes y rango de tiempo sin tocar el contenido de los paquetes
+def _capture_extent(buf):
+    n_packets = 0
+    t_start = float("inf")
+    t_end = float("-inf")
+    for ts, _caplen, _origlen, _off, _linktype in pcapreader.iter_packets(buf):
+        n_packets += 1
+        t_start = min(t_start, ts)
+        t_end = max(t_end, ts)
+    return n_packets, t_start, t_end
+
+
+# Canales vacíos para n_bars compases
+def empty_features(n_bars):
+    features = {name: [0] * n_bars for name in FEATURE_CHANNELS}
+    features["flows"] = [set() for _ in range(n_bars)]
+    return features
+
+
+# Acumula las características de los paquetes de un buffer en features.
+# bar_of(i, ts) devuelve el compás del paquete i.
+def accumulate_features(buf, packets, bar_of, features):
+    total = features["bytes"]
+    tcp_bytes = features["tcp_bytes"]
+    udp_bytes = features["udp_bytes"]
+    packet_counts = features["packets"]
+    flows = features["flows"]
+    syn = features["syn"]
+
+    for i, (ts, caplen, _origlen, off, linktype) in packets:
+        bar = bar_of(i, ts)
+        total[bar] += caplen
+        packet_counts[bar] += 1
+
+        decoded = decode_packet(buf, off, caplen, linktype)
+        if decoded is None:
+            continue
+        proto, flow_key, flags = decoded
+        flows[bar].add(flow_key)
+        if proto == PROTO_TCP:
+            tcp_bytes[bar] += caplen
+            if flags & (TCP_SYN | TCP_ACK) == TCP_SYN:
+                syn[bar] += 1
+        elif proto == PROTO_UDP:
+            udp_bytes[bar] += caplen
+
+
+# Función que asigna compás a cada paquete (por conteo o por tiempo)
+def bar_assigner(n_packets, t_start, t_end, n_bars, mode):
+    time_edges = None
+    if mode == "time":
+        time_edges = time_bar_edges(t_start, t_end, n_bars)
+
+    if time_edges is not None:
+        return partial(_time_bar, time_edges)
+    return partial(_count_bar, n_bars, n_packets)
+
+
+# Compás por ventana de tiempo
+def _time_bar(time_edges, i, ts):
+    return bisect_right(time_edges, ts)
+
+
+# Compás por conteo: el paquete i cae en i * n_bars // n_packets, igual que
+# con los límites de activityindex.count_bar_edges
+def _count_bar(n_bars, n_packets, i, ts):
+    return i * n_bars // n_packets
+
+
+# Convierte los conjuntos de flujos en conteos
+def finalize_features(features):
+    features["flows"] = [len(s) for s in features["flows"]]
+    return features
+
+
+# Extrae todos los canales por compás de una captura
+def extract_bar_features(pcap_path, n_bars, mode="count"):
+    buf = pcapreader.open_capture(pcap_path)
+    try:
+        n_packets, t_start, t_end = _capture_extent(buf)
+        features = empty_features(n_bars)
+        if n_packets:
+            bar_of = bar_assigner(n_packets, t_start, t_end, n_bars, mode)
+            accumulate_features(buf, enumerate(pcapreader.iter_packets(buf)),
+                                bar_of, features)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    return finalize_features(features)
+
+
+# Suma en acc los canales parciales de otro tramo (une los conjuntos de flujos)
+def merge_features(acc, part):
+    for name in FEATURE_CHANNELS:
+        if name == "flows":
+            for bar_flows, part_flows in zip(acc[name], part[name]):
+                bar_flows |= part_flows
+        else:
+            acc[name] = [a + b for a, b in zip(acc[name], part[name])]
+    return acc
+
+
+# Trabajo de un proceso: características parciales de un tramo de la captura
+def _chunk_features(pcap_path, chunk, n_bars, mode, n_packets, t_start, t_end):
+    buf = pcapreader.open_capture(pcap_path)
+    try:
+        features = empty_features(n_bars)
+        bar_of = bar_assigner(n_packets, t_start, t_end, n_bars, mode)
+        packets = enumerate(pcapreader.iter_packets(buf, chunk), start=chunk.first_packet)
+        accumulate_features(buf, packets, bar_of, features)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+    return features
+
+
+# Igual que extract_bar_features, pero reparte la captura en tramos de bytes
+# y los procesa en un pool de procesos. Solo se suman enteros y se unen
+# conjuntos, así que el resultado es idéntico al de un solo proceso.
+def extract_bar_features_parallel(pcap_path, n_bars, mode="count", workers=None,
+                                  chunks_per_worker=4):
+    workers = workers or os.cpu_count() or 1
+
+    buf = pcapreader.open_capture(pcap_path)
+    try:
+        layout = pcapreader.split_capture(buf, workers * chunks_per_worker)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+    features = empty_features(n_bars)
+    if layout.n_packets == 0:
+        return finalize_features(features)
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [
+            pool.submit(_chunk_features, pcap_path, chunk, n_bars, mode,
+                        layout.n_packets, layout.t_start, layout.t_end)
+            for chunk in layout.chunks
+        ]
+        for job in jobs:
+            merge_features(features, job.result())
+
+    return finalize_features(features)
+
+
+# Normaliza un canal a valores entre 0 y 1
+def normalize_channel(values):
+    peak = max(values, default=0) or 1
+    return [v / peak for v in values]
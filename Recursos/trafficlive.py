@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Modo en vivo de traffic2midi.py.
+# Sigue una captura que tcpdump todavía está escribiendo (o un pcap por
+# stdin) y genera acordes y arpegios compás por compás conforme llega el
+# tráfico. Cada compás dura LIVE_BAR_SECONDS segundos de captura.
+# Mide la latencia de cada compás: tiempo entre el final del compás (en el
+# reloj de la captura) y el momento en que sus notas quedan emitidas.
+# El reloj de la captura se alinea con el local por el paquete que llegó con
+# menos retraso, así una captura que trae tráfico atrasado (tail -f de una
+# captura vieja) no corre el reloj. Un compás no puede salir antes de que
+# lleguen sus datos: si llegan tarde (atrasados), la latencia se cuenta desde
+# que llegaron.
+# check_latency la prueba contra el presupuesto con pcapsynth.py escribiendo
+# una captura en tiempo real.
+
+import queue
+import sys
+import threading
+import time
+
+import instrument
+import pcapreader
+from smfwriter import SMFStreamWriter
+from traffic2midi import (
+    ARPEGGIO_PROGRAM, BEATS_PER_BAR, PAD_PROGRAM, TEMPO_BPM,
+    arpeggio_notes_for_bar, next_chord, pad_notes_for_bar
+)
+
+# Un compás de música corresponde a este tiempo de captura (2.5 s a 96 BPM)
+LIVE_BAR_SECONDS = BEATS_PER_BAR * 60.0 / TEMPO_BPM
+
+# El normalizador recuerda el compás más activo, pero olvida poco a poco
+# los picos viejos para que la actividad siga siendo relativa
+LIVE_NORM_DECAY = 0.98
+
+# Presupuesto de latencia por compás (segundos)
+LIVE_LATENCY_BUDGET = 0.25
+
+# Cada cuánto se revisa si hay datos nuevos o si un compás ya terminó
+LIVE_POLL_INTERVAL = 0.05
+
+# Prueba de latencia (check_latency): segundos de captura sintética, compás
+# corto para cerrar varios, y silencio que indica que el escritor terminó
+LATENCY_CHECK_SECONDS = 10.0
+LATENCY_CHECK_BAR_SECONDS = 1.0
+LATENCY_CHECK_IDLE = 1.0
+
+# Tamaño de lectura del archivo o stdin
+LIVE_READ_SIZE = 1 << 16
+
+# Cada cuántos compases se fuerza C (como en choose_chord_sequence)
+FORCE_TONIC_EVERY = 8
+
+
+# Estado incremental de la sonificación: acordes previos, normalizador y
+# bytes del compás en curso. Recibe paquetes y llama a emit(bar) por cada
+# compás cerrado, con bar = (índice, acorde, actividad, notas_pad, notas_arpegio).
+class LiveSonifier:
+    def __init__(self, emit, bar_seconds=LIVE_BAR_SECONDS,
+                 norm_decay=LIVE_NORM_DECAY, latency_budget=LIVE_LATENCY_BUDGET):
+        self.emit = emit
+        self.bar_seconds = bar_seconds
+        self.norm_decay = norm_decay
+        self.latency_budget = latency_budget
+
+        self.recent_chords = []
+        self.norm = 0.0
+        self.bar_index = 0
+        self.bar_start = None
+        self.bar_bytes = 0
+        self.clock_offset = None
+        self.arrival = 0.0
+
+        self.latencies = []
+        self.over_budget = 0
+
+    # Agrega paquetes (timestamp, caplen, ...) y cierra los compases que
+    # ya terminaron según el reloj de la captura
+    def add_packets(self, records):
+        now = self.arrival = time.time()
+        for record in records:
+            ts, caplen = record[0], record[1]
+            if self.bar_start is None:
+                self.bar_start = ts
+            # Un paquete que llega con menos retraso que los anteriores
+            # adelanta el reloj (se estaba leyendo tráfico atrasado)
+            if self.clock_offset is None or now - ts < self.clock_offset:
+                self.clock_offset = now - ts
+            while ts >= self.bar_start + self.bar_seconds:
+                self.close_bar()
+            self.bar_bytes += caplen
+
+    # Cierra los compases vencidos aunque no lleguen paquetes (tráfico en
+    # silencio), usando el reloj local alineado con el de la captura
+    def tick(self, now=None):
+        if self.bar_start is None:
+            return
+        capture_now = (time.time() if now is None else now) - self.clock_offset
+        while capture_now >= self.bar_start + self.bar_seconds:
+            self.close_bar()
+
+    # Convierte el compás en curso en acorde + notas y lo emite
+    def close_bar(self):
+        self.norm = max(self.bar_bytes, self.norm * self.norm_decay)
+        activity = self.bar_bytes / self.norm if self.norm else 0.0
+
+        if self.bar_index and self.bar_index % FORCE_TONIC_EVERY == 0:
+            chord = "C"
+        else:
+            chord = next_chord(self.recent_chords, activity)
+        self.recent_chords = (self.recent_chords + [chord])[-3:]
+
+        bar_time = self.bar_index * BEATS_PER_BAR
+        self.emit((self.bar_index, chord, activity,
+                   pad_notes_for_bar(chord, bar_time),
+                   arpeggio_notes_for_bar(chord, activity, bar_time)))
+
+        bar_end = self.bar_start + self.bar_seconds
+        due = max(bar_end + self.clock_offset, self.arrival)
+        latency = max(0.0, time.time() - due)
+        self.latencies.append(latency)
+        if latency > self.latency_budget:
+            self.over_budget += 1
+
+        self.bar_index += 1
+        self.bar_start = bar_end
+        self.bar_bytes = 0
+
+    # Emite el compás pendiente y un compás final en C
+    def finish(self):
+        if self.bar_start is None:
+            return
+        self.close_bar()
+        bar_time = self.bar_index * BEATS_PER_BAR
+        self.emit((self.bar_index, "C", 0.0, pad_notes_for_bar("C", bar_time), []))
+        self.bar_index += 1
+
+    # Resumen de latencias (segundos)
+    def latency_stats(self):
+        if not self.latencies:
+            return {"bars": 0}
+        ordered = sorted(self.latencies)
+        return {
+            "bars": len(ordered),
+            "mean": sum(ordered) / len(ordered),
+            "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "max": ordered[-1],
+            "budget": self.latency_budget,
+            "over_budget": self.over_budget,
+        }
+
+
+# Lee la fuente en un hilo y pasa los trozos por la cola.
+# Un archivo se sigue "en cola" (como tail -f); stdin termina en EOF.
+def _read_source(source, chunks, stop):
+    follow = source != "-"
+    f = sys.stdin.buffer if source == "-" else open(source, "rb")
+    try:
+        while not stop.is_set():
+            data = f.read1(LIVE_READ_SIZE)
+            if data:
+                chunks.put(data)
+            elif follow:
+                time.sleep(LIVE_POLL_INTERVAL)
+            else:
+                break
+    finally:
+        if follow:
+            f.close()
+        chunks.put(None)
+
+
+# Sonifica en vivo una captura (ruta o "-" para stdin). Cada compás cerrado
+# se escribe al MIDI en cuanto se emite; el archivo queda completo al
+# terminar (fin de stdin, Ctrl+C o idle_timeout segundos sin datos nuevos)
+def run_live(source, midi_path, idle_timeout=None, bar_seconds=LIVE_BAR_SECONDS,
+             verbose=True):
+    with instrument.stage("en vivo") as stage:
+        midi = SMFStreamWriter(midi_path, numTracks=2)
+        midi.addTempo(0, 0, TEMPO_BPM)
+        midi.addTempo(1, 0, TEMPO_BPM)
+        midi.addProgramChange(0, 0, 0, PAD_PROGRAM)
+        midi.addProgramChange(1, 1, 0, ARPEGGIO_PROGRAM)
+
+        def emit(bar):
+            bar_index, chord, activity, pad_notes, arp_notes = bar
+            midi.add_notes(0, 0, pad_notes)
+            midi.add_notes(1, 1, arp_notes)
+            midi.flush((bar_index + 1) * BEATS_PER_BAR)
+            if verbose:
+                print(f"Compás {bar_index + 1}: {chord} (actividad {activity:.2f})")
+
+        sonifier = LiveSonifier(emit, bar_seconds=bar_seconds)
+        parser = pcapreader.StreamParser()
+        chunks = queue.Queue()
+        stop = threading.Event()
+        reader = threading.Thread(target=_read_source, args=(source, chunks, stop),
+                                  daemon=True)
+        reader.start()
+
+        last_data = time.monotonic()
+        try:
+            while True:
+                try:
+                    data = chunks.get(timeout=LIVE_POLL_INTERVAL)
+                except queue.Empty:
+                    data = b""
+                if data is None:
+                    break
+                if data:
+                    last_data = time.monotonic()
+                    sonifier.add_packets(parser.feed(data))
+                sonifier.tick()
+                if idle_timeout is not None and time.monotonic() - last_data > idle_timeout:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # También si el flujo viene mal formado: el MIDI queda completo
+            # hasta el último compás emitido y el archivo cerrado
+            stop.set()
+            try:
+                sonifier.finish()
+            finally:
+                midi.close()
+
+        stats = sonifier.latency_stats()
+        stage.count(bars=stats["bars"])
+    if verbose and stats["bars"]:
+        print(
+            f"Latencia por compás: media {stats['mean'] * 1000:.1f} ms, "
+            f"p95 {stats['p95'] * 1000:.1f} ms, máx {stats['max'] * 1000:.1f} ms; "
+            f"{stats['over_budget']}/{stats['bars']} compases sobre el "
+            f"presupuesto de {stats['budget'] * 1000:.0f} ms"
+        )
+    return stats
+
+
+# Prueba de latencia con pcapsynth.py como sustituto de tcpdump: escribe
+# paquetes en tiempo real a una captura temporal durante `seconds` segundos
+# mientras run_live la sigue. Regresa las estadísticas de latencia y si
+# ningún compás pasó del presupuesto.
+def check_latency(seconds=LATENCY_CHECK_SECONDS, bar_seconds=LATENCY_CHECK_BAR_SECONDS,
+                  verbose=True):
+    import os
+    import shutil
+    import tempfile
+
+    import pcapsynth
+
+    folder = tempfile.mkdtemp(prefix="trafficlive-")
+    try:
+        capture = os.path.join(folder, "live.pcapng")
+        with open(capture, "wb") as f:     # ya existe cuando run_live la abre
+            writer = threading.Thread(target=pcapsynth.write_live, args=(f, seconds),
+                                      daemon=True)
+            writer.start()
+            stats = run_live(capture, os.path.join(folder, "live.mid"),
+                             idle_timeout=LATENCY_CHECK_IDLE, bar_seconds=bar_seconds,
+                             verbose=verbose)
+            writer.join()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return stats, stats["bars"] > 0 and stats["over_budget"] == 0
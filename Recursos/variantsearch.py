@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Búsqueda de variantes con semilla.
+# La melodía (melodycsv.py) y los acordes (traffic2midi.py) toman a veces el
+# segundo candidato más cercano, así cada semilla da una pieza distinta.
+# Aquí se generan muchas variantes de la misma entrada repartidas entre
+# procesos, se califican con métricas musicales baratas y se guardan las k
+# mejores con su semilla, para volver a generarlas exactamente:
+#   python melodycsv.py archivo.csv DÍGITO_INICIAL COMPASES SEMILLA
+#   python traffic2midi.py --bars COMPASES --seed SEMILLA
+
+import heapq
+import json
+import os
+import random
+import sys
+import time
+from operator import eq, ne, sub
+
+import instrument
+import melodycsv
+import traffic2midi
+
+DEFAULT_VARIANTS = 1000
+DEFAULT_TOP = 5
+DEFAULT_FIRST_SEED = 0
+
+# Tramos de semillas por proceso (para repartir mejor la carga)
+CHUNKS_PER_WORKER = 4
+
+# Valor buscado de cada métrica (entre 0 y 1) y su peso en la calificación
+MELODY_TARGETS = {"stepwise": 0.6, "repetition": 0.1, "range": 1.0}
+MELODY_WEIGHTS = {"stepwise": 2.0, "repetition": 1.0, "range": 0.5}
+CHORD_TARGETS = {"change_rate": 0.8, "back_and_forth": 0.1, "variety": 1.0}
+CHORD_WEIGHTS = {"change_rate": 1.0, "back_and_forth": 1.0, "variety": 0.5}
+
+
+# Métricas de una melodía (grados de la escala de las notas que suenan):
+# - stepwise: proporción de movimientos por grado conjunto
+# - repetition: proporción de notas repetidas
+# - range: ámbito usado de la escala (0 a 1)
+def melody_metrics(degrees):
+    moves = list(map(abs, map(sub, degrees[1:], degrees)))
+    n = len(moves) or 1
+    span = max(degrees) - min(degrees) if degrees else 0
+    return {
+        "stepwise": moves.count(1) / n,
+        "repetition": moves.count(0) / n,
+        "range": span / (len(melodycsv.SCALE_DEGREES) - 1),
+    }
+
+
+# Métricas de una secuencia de acordes:
+# - change_rate: proporción de compases que cambian de acorde
+# - back_and_forth: proporción de idas y vueltas (A B A)
+# - variety: proporción de los acordes de la tonalidad que se usan
+def chord_metrics(chords):
+    n = max(1, len(chords) - 1)
+    return {
+        "change_rate": sum(map(ne, chords[1:], chords)) / n,
+        "back_and_forth": sum(map(eq, chords[2:], chords)) / max(1, len(chords) - 2),
+        "variety": len(set(chords)) / len(traffic2midi.CHORD_ORDER),
+    }
+
+
+# Calificación: menos la distancia ponderada a los valores buscados (0 es ideal)
+def score(metrics, targets, weights):
+    return -sum(weights[name] * abs(metrics[name] - targets[name]) for name in targets)
+
+
+# Motor, métricas, valores buscados y pesos de cada tipo de búsqueda
+def _kind_setup(kind):
+    if kind == "melody":
+        return melodycsv.MOTOR_GRADOS, melody_metrics, MELODY_TARGETS, MELODY_WEIGHTS
+    if kind == "chords":
+        return traffic2midi.CHORD_ENGINE, chord_metrics, CHORD_TARGETS, CHORD_WEIGHTS
+    raise ValueError(f"Tipo de búsqueda desconocido: {kind}")
+
+
+# Trabajo de un proceso: califica las variantes de un tramo de semillas y
+# regresa sus `top` mejores como (calificación, -semilla, métricas).
+# En la melodía solo se califican las posiciones de `sounding` (los dígitos
+# 0 son silencios); en los acordes se aplican las cadencias forzadas.
+def _score_seeds(kind, targets, sounding, seeds, top):
+    engine, metrics_of, wanted, weights = _kind_setup(kind)
+    best = []
+    for seed in seeds:
+        sequence = engine.generate(targets, random.Random(seed))
+        if kind == "melody":
+            sequence = [sequence[i] for i in sounding]
+        else:
+            traffic2midi.force_cadences(sequence)
+        metrics = metrics_of(sequence)
+        entry = (score(metrics, wanted, weights), -seed, metrics)
+        if len(best) < top:
+            heapq.heappush(best, entry)
+        elif entry[:2] > best[0][:2]:
+            heapq.heapreplace(best, entry)
+    return best
+
+
+# Genera n_variants variantes (semillas first_seed, first_seed + 1, ...) y
+# regresa las top mejores, de mayor a menor calificación:
+# [{"seed": ..., "score": ..., "metrics": {...}}, ...]
+def search_variants(kind, targets, sounding=None, n_variants=DEFAULT_VARIANTS,
+                    top=DEFAULT_TOP, workers=None, first_seed=DEFAULT_FIRST_SEED):
+    _kind_setup(kind)
+    stage = instrument.begin("variantes", variants=n_variants)
+    targets = list(targets)
+    workers = workers or os.cpu_count() or 1
+    seeds = range(first_seed, first_seed + n_variants)
+
+    if workers == 1:
+        best = _score_seeds(kind, targets, sounding, seeds, top)
+    else:
+        n_chunks = min(n_variants, workers * CHUNKS_PER_WORKER) or 1
+        step = -(-n_variants // n_chunks)
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(_score_seeds, kind, targets, sounding,
+                                seeds[i:i + step], top)
+                    for i in range(0, n_variants, step)]
+            best = [entry for job in jobs for entry in job.result()]
+
+    best = heapq.nlargest(top, best, key=lambda entry: entry[:2])
+    stage.end()
+    return [{"seed": -neg_seed, "score": value, "metrics": metrics}
+            for value, neg_seed, metrics in best]
+
+
+# Objetivos de la melodía para los dígitos que caben en max_beats tiempos
+# (los mismos que usa melodycsv.crear_midi_desde_digitos) y las posiciones
+# de las notas que suenan
+def melody_input(path, start=0, max_beats=melodycsv.MAX_BEATS):
+    targets = []
+    sounding = []
+    beat = 0.0
+    digits = melodycsv.iterar_digitos(path, start)
+    try:
+        for d in digits:
+            if beat >= max_beats:
+                break
+            if d != 0:
+                sounding.append(len(targets))
+            targets.append(melodycsv.OBJETIVO_DIGITO[d])
+            beat += melodycsv.duracion_para_digito(d)
+    finally:
+        digits.close()
+    return targets, sounding
+
+
+# Objetivos de los acordes para la actividad por compás de una captura
+def chord_input(pcap_path, n_bars=traffic2midi.TARGET_BARS):
+    activities = traffic2midi.compute_bar_activities_from_pcap(pcap_path, n_bars=n_bars)
+    return traffic2midi.CHORD_ENGINE.target_indices(activities)
+
+
+# Vuelve a generar el MIDI de una variante a partir de su semilla
+def render_variant(kind, source, seed, midi_path, start=0, n_bars=None):
+    if kind == "melody":
+        bars = melodycsv.TARGET_BARS if n_bars is None else n_bars
+        name = os.path.splitext(os.path.basename(source))[0]
+        digits = melodycsv.iterar_digitos(source, start)
+        melodycsv.crear_midi_desde_digitos(digits, midi_path, name,
+                                           bars * melodycsv.BEATS_PER_BAR,
+                                           random.Random(seed))
+        digits.close()
+    else:
+        bars = traffic2midi.TARGET_BARS if n_bars is None else n_bars
+        traffic2midi.create_midi_from_pcap(source, midi_path, n_bars=bars, seed=seed)
+
+
+# Tabla de las mejores variantes
+def print_results(results, elapsed, n_variants):
+    if not results:
+        print("No hay variantes.")
+        return
+    names = list(results[0]["metrics"])
+    print(f"{'semilla':>10}{'calificación':>14}" + "".join(f"{n:>16}" for n in names))
+    for r in results:
+        print(f"{r['seed']:>10}{r['score']:>14.4f}"
+              + "".join(f"{r['metrics'][n]:>16.3f}" for n in names))
+    print(f"{n_variants} variantes en {elapsed:.2f} s "
+          f"({n_variants / elapsed if elapsed else 0:,.0f} variantes/s).")
+
+
+# Lee los argumentos: (tipo, entrada, opciones)
+def parse_args(args):
+    if len(args) < 2 or args[0] not in ("melody", "chords"):
+        raise ValueError(
+            "Uso: python variantsearch.py melody|chords ENTRADA [--bars B] [--from D] "
+            "[--variants N] [--top K] [--workers W] [--first-seed S] "
+            "[--save resultados.json] [--render]")
+    options = {"bars": None, "from": 0, "variants": DEFAULT_VARIANTS, "top": DEFAULT_TOP,
+               "workers": None, "first-seed": DEFAULT_FIRST_SEED, "save": None,
+               "render": False}
+    i = 2
+    while i < len(args):
+        name = args[i][2:]
+        if args[i] == "--render":
+            options["render"] = True
+        elif name in options and i + 1 < len(args):
+            i += 1
+            options[name] = args[i] if name == "save" else int(args[i])
+        else:
+            raise ValueError(f"Opción no válida: '{args[i]}'")
+        i += 1
+    return args[0], args[1], options
+
+
+def main():
+    try:
+        kind, source, options = parse_args(sys.argv[1:])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if not os.path.exists(source):
+        print(f"No se encontró el archivo: {source}")
+        sys.exit(1)
+
+    n_bars = options["bars"]
+    if kind == "melody":
+        bars = melodycsv.TARGET_BARS if n_bars is None else n_bars
+        targets, sounding = melody_input(source, options["from"],
+                                         bars * melodycsv.BEATS_PER_BAR)
+    else:
+        targets = chord_input(source, traffic2midi.TARGET_BARS if n_bars is None else n_bars)
+        sounding = None
+
+    start = time.perf_counter()
+    results = search_variants(kind, targets, sounding, options["variants"],
+                              options["top"], options["workers"], options["first-seed"])
+    elapsed = time.perf_counter() - start
+    print_results(results, elapsed, options["variants"])
+
+    if options["save"]:
+        with open(options["save"], "w", encoding="utf-8") as f:
+            json.dump({"kind": kind, "source": source, "from": options["from"],
+                       "bars": n_bars, "variants": options["variants"],
+                       "first_seed": options["first-seed"], "results": results},
+                      f, indent=2)
+        print(f"Resultados guardados en: {options['save']}")
+
+    if options["render"]:
+        os.makedirs(melodycsv.OUTPUT_DIR, exist_ok=True)
+        name = os.path.splitext(os.path.basename(source))[0]
+        for r in results:
+            midi_path = os.path.join(melodycsv.OUTPUT_DIR, f"{name}_{kind}_seed{r['seed']}.mid")
+            render_variant(kind, source, r["seed"], midi_path, options["from"], n_bars)
+            print("MIDI generado:", midi_path)
+
+
+if __name__ == "__main__":
+    main()